@@ -0,0 +1,145 @@
+"""Benchmark the backup_data and queue_data indexes on SQLite.
+
+Fills a backup_data table with --rows rows, then runs the conductor's
+hot filters before and after creating the indexes declared in
+staffeln.db.sqlalchemy.models and prints their query plans and average
+latency.
+
+    python hack/benchmarks/backup_data_indexes.py --rows 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+from staffeln.db.sqlalchemy import models
+
+QUERIES = {
+    # Backup._is_backup_required
+    "backup_required": (
+        "SELECT id FROM backup_data WHERE volume_id = :volume_id "
+        "AND created_at > :threshold"
+    ),
+    # Backup._is_incremental
+    "incremental": (
+        "SELECT id, incremental FROM backup_data WHERE volume_id = :volume_id "
+        "ORDER BY id DESC LIMIT 2"
+    ),
+    # Connection.get_backup_history
+    "latest_backup": (
+        "SELECT volume_id, max(created_at) FROM backup_data "
+        "WHERE volume_id IN (:volume_id, :other_volume_id) GROUP BY volume_id"
+    ),
+    # Connection._get_volumes_with_full_backup
+    "full_backup_window": (
+        "SELECT volume_id, incremental FROM (SELECT volume_id, incremental, "
+        "row_number() OVER (PARTITION BY volume_id ORDER BY id DESC) AS rn "
+        "FROM backup_data WHERE volume_id IN (:volume_id, :other_volume_id)) "
+        "WHERE rn <= 2"
+    ),
+    # RotationManager, backups of an instance
+    "instance_backups": (
+        "SELECT id, created_at FROM backup_data WHERE instance_id = :instance_id "
+        "ORDER BY created_at DESC"
+    ),
+}
+
+
+def fill(engine, rows, backups_per_volume):
+    now = datetime.datetime(2024, 1, 1)
+    volumes = max(rows // backups_per_volume, 1)
+    insert = models.Backup_data.__table__.insert()
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            volume = i % volumes
+            batch.append(
+                {
+                    "backup_id": f"backup-{i}",
+                    "project_id": f"project-{volume % 500}",
+                    "volume_id": f"volume-{volume}",
+                    "instance_id": f"instance-{volume}",
+                    "backup_completed": 1,
+                    "incremental": bool(i // volumes % 4),
+                    "created_at": now - datetime.timedelta(minutes=rows - i),
+                }
+            )
+            if len(batch) == 10000:
+                conn.execute(insert, batch)
+                batch = []
+        if batch:
+            conn.execute(insert, batch)
+    return volumes
+
+
+def run(engine, volumes, samples):
+    rnd = random.Random(0)
+    params = []
+    for _ in range(samples):
+        volume = rnd.randrange(volumes)
+        params.append(
+            {
+                "volume_id": f"volume-{volume}",
+                "other_volume_id": f"volume-{(volume + 1) % volumes}",
+                "instance_id": f"instance-{volume}",
+                "threshold": datetime.datetime(2023, 12, 31),
+            }
+        )
+    with engine.connect() as conn:
+        for name, query in QUERIES.items():
+            plan = conn.execute(
+                sa.text("EXPLAIN QUERY PLAN " + query), params[0]
+            ).fetchall()
+            start = time.perf_counter()
+            for param in params:
+                conn.execute(sa.text(query), param).fetchall()
+            elapsed = (time.perf_counter() - start) / len(params) * 1000
+            print(f"  {name:<18} {elapsed:10.3f} ms/query")
+            for row in plan:
+                print(f"      {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--backups-per-volume", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+    try:
+        engine = sa.create_engine(f"sqlite:///{path}")
+        table = models.Backup_data.__table__
+        table.create(engine)
+        with engine.begin() as conn:
+            for index in table.indexes:
+                index.drop(conn)
+        volumes = fill(engine, args.rows, args.backups_per_volume)
+        print(f"backup_data: {args.rows} rows, {volumes} volumes")
+
+        print("without indexes:")
+        run(engine, volumes, args.samples)
+
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for index in table.indexes:
+                index.create(conn)
+            conn.execute(sa.text("ANALYZE"))
+        print(f"indexes created in {time.perf_counter() - start:.1f} s")
+
+        print("with indexes:")
+        run(engine, volumes, args.samples)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
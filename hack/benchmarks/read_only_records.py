@@ -0,0 +1,109 @@
+"""Benchmark listing queue_data and backup_data rows as objects or records.
+
+Fills SQLite queue_data and backup_data tables with --rows rows each,
+then times Queue.list and Volume.list building versioned objects against
+their read_only records, built straight from the selected columns.
+
+    python hack/benchmarks/read_only_records.py --rows 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import uuid
+import warnings
+
+import sqlalchemy as sa
+
+
+def fill(path, rows):
+    from staffeln.db.sqlalchemy import models
+
+    engine = sa.create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    now = datetime.datetime.utcnow()
+    with engine.begin() as conn:
+        for table, make in (
+            (
+                models.Queue_data.__table__,
+                lambda i: {
+                    "backup_id": str(uuid.UUID(int=i)),
+                    "project_id": str(uuid.UUID(int=i % 500)),
+                    "volume_id": str(uuid.UUID(int=i)),
+                    "instance_id": f"instance-{i}",
+                    "backup_status": 1,
+                    "volume_name": f"volume-{i}",
+                    "instance_name": f"instance-{i}",
+                    "incremental": bool(i % 4),
+                    "created_at": now,
+                },
+            ),
+            (
+                models.Backup_data.__table__,
+                lambda i: {
+                    "backup_id": str(uuid.UUID(int=i)),
+                    "project_id": str(uuid.UUID(int=i % 500)),
+                    "volume_id": str(uuid.UUID(int=i % 1000)),
+                    "instance_id": f"instance-{i % 1000}",
+                    "backup_completed": 1,
+                    "incremental": bool(i % 4),
+                    "created_at": now,
+                },
+            ),
+        ):
+            for start in range(0, rows, 10000):
+                conn.execute(
+                    table.insert(),
+                    [make(i) for i in range(start, min(start + 10000, rows))],
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # UUIDField warns for every row it coerces.
+    warnings.simplefilter("ignore")
+
+    fd, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+    os.remove(path)
+    try:
+        fill(path, args.rows)
+
+        from staffeln import conf
+
+        conf.CONF([], project="staffeln")
+        conf.CONF.set_override("connection", f"sqlite:///{path}", "database")
+
+        from staffeln import objects
+
+        objects.register_all()
+        print(f"queue_data and backup_data: {args.rows} rows each")
+        for name, func in (
+            ("Queue.list", lambda **kw: objects.Queue.list(None, **kw)),
+            ("Volume.list", lambda **kw: objects.Volume.list(None, **kw)),
+        ):
+            for read_only in (False, True):
+                best = None
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    func(read_only=read_only)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                kind = "records" if read_only else "objects"
+                print(
+                    f"  {name:<12} {kind:<8} {best:8.2f} s  "
+                    f"{best / args.rows * 1e6:8.1f} us/row"
+                )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark the retention check of the rotation over many backups.
+
+Builds --backups synthetic backups spread over --instances instances, a
+share of which carry a custom retention time, then compares the former
+per-backup RotationManager.is_retention, which parsed the instance
+retention time for every backup, with cutoffs compiled once per cycle by
+RotationManager.get_retention_cutoffs and compared as timestamps.
+
+    python hack/benchmarks/retention_cutoffs.py --backups 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import random
+import time
+from datetime import timezone
+from unittest import mock
+
+from oslo_utils import timeutils
+
+from staffeln.common import time as xtime
+from staffeln.conductor import manager
+
+RETENTION_TIMES = ["1w", "2w3d", "1mon", "3mon", "1y", "10d12h"]
+
+
+class Backup:
+    __slots__ = ("backup_id", "instance_id", "created_at")
+
+    def __init__(self, backup_id, instance_id, created_at):
+        self.backup_id = backup_id
+        self.instance_id = instance_id
+        self.created_at = created_at
+
+
+def build(backups, instances, custom_ratio):
+    rnd = random.Random(0)
+    now = datetime.datetime.now(timezone.utc)
+    retention_map = {
+        f"instance-{i}": rnd.choice(RETENTION_TIMES)
+        for i in range(instances)
+        if rnd.random() < custom_ratio
+    }
+    rows = [
+        Backup(
+            f"backup-{i}",
+            f"instance-{i % instances}",
+            now - datetime.timedelta(minutes=rnd.randrange(60 * 24 * 400)),
+        )
+        for i in range(backups)
+    ]
+    return rows, retention_map
+
+
+def get_time_from_str(time_str):
+    # RotationManager.get_time_from_str before the parser was memoized
+    time_delta_dict = xtime.parse_timedelta_string(time_str)
+    return xtime.timeago(**time_delta_dict)
+
+
+def per_backup(rows, retention_map, threshold):
+    # RotationManager.is_retention before the cutoffs were compiled
+    def is_retention(backup):
+        now = timeutils.utcnow().astimezone(timezone.utc)
+        backup_age = now - backup.created_at.astimezone(timezone.utc)
+        if backup.instance_id in retention_map:
+            retention_time = now - get_time_from_str(
+                retention_map[backup.instance_id]
+            ).astimezone(timezone.utc)
+            return backup_age > retention_time
+        return now - threshold < backup_age
+
+    return sum(1 for backup in rows if is_retention(backup))
+
+
+def compiled(rows, retention_map, threshold):
+    with mock.patch("openstack.connect"):
+        rotation = manager.RotationManager(1, mock.Mock())
+    rotation.instance_retention_map = retention_map
+    cutoffs = {
+        instance_id: cutoff.timestamp()
+        for instance_id, cutoff in rotation.get_retention_cutoffs().items()
+    }
+    default = threshold.timestamp()
+    return sum(
+        1
+        for backup in rows
+        if backup.created_at.timestamp() < cutoffs.get(backup.instance_id, default)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backups", type=int, default=1000000)
+    parser.add_argument("--instances", type=int, default=20000)
+    parser.add_argument("--custom-ratio", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rows, retention_map = build(args.backups, args.instances, args.custom_ratio)
+    threshold = get_time_from_str("2w3d").astimezone(timezone.utc)
+    print(
+        f"{args.backups} backups, {args.instances} instances, "
+        f"{len(retention_map)} with a custom retention time"
+    )
+
+    results = {}
+    for name, func in (("per-backup parse", per_backup), ("compiled", compiled)):
+        start = time.perf_counter()
+        results[name] = func(rows, retention_map, threshold)
+        elapsed = time.perf_counter() - start
+        print(
+            f"  {name:<18} {elapsed:8.2f} s  "
+            f"{args.backups / elapsed:12.0f} backups/s  "
+            f"{results[name]} to remove"
+        )
+
+
+if __name__ == "__main__":
+    main()
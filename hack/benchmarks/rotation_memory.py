@@ -0,0 +1,148 @@
+"""Benchmark the peak memory of the rotation over a large backup history.
+
+Fills a SQLite backup_data table with --rows rows, then measures in a
+fresh process each the former rotation, which loaded every backup as a
+Volume object and grouped them in a dict of lists by instance, and the
+streaming RotationManager.get_retention_chains, and prints their peak
+resident memory and duration.
+
+    python hack/benchmarks/rotation_memory.py --rows 2000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+import sqlalchemy as sa
+
+RETENTION_DAYS = 30
+
+
+def fill(path, rows, backups_per_volume):
+    from staffeln.db.sqlalchemy import models
+
+    engine = sa.create_engine(f"sqlite:///{path}")
+    models.Backup_data.__table__.create(engine)
+    now = datetime.datetime.utcnow()
+    volumes = max(rows // backups_per_volume, 1)
+    insert = models.Backup_data.__table__.insert()
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            volume = i % volumes
+            # Spread over twice the retention time, half of them expire.
+            age = datetime.timedelta(
+                days=2 * RETENTION_DAYS * (i // volumes) / backups_per_volume
+            )
+            batch.append(
+                {
+                    "backup_id": f"backup-{i}",
+                    "project_id": str(uuid.UUID(int=volume % 500)),
+                    "volume_id": str(uuid.UUID(int=volume)),
+                    "instance_id": f"instance-{volume // 2}",
+                    "backup_completed": 1,
+                    "incremental": bool(i // volumes % 4),
+                    "created_at": now - age,
+                }
+            )
+            if len(batch) == 10000:
+                conn.execute(insert, batch)
+                batch = []
+        if batch:
+            conn.execute(insert, batch)
+
+
+def materialized(manager, controller):
+    # RotationManager.rotation_tasks before the rotation was streamed
+    backup_instance_map = {}
+    for backup in controller.get_backups():
+        if backup.instance_id in backup_instance_map:
+            backup_instance_map[backup.instance_id].append(backup)
+        else:
+            backup_instance_map[backup.instance_id] = [backup]
+    selected = 0
+    for instance_id in backup_instance_map:
+        sorted_backup_list = sorted(
+            backup_instance_map[instance_id],
+            key=lambda backup: backup.created_at.timestamp(),
+            reverse=True,
+        )
+        for backup in sorted_backup_list:
+            if backup.created_at < manager.threshold_strtime:
+                selected += 1
+    return selected
+
+
+def streaming(manager, controller):
+    return sum(len(chain) for chain in manager.get_retention_chains())
+
+
+def measure(path, mode):
+    from staffeln import conf
+
+    conf.CONF([], project="staffeln")
+    conf.CONF.set_override("connection", f"sqlite:///{path}", "database")
+
+    from oslo_utils import timeutils
+
+    from staffeln.conductor import backup, manager
+
+    with mock.patch("openstack.connect"):
+        controller = backup.Backup()
+        rotation = manager.RotationManager(1, mock.Mock())
+    rotation.controller = controller
+    rotation.instance_retention_map = {}
+    rotation.threshold_strtime = timeutils.utcnow(
+        with_timezone=True
+    ) - datetime.timedelta(days=RETENTION_DAYS)
+
+    func = {"materialized": materialized, "streaming": streaming}[mode]
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    selected = func(rotation, controller)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(
+        f"  {mode:<14} {peak / 1024:10.0f} MiB peak  {elapsed:8.1f} s  "
+        f"{selected} to remove"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--backups-per-volume", type=int, default=200)
+    parser.add_argument("--mode", choices=["materialized", "streaming"])
+    parser.add_argument("--db")
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.db, args.mode)
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+    os.remove(path)
+    try:
+        fill(path, args.rows, args.backups_per_volume)
+        print(f"backup_data: {args.rows} rows")
+        for mode in ("streaming", "materialized"):
+            subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--db", path],
+                check=True,
+            )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Benchmark a shared HTTP adapter against per-connection adapters.
+
+Starts a keep-alive HTTPS stub server on localhost, in its own process,
+and sends --requests-per-project requests for each of --projects
+projects from --workers threads, as a discovery pass does. Every project
+has its own requests session, like the keystoneauth session of a
+connect_as_project connection. The sessions either keep their own
+TCPKeepAliveAdapter, the keystoneauth default, or all mount staffeln's
+SharedHTTPAdapter. Prints the requests per second and the number of
+TCP/TLS connections the server accepted for both.
+
+The self-signed certificate is made with the openssl command, use --no-tls
+to benchmark plain HTTP instead.
+
+    python hack/benchmarks/shared_http_adapter.py --projects 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import http.server
+import multiprocessing
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import time
+
+import requests
+from keystoneauth1 import session as ks_session
+
+from staffeln import conf
+from staffeln.common import openstack
+
+BODY = b'{"volumes": []}'
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # The headers and the body are written separately, don't let
+        # Nagle's algorithm hold the body back.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.accepted.get_lock():
+            self.server.accepted.value += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, accepted, certfile):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port.value), StubHandler)
+    server.daemon_threads = True
+    server.accepted = accepted
+    if certfile:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    port.value = server.server_port
+    server.serve_forever()
+
+
+def make_cert(directory):
+    certfile = os.path.join(directory, "stub.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=127.0.0.1",
+            "-addext",
+            "subjectAltName=IP:127.0.0.1",
+            "-keyout",
+            certfile,
+            "-out",
+            certfile,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile
+
+
+def run(url, verify, accepted, projects, requests_per_project, workers, shared):
+    adapter = openstack.SharedHTTPAdapter() if shared else None
+    sessions = []
+    for _ in range(projects):
+        session = requests.Session()
+        for prefix in ("https://", "http://"):
+            session.mount(prefix, adapter or ks_session.TCPKeepAliveAdapter())
+        sessions.append(session)
+
+    def project_pass(session):
+        for _ in range(requests_per_project):
+            session.get(url, verify=verify).raise_for_status()
+
+    accepted.value = 0
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(project_pass, sessions))
+    elapsed = time.perf_counter() - start
+    for session in sessions:
+        session.close()
+    return projects * requests_per_project / elapsed, accepted.value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--projects", type=int, default=500)
+    parser.add_argument("--requests-per-project", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--no-tls", dest="tls", action="store_false")
+    args = parser.parse_args()
+
+    conf.CONF([], project="staffeln")
+    conf.CONF.set_override("http_pool_maxsize", args.workers, "openstack")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile = make_cert(tmp) if args.tls else None
+        port = multiprocessing.Value("i", 0)
+        accepted = multiprocessing.Value("i", 0)
+        server = multiprocessing.Process(
+            target=serve, args=(port, accepted, certfile), daemon=True
+        )
+        server.start()
+        while not port.value:
+            time.sleep(0.01)
+        scheme = "https" if args.tls else "http"
+        url = f"{scheme}://127.0.0.1:{port.value}/v3/volumes"
+
+        for name, shared in (("per-connection", False), ("shared", True)):
+            results = [
+                run(
+                    url,
+                    certfile or True,
+                    accepted,
+                    args.projects,
+                    args.requests_per_project,
+                    args.workers,
+                    shared,
+                )
+                for _ in range(args.rounds)
+            ]
+            rate = sum(r for r, _ in results) / len(results)
+            print(f"{name:>15}: {rate:8.0f} req/s, {results[-1][1]} connections")
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
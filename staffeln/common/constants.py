@@ -5,6 +5,8 @@ BACKUP_FAILED = 3
 BACKUP_COMPLETED = 2
 BACKUP_WIP = 1
 BACKUP_PLANNED = 0
+# A volume with a queue task in one of these statuses is not queued again.
+BACKUP_ACTIVE_STATUSES = (BACKUP_PLANNED, BACKUP_WIP)
 
 BACKUP_ENABLED_KEY = "true"
 BACKUP_RESULT_CHECK_INTERVAL = 60  # second
@@ -12,5 +14,14 @@ BACKUP_RESULT_CHECK_INTERVAL = 60  # second
 # default config values
 DEFAULT_BACKUP_CYCLE_TIMEOUT = "5min"
 
+# Outcomes of a backup deletion request
+DELETION_STARTED = "started"
+DELETION_GONE = "gone"
+DELETION_SKIPPED = "skipped"
+DELETION_THROTTLED = "throttled"
+DELETION_FAILED = "failed"
+
 PULLER = "puller"
 RETENTION = "retention"
+# Coordination group of the workers sharing the OpenStack API rate limits
+API_CLIENTS = "api_clients"
@@ -5,6 +5,7 @@ import glob
 import os
 import re
 import sys
+import threading
 import uuid
 from typing import Optional  # noqa: H301
 
@@ -24,6 +25,7 @@ class LockManager(object):
         # This is for now using to check if any backend_url setup
         # for tooz backends as K8s should not need one.any
         self.coordinator = COORDINATOR if backend_url else K8SCOORDINATOR
+        self._groups = set()
 
     def __enter__(self):
         self.coordinator.start()
@@ -32,6 +34,45 @@ class LockManager(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.coordinator.stop()
 
+    def join_group(self, group):
+        """Join a coordination group until leave_groups is called
+
+        The coordinator is kept started meanwhile, so this process stays a
+        member between the cycles entering and exiting the lock manager.
+
+        :param str group: The group name.
+        """
+        if group in self._groups:
+            return
+        self.coordinator.start()
+        try:
+            self.coordinator.join_group(group)
+        except Exception:
+            self.coordinator.stop()
+            raise
+        self._groups.add(group)
+
+    def leave_groups(self):
+        """Leave the joined groups and release the coordinator"""
+        for _ in range(len(self._groups)):
+            self.coordinator.stop()
+        self._groups.clear()
+
+    def get_member_count(self, group):
+        """Count the members of a coordination group
+
+        The group is joined on first use, for the lifetime of the process.
+
+        :param str group: The group name.
+        :returns: The number of members, 1 if they can't be counted.
+        """
+        try:
+            self.join_group(group)
+            return max(self.coordinator.get_member_count(group), 1)
+        except Exception as ex:
+            LOG.warn(f"Failed to count the members of group {group}: {ex}")
+            return 1
+
 
 class Lock(object):
     def __init__(self, lock_manager, lock_name, remove_lock=False):
@@ -63,7 +104,12 @@ class Coordinator(object):
     """Tooz coordination wrapper.
 
     Coordination member id is created from concatenated
-    `prefix` and `agent_id` parameters.
+    `prefix` and `agent_id` parameters. Without `agent_id`, a random one
+    is generated in each process using the coordinator, so the workers
+    forked from the process which created it get distinct member ids.
+
+    The coordinator stays started until `stop` was called as many times
+    as `start`.
 
     :param str agent_id: Agent identifier
     :param str prefix: Used to provide member identifier with a
@@ -72,11 +118,23 @@ class Coordinator(object):
 
     def __init__(self, agent_id: Optional[str] = None, prefix: str = ""):
         self.coordinator = None
-        self.agent_id = agent_id or str(uuid.uuid4())
+        self._agent_id = agent_id
+        self._agent_pid = None
+        self._fixed_agent_id = agent_id is not None
         self.started = False
+        self._users = 0
+        self._users_lock = threading.Lock()
         self.prefix = prefix
         self._file_path = None
 
+    @property
+    def agent_id(self) -> str:
+        pid = os.getpid()
+        if not self._fixed_agent_id and self._agent_pid != pid:
+            self._agent_id = str(uuid.uuid4())
+            self._agent_pid = pid
+        return self._agent_id
+
     def _get_file_path(self, backend_url):
         if backend_url.startswith("file://"):
             path = backend_url[7:]
@@ -87,9 +145,12 @@ class Coordinator(object):
         return None
 
     def start(self) -> None:
-        if self.started:
-            return
+        with self._users_lock:
+            if not self.started:
+                self._start()
+            self._users += 1
 
+    def _start(self) -> None:
         backend_url = CONF.coordination.backend_url
 
         # member_id should be bytes
@@ -101,8 +162,14 @@ class Coordinator(object):
         self.started = True
 
     def stop(self) -> None:
-        """Disconnect from coordination backend and stop heartbeat."""
-        if self.started:
+        """Disconnect from coordination backend and stop heartbeat.
+
+        Only the last user of the coordinator disconnects it.
+        """
+        with self._users_lock:
+            self._users = max(self._users - 1, 0)
+            if self._users or not self.started:
+                return
             if self.coordinator is not None:
                 self.coordinator.stop()
             self.coordinator = None
@@ -121,6 +188,35 @@ class Coordinator(object):
         else:
             raise exception.LockCreationFailed("Coordinator uninitialized.")
 
+    def join_group(self, name: str) -> None:
+        """Join a Tooz group, creating it if needed.
+
+        The group is left when the coordinator stops.
+
+        :param str name: The group name.
+        """
+        if self.coordinator is None:
+            raise exception.LockCreationFailed("Coordinator uninitialized.")
+        group = (self.prefix + name).encode("ascii")
+        try:
+            self.coordinator.create_group(group).get()
+        except coordination.GroupAlreadyExist:
+            pass
+        try:
+            self.coordinator.join_group(group).get()
+        except coordination.MemberAlreadyExist:
+            pass
+
+    def get_member_count(self, name: str) -> int:
+        """Return the number of members of a Tooz group.
+
+        :param str name: The group name.
+        """
+        if self.coordinator is None:
+            raise exception.LockCreationFailed("Coordinator uninitialized.")
+        group = (self.prefix + name).encode("ascii")
+        return len(self.coordinator.get_members(group).get())
+
     def remove_lock(self, glob_name):
         # Most locks clean up on release, but not the file lock, so we manually
         # clean them.
@@ -178,6 +274,13 @@ class K8sCoordinator(object):
         """
         return sherlock.KubernetesLock(self.prefix + name, self.namespace)
 
+    def join_group(self, name: str) -> None:
+        # Leases have no group membership.
+        pass
+
+    def get_member_count(self, name: str) -> int:
+        return 1
+
     def remove_lock(self, glob_name):
         pass
 
@@ -1,8 +1,17 @@
 from __future__ import annotations
 
+import collections
+import contextlib
+import socket
+import threading
+import time
+
 import tenacity
+from keystoneauth1 import exceptions as ks_exceptions
+from keystoneauth1 import session as ks_session
 from openstack import exceptions, proxy
 from oslo_log import log
+from oslo_utils import timeutils
 
 from staffeln import conf
 from staffeln.common import auth
@@ -12,13 +21,264 @@ CONF = conf.CONF
 LOG = log.getLogger(__name__)
 
 
+class CircuitOpenError(exceptions.HttpException):
+    """Raised instead of calling a service whose circuit breaker is open"""
+
+    def __init__(self, service):
+        super(CircuitOpenError, self).__init__(
+            message=f"Circuit breaker of {service} is open, not calling it."
+        )
+        self.status_code = 503
+        self.service = service
+
+
+class CircuitBreaker(object):
+    """Stop calling a service endpoint which keeps failing
+
+    The breaker opens after CONF.openstack.circuit_breaker_threshold
+    consecutive server errors or connection failures and makes calls fail
+    fast with CircuitOpenError. After
+    CONF.openstack.circuit_breaker_reset_timeout seconds calls are let
+    through again, the next success closes the breaker and the next
+    failure opens it again.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def _is_open(self):
+        return (
+            self.opened_at is not None
+            and time.monotonic() - self.opened_at
+            < CONF.openstack.circuit_breaker_reset_timeout
+        )
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._is_open()
+
+    def check(self):
+        if self.is_open:
+            raise CircuitOpenError(self.service)
+
+    def record_failure(self):
+        threshold = CONF.openstack.circuit_breaker_threshold
+        with self._lock:
+            self.failures += 1
+            if threshold and self.failures >= threshold and not self._is_open():
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                LOG.warn(
+                    f"Circuit breaker of {self.service} tripped after "
+                    f"{self.failures} consecutive failures, failing fast for "
+                    f"{CONF.openstack.circuit_breaker_reset_timeout} seconds."
+                )
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                LOG.info(f"Circuit breaker of {self.service} closed.")
+            self.failures = 0
+            self.opened_at = None
+
+
+class RetryBudget(object):
+    """Number of retries all OpenStack calls may still do in this cycle
+
+    CONF.openstack.retry_budget retries are shared by every call made
+    between two resets, 0 means no limit. Once it is spent, failed calls
+    are not retried anymore.
+    """
+
+    def __init__(self):
+        self.spent = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.spent = 0
+
+    def consume(self):
+        """Take one retry from the budget
+
+        :return: False if the budget is spent
+        """
+        budget = CONF.openstack.retry_budget
+        with self._lock:
+            if budget and self.spent >= budget:
+                return False
+            self.spent += 1
+            if budget and self.spent == budget:
+                LOG.warn(
+                    f"OpenStack retry budget of {budget} retries spent, "
+                    "failing calls won't be retried until the next cycle."
+                )
+            return True
+
+
+class TokenBucket(object):
+    """Token bucket refilled at rate tokens per second, holding up to burst"""
+
+    def __init__(self):
+        self.tokens = None
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, rate, burst):
+        """Take one token
+
+        :return: the number of seconds to wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.tokens is None:
+                self.tokens = burst
+            self.tokens = min(burst, self.tokens + (now - self.updated_at) * rate)
+            self.updated_at = now
+            # Tokens may go negative, callers then queue up behind each other.
+            self.tokens -= 1
+            return max(-self.tokens / rate, 0)
+
+
+class RateLimiter(object):
+    """Token bucket rate limits of the OpenStack requests, per service type
+
+    The rates are read from CONF.openstack.rate_limit and
+    service_rate_limits at every request. They are for all the conductor
+    workers, each one uses its share, 1 / share of the rate.
+    """
+
+    def __init__(self):
+        self.share = 1
+        self._buckets = collections.defaultdict(TokenBucket)
+
+    def set_share(self, share):
+        if share != self.share:
+            LOG.debug(f"OpenStack API rate limits shared by {share} workers.")
+        self.share = max(share, 1)
+
+    def get_rate(self, service):
+        rate = CONF.openstack.service_rate_limits.get(service)
+        rate = float(rate) if rate is not None else CONF.openstack.rate_limit
+        return rate / self.share
+
+    def reserve(self, service):
+        """Reserve a request to a service
+
+        :return: the number of seconds to wait before sending it
+        """
+        rate = self.get_rate(service)
+        if rate <= 0:
+            return 0
+        return self._buckets[service].reserve(rate, CONF.openstack.rate_limit_burst)
+
+    def acquire(self, service):
+        """Block until a request can be sent to a service"""
+        delay = self.reserve(service)
+        if delay:
+            time.sleep(delay)
+
+
+RETRY_BUDGET = RetryBudget()
+RATE_LIMITER = RateLimiter()
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(service):
+    with _circuit_breakers_lock:
+        if service not in _circuit_breakers:
+            _circuit_breakers[service] = CircuitBreaker(service)
+        return _circuit_breakers[service]
+
+
+def reset_circuit_breakers():
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
+
+
+def get_retry_stats():
+    """Retry budget use and circuit breaker states, for logging"""
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    return {
+        "retries": RETRY_BUDGET.spent,
+        "circuit_breakers": {
+            breaker.service: {
+                "open": breaker.is_open,
+                "trips": breaker.trips,
+                "failures": breaker.failures,
+            }
+            for breaker in breakers
+        },
+    }
+
+
+@contextlib.contextmanager
+def retry_cycle(name):
+    """Give a new retry budget to a cycle and log its retries at the end"""
+    RETRY_BUDGET.reset()
+    try:
+        yield
+    finally:
+        stats = get_retry_stats()
+        open_breakers = [
+            service
+            for service, breaker in stats["circuit_breakers"].items()
+            if breaker["open"]
+        ]
+        if open_breakers:
+            LOG.warn(
+                f"{name} cycle used {stats['retries']} OpenStack retries, "
+                f"open circuit breakers: {', '.join(open_breakers)}"
+            )
+        else:
+            LOG.debug(f"{name} cycle used {stats['retries']} OpenStack retries")
+
+
+class WaitExponentialFromConf(tenacity.wait_exponential):
+    """wait_exponential reading its max from the live configuration"""
+
+    def __call__(self, retry_state):
+        self.max = CONF.openstack.max_retry_interval
+        return super(WaitExponentialFromConf, self).__call__(retry_state)
+
+
+class StopFromConf(tenacity.stop.stop_base):
+    """Stop after CONF.openstack.retry_timeout, or earlier when the
+    service's circuit breaker is open or the retry budget is spent.
+    """
+
+    def __init__(self, service=None):
+        self.service = service
+
+    def __call__(self, retry_state):
+        if retry_state.seconds_since_start >= CONF.openstack.retry_timeout:
+            return True
+        if self.service is not None and get_circuit_breaker(self.service).is_open:
+            return True
+        return not RETRY_BUDGET.consume()
+
+
 class RetryHTTPError(tenacity.retry_if_exception):
     """Retry strategy that retries if the exception is an ``HTTPError`` with
     a abnormal status code.
+
+    With a service, server errors, connection failures and successes are
+    also recorded in its circuit breaker.
     """
 
-    def __init__(self):
+    def __init__(self, service=None):
+        self.service = service
+
         def is_http_error(exception):
+            if isinstance(exception, CircuitOpenError):
+                return False
             # Make sure we don't retry on codes in skip list (default: [404]),
             # as not found could be an expected status.
             skip_codes = CONF.openstack.skip_retry_codes
@@ -26,6 +286,8 @@ class RetryHTTPError(tenacity.retry_if_exception):
                 isinstance(exception, exceptions.HttpException)
                 and str(exception.status_code) not in skip_codes
             )
+            if self.service is not None and _is_service_failure(exception):
+                get_circuit_breaker(self.service).record_failure()
             if result:
                 LOG.debug(
                     f"Getting HttpException {exception} (status "
@@ -36,30 +298,247 @@ class RetryHTTPError(tenacity.retry_if_exception):
 
         super().__init__(predicate=is_http_error)
 
+    def __call__(self, retry_state):
+        if self.service is not None and not retry_state.outcome.failed:
+            get_circuit_breaker(self.service).record_success()
+        return super().__call__(retry_state)
+
+
+def _is_server_error(status_code):
+    return status_code is not None and (
+        int(status_code) >= 500 or int(status_code) == 429
+    )
+
+
+def _is_service_failure(exception):
+    # keystoneauth raises ConnectFailure and ConnectTimeout, the latter
+    # for read timeouts too.
+    if isinstance(exception, ks_exceptions.RetriableConnectionFailure):
+        return True
+    return isinstance(exception, exceptions.HttpException) and _is_server_error(
+        exception.status_code
+    )
+
+
+def retry_on_http_error(service, rate_limit=True):
+    """Retry a call to an OpenStack service on HTTP errors
+
+    The limits are read from the configuration at every call. A call to a
+    service whose circuit breaker is open fails fast with CircuitOpenError.
+
+    :param service: the service type called, like compute
+    :param rate_limit: wait for RATE_LIMITER before every attempt, callers
+                       sending the requests themselves set it to False
+    """
+
+    def check_circuit_breaker(retry_state):
+        get_circuit_breaker(service).check()
+        if rate_limit:
+            RATE_LIMITER.acquire(service)
+
+    return tenacity.retry(
+        retry=RetryHTTPError(service),
+        wait=WaitExponentialFromConf(),
+        reraise=True,
+        stop=StopFromConf(service),
+        before=check_circuit_breaker,
+    )
+
+
+class SharedHTTPAdapter(ks_session.TCPKeepAliveAdapter):
+    """HTTP adapter shared by every connection of a ConnectionPool
+
+    Each project connection gets its own keystoneauth session. Mounting
+    this adapter on all of them makes them share one urllib3 pool per
+    endpoint, so an open TCP/TLS connection to Nova or Cinder is reused
+    whichever project the next request is made for.
+    """
 
-class OpenstackSDK:
     def __init__(self):
-        self.conn_list = {}
-        self.conn = auth.create_connection()
+        super(SharedHTTPAdapter, self).__init__(
+            pool_connections=CONF.openstack.http_pool_connections,
+            pool_maxsize=CONF.openstack.http_pool_maxsize,
+        )
 
-    def set_project(self, project):
-        LOG.debug(_("Connect as project %s" % project.get("name")))
-        project_id = project.get("id")
+    def init_poolmanager(self, *args, **kwargs):
+        socket_options = [
+            (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        for name, value in (
+            ("TCP_KEEPIDLE", CONF.openstack.tcp_keepalive_idle),
+            ("TCP_KEEPINTVL", CONF.openstack.tcp_keepalive_interval),
+            ("TCP_KEEPCNT", CONF.openstack.tcp_keepalive_count),
+        ):
+            # Not every platform supports all of them
+            if hasattr(socket, name):
+                socket_options.append(
+                    (socket.IPPROTO_TCP, getattr(socket, name), value)
+                )
+        kwargs.setdefault("socket_options", socket_options)
+        super(SharedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of OpenStack connections keyed by project id
+
+    The pool is meant to live as long as the service, so the project
+    connections and their tokens are reused across cycles. The least
+    recently used project connection is dropped once there are more than
+    CONF.openstack.connection_pool_size of them, they are all kept if it
+    is 0. A token expiring within
+    CONF.openstack.token_refresh_margin seconds is invalidated when its
+    connection is handed out, so it is renewed before the next request
+    instead of failing mid-cycle. All the connections send their requests
+    through one SharedHTTPAdapter.
+    """
+
+    def __init__(self, size=None):
+        self.size = size if size is not None else CONF.openstack.connection_pool_size
+        self.http_adapter = SharedHTTPAdapter()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._base_conn = None
+        self._conns = collections.OrderedDict()
 
-        if project_id not in self.conn_list:
+    @staticmethod
+    def _is_expiring(conn):
+        auth_plugin = getattr(getattr(conn, "session", None), "auth", None)
+        auth_ref = getattr(auth_plugin, "auth_ref", None)
+        return auth_ref is not None and auth_ref.will_expire_soon(
+            CONF.openstack.token_refresh_margin
+        )
+
+    def _refresh_token(self, conn):
+        if self._is_expiring(conn):
+            LOG.debug("Token is about to expire, renewing it.")
+            conn.session.auth.invalidate()
+
+    def renew(self, conn):
+        """Get a new token for one connection
+
+        Only this connection authenticates again, the other pooled
+        connections keep their tokens.
+        """
+        conn.session.auth.invalidate()
+        conn.session.get_token()
+
+    def renew_expiring(self):
+        """Renew the tokens expiring within the refresh margin
+
+        Meant to run in the background, so the tokens are renewed before
+        a discovery or rotation pass needs them. Connections are renewed
+        one by one outside of the pool lock.
+
+        :return: number of renewed tokens
+        """
+        with self._lock:
+            conns = list(self._conns.values())
+            if self._base_conn is not None:
+                conns.append(self._base_conn)
+        renewed = 0
+        for conn in conns:
+            if not self._is_expiring(conn):
+                continue
+            try:
+                self.renew(conn)
+                renewed += 1
+            except Exception as ex:
+                LOG.warn(f"Failed to renew token: {ex}")
+        return renewed
+
+    def _share_http_adapter(self, conn):
+        for prefix in ("https://", "http://"):
+            conn.session.session.mount(prefix, self.http_adapter)
+
+    def get_base(self):
+        """Return the connection of the configured credentials"""
+        with self._lock:
+            if self._base_conn is None:
+                self._base_conn = auth.create_connection()
+                self._share_http_adapter(self._base_conn)
+            else:
+                self._refresh_token(self._base_conn)
+            return self._base_conn
+
+    def get(self, project):
+        """Return the connection scoped to a project
+
+        :param project: the project to connect as.
+        :type: openstack.identity.v3.project.Project
+        """
+        base_conn = self.get_base()
+        project_id = project.get("id")
+        with self._lock:
+            conn = self._conns.get(project_id)
+            if conn is not None:
+                self.hits += 1
+                self._conns.move_to_end(project_id)
+                self._refresh_token(conn)
+                return conn
+            self.misses += 1
             LOG.debug(_("Initiate connection for project %s" % project.get("name")))
-            conn = self.conn.connect_as_project(project)
-            self.conn_list[project_id] = conn
+            conn = base_conn.connect_as_project(project)
+            self._share_http_adapter(conn)
+            self._conns[project_id] = conn
+            # Evicted connections are not closed, a thread may still be
+            # using one of them.
+            while self.size and len(self._conns) > self.size:
+                self._conns.popitem(last=False)
+                self.evictions += 1
+            return conn
+
+    def clear(self):
+        """Drop every connection, new ones are authenticated again"""
+        with self._lock:
+            self._base_conn = None
+            self._conns.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._conns),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class OpenstackSDK:
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else ConnectionPool()
+        self.pool.get_base()
+        # The project set by set_project is per thread, so threads can
+        # act on different projects with the same OpenstackSDK.
+        self._local = threading.local()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.pool.get_base()
+        return conn
+
+    @conn.setter
+    def conn(self, conn):
+        self._local.conn = conn
+
+    def set_project(self, project):
         LOG.debug(_("Connect as project %s" % project.get("name")))
-        self.conn = self.conn_list[project_id]
+        self.conn = self.pool.get(project)
+
+    def reset_project(self):
+        """Go back to the base connection in this thread"""
+        self._local.conn = None
+
+    def renew_token(self):
+        """Renew the token of the connection in use by this thread"""
+        self.pool.renew(self.conn)
 
     # user
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("identity")
     def get_user_id(self):
         user_name = self.conn.config.auth["username"]
         if "user_domain_id" in self.conn.config.auth:
@@ -72,33 +551,18 @@ class OpenstackSDK:
             user = self.conn.get_user(name_or_id=user_name)
         return user.id
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("identity")
     def get_role_assignments(self, project_id, user_id=None):
         filters = {"project": project_id}
         if user_id:
             filters["user"] = user_id
         return self.conn.list_role_assignments(filters=filters)
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("identity")
     def get_user(self, user_id):
         return self.conn.get_user(name_or_id=user_id)
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("identity")
     def get_project_member_emails(self, project_id):
         members = self.get_role_assignments(project_id)
         emails = []
@@ -115,21 +579,11 @@ class OpenstackSDK:
                         emails.append(user.email)
         return emails
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("identity")
     def get_projects(self):
         return self.conn.list_projects()
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("compute")
     def get_servers(self, project_id=None, all_projects=True, details=True):
         if project_id is not None:
             return self.conn.compute.servers(
@@ -140,27 +594,56 @@ class OpenstackSDK:
         else:
             return self.conn.compute.servers(details=details, all_projects=all_projects)
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("block_storage")
     def get_volume(self, uuid, project_id):
         return self.conn.get_volume_by_id(uuid)
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("block_storage")
+    def get_volumes(self, all_projects=True, details=True):
+        # The generator follows the pagination links, consume it here so
+        # the retry covers every page.
+        return list(
+            self.conn.block_storage.volumes(
+                details=details,
+                all_projects=all_projects,
+                limit=CONF.openstack.list_page_size,
+            )
+        )
+
+    @retry_on_http_error("block_storage")
     def get_backup(self, uuid, project_id=None):
         try:
             return self.conn.get_volume_backup(uuid)
         except exceptions.ResourceNotFound:
             return None
 
+    @retry_on_http_error("block_storage")
+    def get_backups(self, all_projects=True, details=True, since=None, **filters):
+        """List backups, newest first
+
+        :param since: stop listing at the first backup created before this
+                      time, so only the pages covering it are requested
+        :param filters: extra query filters, like status
+        """
+        if since is not None:
+            since = timeutils.normalize_time(since)
+        backups = []
+        for backup in self.conn.block_storage.backups(
+            details=details,
+            all_projects=all_projects,
+            limit=CONF.openstack.list_page_size,
+            sort_key="created_at",
+            sort_dir="desc",
+            **filters,
+        ):
+            if since is not None and (
+                timeutils.normalize_time(timeutils.parse_isotime(backup.created_at))
+                < since
+            ):
+                break
+            backups.append(backup)
+        return backups
+
     def create_backup(
         self,
         volume_id,
@@ -170,6 +653,7 @@ class OpenstackSDK:
         name=None,
         incremental=False,
     ):
+        RATE_LIMITER.acquire("block_storage")
         return self.conn.create_volume_backup(
             volume_id=volume_id,
             force=force,
@@ -178,12 +662,7 @@ class OpenstackSDK:
             incremental=incremental,
         )
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("block_storage")
     def delete_backup(self, uuid, project_id=None, force=False):
         # Note(Alex): v3 is not supporting force delete?
         # conn.block_storage.delete_backup(
@@ -197,23 +676,24 @@ class OpenstackSDK:
         except exceptions.ResourceNotFound:
             return None
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    def delete_backup_once(self, uuid, project_id=None, force=False):
+        """Request the deletion of a backup without retrying it
+
+        The circuit breaker and the rate limiter still apply, but a 429 or
+        5xx answer is raised at once, so the caller can slow down.
+        """
+        delete_backup = OpenstackSDK.delete_backup.retry_with(
+            stop=tenacity.stop_after_attempt(1)
+        )
+        return delete_backup(self, uuid, project_id=project_id, force=force)
+
+    @retry_on_http_error("block_storage")
     def get_backup_quota(self, project_id):
         # quota = conn.get_volume_quotas(project_id)
         quota = self._get_volume_quotas(project_id)
         return quota.backups
 
-    @tenacity.retry(
-        retry=RetryHTTPError(),
-        wait=tenacity.wait_exponential(max=CONF.openstack.max_retry_interval),
-        reraise=True,
-        stop=tenacity.stop_after_delay(CONF.openstack.retry_timeout),
-    )
+    @retry_on_http_error("block_storage")
     def get_backup_gigabytes_quota(self, project_id):
         # quota = conn.get_volume_quotas(project_id)
         quota = self._get_volume_quotas(project_id)
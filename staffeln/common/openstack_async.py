@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import urllib.parse
+
+from keystoneauth1 import exceptions as ks_exceptions
+from openstack import exceptions
+from openstack.block_storage.v3 import backup as _backup
+from openstack.block_storage.v3 import volume as _volume
+from openstack.cloud import meta
+from openstack.compute.v2 import server as _server
+from oslo_log import log
+
+from staffeln import conf
+from staffeln.common.openstack import RATE_LIMITER, retry_on_http_error
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+CONF = conf.CONF
+LOG = log.getLogger(__name__)
+
+
+class AsyncOpenstackSDK(object):
+    """Asyncio facade of OpenstackSDK
+
+    Offers the OpenstackSDK calls made once per volume or backup as
+    coroutines, so a single thread can keep thousands of them in flight
+    with asyncio.gather. Requests are sent with aiohttp, bounded by
+    CONF.openstack.async_connection_limit. Tokens and endpoints come from
+    the connections of a ConnectionPool, a call for a project uses the
+    pooled connection of that project.
+
+    Needs the optional aiohttp dependency, ``pip install staffeln[async]``.
+
+    Usage::
+
+        async with AsyncOpenstackSDK(pool) as sdk:
+            volumes = await asyncio.gather(
+                *[sdk.get_volume(v, project_id) for v in volume_ids]
+            )
+    """
+
+    def __init__(self, pool):
+        if aiohttp is None:
+            raise ImportError(
+                "aiohttp is required by AsyncOpenstackSDK, install staffeln[async]"
+            )
+        self.pool = pool
+        self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(
+            limit=CONF.openstack.async_connection_limit,
+            limit_per_host=CONF.openstack.async_connection_limit_per_host,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=CONF.openstack.async_request_timeout),
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_auth(self, project_id, service_type):
+        if project_id is None:
+            conn = self.pool.get_base()
+        else:
+            conn = self.pool.get({"id": project_id})
+        endpoint = getattr(conn, service_type).get_endpoint()
+        return conn.session.get_token(), endpoint.rstrip("/")
+
+    async def _request(
+        self, method, service_type, path, project_id=None, params=None, json=None
+    ):
+        delay = RATE_LIMITER.reserve(service_type)
+        if delay:
+            await asyncio.sleep(delay)
+        # Getting a token may call Keystone, keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        token, endpoint = await loop.run_in_executor(
+            None, self._get_auth, project_id, service_type
+        )
+        try:
+            async with self._session.request(
+                method,
+                endpoint + path,
+                params=params,
+                json=json,
+                headers={"X-Auth-Token": token, "Accept": "application/json"},
+            ) as resp:
+                if resp.status >= 400:
+                    ex = exceptions.HttpException(message=await resp.text())
+                    ex.status_code = resp.status
+                    raise ex
+                if resp.status == 204:
+                    return None
+                return await resp.json(content_type=None)
+        # Raise what keystoneauth raises for the synchronous calls, so the
+        # circuit breakers count them alike.
+        except asyncio.TimeoutError as ex:
+            raise ks_exceptions.ConnectTimeout(
+                f"Request to {service_type} timed out: {ex}"
+            )
+        except aiohttp.ClientConnectionError as ex:
+            raise ks_exceptions.ConnectFailure(
+                f"Unable to connect to {service_type}: {ex}"
+            )
+
+    @retry_on_http_error("compute", rate_limit=False)
+    async def get_servers(self, project_id=None, all_projects=True, details=True):
+        path = "/servers/detail" if details else "/servers"
+        params = {"limit": CONF.openstack.list_page_size}
+        if all_projects:
+            params["all_tenants"] = 1
+        if project_id is not None:
+            params["project_id"] = project_id
+        servers = []
+        while True:
+            data = await self._request("GET", "compute", path, params=params)
+            servers.extend(
+                _server.Server.existing(**server) for server in data["servers"]
+            )
+            # Nova may return short pages, only a missing next link ends
+            # the listing.
+            marker = self._next_marker(data.get("servers_links"))
+            if marker is None:
+                return servers
+            params["marker"] = marker
+
+    @staticmethod
+    def _next_marker(links):
+        for link in links or []:
+            if link.get("rel") == "next":
+                query = urllib.parse.parse_qs(urllib.parse.urlsplit(link["href"]).query)
+                return query.get("marker", [None])[0]
+        return None
+
+    @retry_on_http_error("block_storage", rate_limit=False)
+    async def get_volume(self, uuid, project_id):
+        data = await self._request(
+            "GET", "block_storage", f"/volumes/{uuid}", project_id=project_id
+        )
+        return _volume.Volume.existing(**data["volume"])
+
+    @retry_on_http_error("block_storage", rate_limit=False)
+    async def get_backup(self, uuid, project_id=None):
+        try:
+            data = await self._request(
+                "GET", "block_storage", f"/backups/{uuid}", project_id=project_id
+            )
+        except exceptions.HttpException as ex:
+            if ex.status_code == 404:
+                return None
+            raise
+        return _backup.Backup.existing(**data["backup"])
+
+    async def create_backup(
+        self,
+        volume_id,
+        project_id,
+        force=True,
+        wait=False,
+        name=None,
+        incremental=False,
+    ):
+        # wait is accepted for the same signature as OpenstackSDK, the
+        # backup is never waited for.
+        data = await self._request(
+            "POST",
+            "block_storage",
+            "/backups",
+            project_id=project_id,
+            json={
+                "backup": {
+                    "volume_id": volume_id,
+                    "force": force,
+                    "name": name,
+                    "incremental": incremental,
+                }
+            },
+        )
+        return _backup.Backup.existing(**data["backup"])
+
+    @retry_on_http_error("block_storage", rate_limit=False)
+    async def delete_backup(self, uuid, project_id=None, force=False):
+        LOG.debug(f"Start deleting backup {uuid} in OpenStack.")
+        try:
+            if force:
+                await self._request(
+                    "POST",
+                    "block_storage",
+                    f"/backups/{uuid}/action",
+                    project_id=project_id,
+                    json={"os-force_delete": {}},
+                )
+            else:
+                await self._request(
+                    "DELETE",
+                    "block_storage",
+                    f"/backups/{uuid}",
+                    project_id=project_id,
+                )
+        except exceptions.HttpException as ex:
+            if ex.status_code == 404:
+                return None
+            raise
+
+    @retry_on_http_error("block_storage", rate_limit=False)
+    async def get_backup_quota(self, project_id):
+        quota = await self._get_volume_quotas(project_id)
+        return quota.backups
+
+    @retry_on_http_error("block_storage", rate_limit=False)
+    async def get_backup_gigabytes_quota(self, project_id):
+        quota = await self._get_volume_quotas(project_id)
+        return quota.backup_gigabytes
+
+    async def _get_volume_quotas(self, project_id, usage=True):
+        """Get volume quotas for a project
+
+        :returns: Munch object with the quotas
+        """
+        data = await self._request(
+            "GET",
+            "block_storage",
+            f"/os-quota-sets/{project_id}",
+            params={"usage": "True"} if usage else None,
+        )
+        return meta.get_and_munchify("quota_set", data)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import re
 
 from dateutil.relativedelta import relativedelta
@@ -39,6 +40,21 @@ def parse_timedelta_string(time_str):
         return None
 
 
+@functools.lru_cache(maxsize=1024)
+def parse_relativedelta(time_str):
+    """Memoized parse of a timedelta string into a relativedelta
+
+    Retention times come from server metadata, where the same few strings
+    are set on many servers.
+
+    :return: the relativedelta, or None if time_str is invalid
+    """
+    time_params = parse_timedelta_string(time_str)
+    if time_params is None:
+        return None
+    return relativedelta(**time_params)
+
+
 def get_current_time():
     return timeutils.utcnow()
 
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import collections
+import itertools
 from datetime import timedelta, timezone
 
+import futurist
 from openstack.exceptions import HttpException as OpenstackHttpException
 from openstack.exceptions import ResourceNotFound as OpenstackResourceNotFound
 from openstack.exceptions import SDKException as OpenstackSDKException
@@ -11,7 +14,7 @@ from oslo_utils import timeutils
 
 import staffeln.conf
 from staffeln import objects
-from staffeln.common import constants, context, openstack
+from staffeln.common import constants, context, openstack, openstack_async
 from staffeln.common import time as xtime
 from staffeln.conductor import result
 from staffeln.i18n import _
@@ -29,7 +32,9 @@ BackupMapping = collections.namedtuple(
         "backup_completed",
         "incremental",
         "created_at",
+        "backup_duration",
     ],
+    defaults=(None,),
 )
 
 QueueMapping = collections.namedtuple(
@@ -49,7 +54,10 @@ QueueMapping = collections.namedtuple(
 
 
 def retry_auth(func):
-    """Decorator to reconnect openstack and avoid token rotation"""
+    """Decorator to renew the token and retry once on token rotation
+
+    Only the connection the call was made with gets a new token.
+    """
 
     def wrapper(self, *args, **kwargs):
         try:
@@ -57,7 +65,7 @@ def retry_auth(func):
         except OpenstackHttpException as ex:
             if ex.status_code == 403:
                 LOG.warn(_("Token has been expired or rotated!"))
-                self.refresh_openstacksdk()
+                self.openstacksdk.renew_token()
                 return func(self, *args, **kwargs)
 
     return wrapper
@@ -68,12 +76,41 @@ class Backup(object):
 
     def __init__(self):
         self.ctx = context.make_context()
+        self.connection_pool = openstack.ConnectionPool()
         self.refresh_openstacksdk()
         self.result = result.BackupResult(self)
         self.project_list = {}
+        self.volume_status_map = {}
+        self.volume_size_map = {}
+        self.volume_backend_map = {}
+        self.server_snapshot = None
 
     def refresh_openstacksdk(self):
-        self.openstacksdk = openstack.OpenstackSDK()
+        """Reset the OpenstackSDK, reusing the pooled connections"""
+        self.openstacksdk = openstack.OpenstackSDK(pool=self.connection_pool)
+
+    def refresh_server_snapshot(self):
+        """Drop the server snapshot so the next user lists servers again"""
+        self.server_snapshot = None
+
+    def get_server_snapshot(self):
+        """Servers of all projects grouped by project id
+
+        Servers are listed with a single all-projects call the first time
+        this is called after refresh_server_snapshot, later callers in the
+        same cycle reuse the result. The snapshot is kept on this
+        controller, so it is only shared by the callers of one worker
+        process, every worker process lists the servers itself.
+
+        :return: servers grouped by project id
+        :return type: Dict<str, List<openstack.compute.v2.server.Server>>
+        """
+        if self.server_snapshot is None:
+            server_snapshot = collections.defaultdict(list)
+            for server in self.openstacksdk.get_servers(all_projects=True):
+                server_snapshot[server.project_id].append(server)
+            self.server_snapshot = server_snapshot
+        return self.server_snapshot
 
     def publish_backup_result(self, purge_on_success=False):
         for project_id, project_name in self.result.project_list:
@@ -97,19 +134,69 @@ class Backup(object):
             context=self.ctx, filters=filters, **kwargs
         )
 
+    def get_retention_candidates(self, cutoff, instance_cutoffs):
+        """Stream the backups older than their retention cutoff
+
+        :param cutoff: the default retention cutoff
+        :param instance_cutoffs: instance_id to its custom retention cutoff
+        :type: Dict<str, datetime.datetime>
+        """
+        return objects.Volume.list_retention_candidates(  # pylint: disable=E1120
+            context=self.ctx, cutoff=cutoff, instance_cutoffs=instance_cutoffs
+        )
+
+    def get_backup_children(self, backup_ids):
+        """Find the incremental backups based on a batch of backups
+
+        :param backup_ids: backup ids to look up
+        :return: backup id to the backup ids of its incremental backups
+        :return type: Dict<str, List<str>>
+        """
+        return objects.Volume.get_backup_children(  # pylint: disable=E1120
+            context=self.ctx, backup_ids=backup_ids
+        )
+
     def get_backup_quota(self, project_id):
         return self.openstacksdk.get_backup_quota(project_id)
 
     def get_backup_gigabytes_quota(self, project_id):
         return self.openstacksdk.get_backup_gigabytes_quota(project_id)
 
-    def get_queues(self, filters=None):
-        """Get the list of volume queue columns from the queue_data table"""
+    def get_queues(self, filters=None, read_only=False):
+        """Get the list of volume queue columns from the queue_data table
+
+        :param read_only: return read-only records instead of Queue objects
+        """
         queues = objects.Queue.list(  # pylint: disable=E1120
-            context=self.ctx, filters=filters
+            context=self.ctx, filters=filters, read_only=read_only
         )
         return queues
 
+    def iter_queues(self, filters=None, read_only=False):
+        """Page through the queue_data table
+
+        :param read_only: yield read-only records instead of Queue objects
+        """
+        return objects.Queue.list_iter(  # pylint: disable=E1120
+            context=self.ctx, filters=filters, read_only=read_only
+        )
+
+    def update_queues_status(self, task_ids, from_status, to_status, **values):
+        """Move the tasks still in from_status to to_status
+
+        :param task_ids: ids of the tasks to change
+        :param values: other queue fields to set on the changed tasks
+        :return: the changed tasks
+        :return type: List<Class objects.Queue>
+        """
+        return objects.Queue.bulk_update_status(  # pylint: disable=E1120
+            context=self.ctx,
+            ids=task_ids,
+            from_status=from_status,
+            to_status=to_status,
+            values=values or None,
+        )
+
     def get_queue_task_by_id(self, task_id):
         """Get single volume queue task from the queue_data table"""
         queue = objects.Queue.get_by_id(  # pylint: disable=E1120
@@ -117,9 +204,12 @@ class Backup(object):
         )
         return queue
 
-    def create_queue(self, old_tasks):
+    def create_queue(self, old_tasks=None):
         """Create the queue of all the volumes for backup
 
+        Volumes which still have a planned or in progress task from the
+        previous cycle are skipped by the database while inserting.
+
         :param old_tasks: Task list not completed in the previous cycle
         :type: List<Class objects.Queue>
         """
@@ -127,16 +217,14 @@ class Backup(object):
         LOG.info("Adding new backup tasks to queue.")
         # 1. get the old task list, not finished in the last cycle
         #  and keep till now
-        old_task_volume_list = []
-        for old_task in old_tasks:
-            old_task_volume_list.append(old_task.volume_id)
+        old_task_volumes = {old_task.volume_id for old_task in old_tasks or []}
 
         # 2. add new tasks in the queue which are not existing in the old task
         # list
         task_list = self.check_instance_volumes()
-        for task in task_list:
-            if task.volume_id not in old_task_volume_list:
-                self._volume_queue(task)
+        self._volume_queues(
+            [task for task in task_list if task.volume_id not in old_task_volumes]
+        )
 
     # Backup the volumes attached to which has a specific metadata
     def filter_by_server_metadata(self, metadata):
@@ -151,17 +239,48 @@ class Backup(object):
         else:
             return True
 
+    def prefetch_volume_status(self):
+        """Collect the status of all volumes with paginated list calls
+
+        The result is kept in self.volume_status_map, which
+        filter_by_volume_status consults before falling back to a
+        single volume GET. Volume sizes are kept in self.volume_size_map
+        and volume backends in self.volume_backend_map.
+        """
+        self.volume_status_map = {}
+        self.volume_size_map = {}
+        self.volume_backend_map = {}
+        try:
+            self.openstacksdk.reset_project()
+            volumes = self.openstacksdk.get_volumes(all_projects=True)
+        except OpenstackHttpException as ex:
+            LOG.warn(
+                f"Failed to list volumes for all projects. "
+                f"{str(ex)} (status code: {ex.status_code})."
+            )
+            return
+        for volume in volumes:
+            self.volume_status_map[volume.id] = volume.status
+            self.volume_size_map[volume.id] = volume.size
+            if volume.host:
+                # host@backend#pool
+                self.volume_backend_map[volume.id] = volume.host.split("#")[0]
+        LOG.debug(f"Prefetched status of {len(self.volume_status_map)} volumes.")
+
     # Backup the volumes in in-use and available status
     def filter_by_volume_status(self, volume_id, project_id):
         try:
-            volume = self.openstacksdk.get_volume(volume_id, project_id)
-            if volume is None:
-                return False
-            res = volume["status"] in ("available", "in-use")
+            volume_status = self.volume_status_map.get(volume_id)
+            if volume_status is None:
+                volume = self.openstacksdk.get_volume(volume_id, project_id)
+                if volume is None:
+                    return False
+                volume_status = volume["status"]
+            res = volume_status in ("available", "in-use")
             if not res:
                 reason = _(
                     "Volume %s is not triger new backup task because "
-                    "it is in %s status" % (volume_id, volume["status"])
+                    "it is in %s status" % (volume_id, volume_status)
                 )
                 LOG.info(reason)
                 return reason
@@ -171,27 +290,19 @@ class Backup(object):
             return False
 
     def purge_backups(self, project_id=None):
+        """Delete the completed and failed tasks of a project
+
+        :return: number of deleted tasks
+        """
         LOG.info(f"Start pruge backup tasks for project {project_id}")
-        # We can consider make all these in a single DB command
-        success_tasks = self.get_queues(
-            filters={
-                "backup_status": constants.BACKUP_COMPLETED,
-                "project_id": project_id,
-            }
-        )
-        failed_tasks = self.get_queues(
-            filters={
-                "backup_status": constants.BACKUP_FAILED,
-                "project_id": project_id,
-            }
+        purged = objects.Queue.bulk_delete(  # pylint: disable=E1120
+            context=self.ctx,
+            project_id=project_id,
+            statuses=[constants.BACKUP_COMPLETED, constants.BACKUP_FAILED],
+            chunk_size=CONF.database.bulk_delete_chunk_size,
         )
-        LOG.debug(f"Start purge completed tasks for project {project_id}")
-        for queue in success_tasks:
-            queue.delete_queue()
-
-        LOG.debug(f"Start purge failed tasks for project {project_id}")
-        for queue in failed_tasks:
-            queue.delete_queue()
+        LOG.debug(f"Purged {purged} backup tasks for project {project_id}")
+        return purged
 
     def create_failed_backup_obj(self, task):
         # Create backup object for failed backups, to make sure we
@@ -282,7 +393,15 @@ class Backup(object):
             return False
 
     #  delete all backups forcily regardless of the status
-    def hard_remove_volume_backup(self, backup_object, skip_inc_err=False):
+    def hard_remove_volume_backup(self, backup_object, skip_inc_err=False, retry=True):
+        """Request the deletion of a backup from Cinder
+
+        The backup object is kept until Cinder reports the backup gone.
+
+        :param retry: retry the deletion request on HTTP errors, without it
+                      a 429 or 5xx answer is returned as DELETION_THROTTLED
+        :return: one of the constants.DELETION_* outcomes
+        """
         try:
             project_id = backup_object.project_id
             if project_id not in self.project_list:
@@ -295,7 +414,7 @@ class Backup(object):
                 )
                 # Don't remove backup object, keep it and retry on next
                 # periodic task backup_object.delete_backup()
-                return
+                return constants.DELETION_SKIPPED
 
             self.openstacksdk.set_project(self.project_list[project_id])
             backup = self.openstacksdk.get_backup(
@@ -307,14 +426,29 @@ class Backup(object):
                     "Openstack or cinder-backup is not existing in the "
                     "cloud. Start removing backup object from Staffeln."
                 )
-                return backup_object.delete_backup()
+                backup_object.delete_backup()
+                return constants.DELETION_GONE
 
-            self.openstacksdk.delete_backup(uuid=backup_object.backup_id)
+            if retry:
+                self.openstacksdk.delete_backup(uuid=backup_object.backup_id)
+            else:
+                self.openstacksdk.delete_backup_once(uuid=backup_object.backup_id)
             # Don't remove backup until it's officially removed from Cinder
             # backup_object.delete_backup()
+            return constants.DELETION_STARTED
         except Exception as e:
             if skip_inc_err and ("Incremental backups exist for this backup" in str(e)):
                 LOG.debug(str(e))
+                return constants.DELETION_SKIPPED
+            elif isinstance(e, OpenstackHttpException) and (
+                e.status_code is not None
+                and (int(e.status_code) >= 500 or int(e.status_code) == 429)
+            ):
+                LOG.info(
+                    f"Backup {backup_object.backup_id} deletion throttled by "
+                    f"Cinder ({e.status_code}). Will retry later."
+                )
+                return constants.DELETION_THROTTLED
             else:
                 LOG.info(
                     f"Backup {backup_object.backup_id} deletion failed. "
@@ -324,13 +458,38 @@ class Backup(object):
 
                 # Don't remove backup object, keep it and retry on next
                 # periodic task backup_object.delete_backup()
+                return constants.DELETION_FAILED
 
     def update_project_list(self):
         projects = self.openstacksdk.get_projects()
         for project in projects:
             self.project_list[project.id] = project
 
-    def _is_backup_required(self, volume_id):
+    def get_backup_history(self, volume_ids):
+        """Look up the backup history of a batch of volumes
+
+        :param volume_ids: Target volume ids
+        :type: List<uuid string>
+
+        :return: volume id to a tuple of (latest backup created_at, full
+                 backup found in the last CONF.conductor.full_backup_depth
+                 backups), or None if the lookup failed
+        :return type: Dict<str, tuple>
+        """
+        try:
+            return objects.Volume.get_backup_history(  # pylint: disable=E1120
+                context=self.ctx,
+                volume_ids=volume_ids,
+                depth=CONF.conductor.full_backup_depth,
+            )
+        except Exception as e:
+            LOG.debug(
+                "Failed to get backup history of volumes in batch, "
+                f"fall back to look up volume by volume. Reason: {e}"
+            )
+        return None
+
+    def _is_backup_required(self, volume_id, backup_history=None):
         """Decide if the backup required based on the backup history
 
         If there is any backup created during certain time,
@@ -339,6 +498,9 @@ class Backup(object):
 
         :param volume_id: Target volume id
         :type: uuid string
+        :param backup_history: Result of get_backup_history, the backup
+                               history is queried when not provided
+        :type: Dict<str, tuple>
 
         :return: if new backup required
         :return type: bool
@@ -350,11 +512,15 @@ class Backup(object):
                 return True
             interval = CONF.conductor.backup_min_interval
             threshold_strtime = timeutils.utcnow() - timedelta(seconds=interval)
+            if backup_history is not None:
+                history = backup_history.get(volume_id)
+                return history is None or history[0] <= threshold_strtime
             backups = self.get_backups(
                 filters={
                     "volume_id__eq": volume_id,
                     "created_at__gt": threshold_strtime.astimezone(timezone.utc),
-                }
+                },
+                read_only=True,
             )
             if backups:
                 return False
@@ -367,7 +533,7 @@ class Backup(object):
             )
         return True
 
-    def _is_incremental(self, volume_id):
+    def _is_incremental(self, volume_id, backup_history=None):
         """Decide the backup method based on the backup history
 
         It queries to select the last N backups from backup table and
@@ -376,6 +542,9 @@ class Backup(object):
 
         :param volume_id: Target volume id
         :type: uuid string
+        :param backup_history: Result of get_backup_history, the backup
+                               history is queried when not provided
+        :type: Dict<str, tuple>
 
         :return: if backup method is incremental or not
         :return type: bool
@@ -384,11 +553,15 @@ class Backup(object):
         try:
             if CONF.conductor.full_backup_depth == 0:
                 return False
+            if backup_history is not None:
+                history = backup_history.get(volume_id)
+                return history is not None and history[1]
             backups = self.get_backups(
                 filters={"volume_id__eq": volume_id},
                 limit=CONF.conductor.full_backup_depth,
                 sort_key="id",
                 sort_dir="desc",
+                read_only=True,
             )
             for bk in backups:
                 if bk.incremental:
@@ -408,14 +581,111 @@ class Backup(object):
         Function first list all the servers in the project and get the volumes
         that are attached to the instance.
 
+        Projects are scanned in parallel by up to
+        CONF.conductor.discovery_workers threads. With
+        CONF.conductor.discovery_all_projects, servers are listed once for
+        all projects and joined against the project list. Otherwise, with
+        CONF.conductor.discovery_async, the servers of every project are
+        listed concurrently first.
+
         Generate backup candidate list for later create tasks in queue
         """
         queues_map = []
         self.refresh_openstacksdk()
+        self.refresh_server_snapshot()
+        self.prefetch_volume_status()
         projects = self.openstacksdk.get_projects()
         for project in projects:
-            empty_project = True
             self.project_list[project.id] = project
+
+        server_snapshot = None
+        if CONF.conductor.discovery_all_projects:
+            try:
+                server_snapshot = self.get_server_snapshot()
+            except OpenstackHttpException as ex:
+                LOG.warn(
+                    f"Failed to list servers for all projects, fall back to "
+                    f"list servers per project. {str(ex)} "
+                    f"(status code: {ex.status_code})."
+                )
+        project_servers = {}
+        if server_snapshot is None and CONF.conductor.discovery_async:
+            project_servers = self.list_project_servers_async(projects)
+
+        with futurist.ThreadPoolExecutor(
+            max_workers=CONF.conductor.discovery_workers
+        ) as executor:
+            futures = []
+            for project in projects:
+                # Projects without listed servers list them on their own.
+                servers = project_servers.get(project.id)
+                if server_snapshot is not None:
+                    servers = server_snapshot.get(project.id, [])
+                futures.append(
+                    (
+                        project,
+                        executor.submit(self._check_project_volumes, project, servers),
+                    )
+                )
+            for project, future in futures:
+                try:
+                    queues_map.extend(future.result())
+                except Exception as ex:  # pylint: disable=W0703
+                    LOG.warn(
+                        f"Failed to collect backup tasks for project "
+                        f"{project.id}. {str(ex)}"
+                    )
+        return queues_map
+
+    def list_project_servers_async(self, projects):
+        """List the servers of every project concurrently
+
+        The calls are sent from this thread with AsyncOpenstackSDK. The
+        projects whose servers fail to be listed are left out of the result.
+
+        :param projects: projects to list the servers of
+        :return: servers grouped by project id
+        :return type: Dict<str, List<openstack.compute.v2.server.Server>>
+        """
+
+        async def list_servers():
+            async with openstack_async.AsyncOpenstackSDK(self.connection_pool) as sdk:
+                return await asyncio.gather(
+                    *[sdk.get_servers(project_id=project.id) for project in projects],
+                    return_exceptions=True,
+                )
+
+        try:
+            results = asyncio.run(list_servers())
+        except ImportError as ex:
+            LOG.warn(f"Failed to list servers concurrently. {str(ex)}")
+            return {}
+        project_servers = {}
+        for project, servers in zip(projects, results):
+            if isinstance(servers, Exception):
+                LOG.warn(
+                    f"Failed to list servers in project {project.id}, list "
+                    f"them again on their own. {str(servers)}"
+                )
+                continue
+            project_servers[project.id] = servers
+        return project_servers
+
+    def _check_project_volumes(self, project, servers=None):
+        """Generate backup candidate list for a single project
+
+        :param project: Target project
+        :type: openstack.identity.v3.project.Project
+        :param servers: Servers of the project, listed from the project
+                        when not provided.
+        :type: List<openstack.compute.v2.server.Server>
+
+        :return: backup candidates of the project
+        :return type: List<QueueMapping>
+        """
+        queues_map = []
+        empty_project = True
+        if servers is None:
             try:
                 servers = self.openstacksdk.get_servers(project_id=project.id)
             except OpenstackHttpException as ex:
@@ -423,56 +693,66 @@ class Backup(object):
                     f"Failed to list servers in project {project.id}. "
                     f"{str(ex)} (status code: {ex.status_code})."
                 )
-                continue
-            for server in servers:
-                if not self.filter_by_server_metadata(server.metadata):
+                return queues_map
+        servers = [
+            server
+            for server in servers
+            if self.filter_by_server_metadata(server.metadata)
+        ]
+        # Look up the backup history of every candidate volume of the
+        # project at once.
+        backup_history = self.get_backup_history(
+            [volume["id"] for server in servers for volume in server.attached_volumes]
+        )
+        for server in servers:
+            if empty_project:
+                empty_project = False
+                self.result.add_project(project.id, project.name)
+            for volume in server.attached_volumes:
+                filter_result = self.filter_by_volume_status(volume["id"], project.id)
+
+                if not filter_result:
+                    continue
+                backup_required = self._is_backup_required(
+                    volume["id"], backup_history=backup_history
+                )
+                if not backup_required:
                     continue
-                if empty_project:
-                    empty_project = False
-                    self.result.add_project(project.id, project.name)
-                for volume in server.attached_volumes:
-                    filter_result = self.filter_by_volume_status(
-                        volume["id"], project.id
-                    )
 
-                    if not filter_result:
-                        continue
-                    backup_required = self._is_backup_required(volume["id"])
-                    if not backup_required:
-                        continue
-
-                    if "name" not in volume or not volume["name"]:
-                        volume_name = volume["id"]
-                    else:
-                        volume_name = volume["name"][:100]
-                    if filter_result is True:
-                        backup_status = constants.BACKUP_PLANNED
-                        reason = None
-                    else:
-                        backup_status = constants.BACKUP_FAILED
-                        reason = filter_result
-                    incremental = self._is_incremental(volume["id"])
-                    backup_method = "Incremental" if incremental else "Full"
-                    LOG.info(
-                        "Prapering %s backup task for volume %s",
-                        backup_method,
-                        volume["id"],
-                    )
-                    queues_map.append(
-                        QueueMapping(
-                            project_id=project.id,
-                            volume_id=volume["id"],
-                            backup_id="NULL",
-                            instance_id=server.id,
-                            backup_status=backup_status,
-                            # Only keep the last 100 chars of instance_name and
-                            # volume_name for forming backup_name
-                            instance_name=server.name[:100],
-                            volume_name=volume_name,
-                            incremental=incremental,
-                            reason=reason,
-                        )
+                if "name" not in volume or not volume["name"]:
+                    volume_name = volume["id"]
+                else:
+                    volume_name = volume["name"][:100]
+                if filter_result is True:
+                    backup_status = constants.BACKUP_PLANNED
+                    reason = None
+                else:
+                    backup_status = constants.BACKUP_FAILED
+                    reason = filter_result
+                incremental = self._is_incremental(
+                    volume["id"], backup_history=backup_history
+                )
+                backup_method = "Incremental" if incremental else "Full"
+                LOG.info(
+                    "Prapering %s backup task for volume %s",
+                    backup_method,
+                    volume["id"],
+                )
+                queues_map.append(
+                    QueueMapping(
+                        project_id=project.id,
+                        volume_id=volume["id"],
+                        backup_id="NULL",
+                        instance_id=server.id,
+                        backup_status=backup_status,
+                        # Only keep the last 100 chars of instance_name and
+                        # volume_name for forming backup_name
+                        instance_name=server.name[:100],
+                        volume_name=volume_name,
+                        incremental=incremental,
+                        reason=reason,
                     )
+                )
         return queues_map
 
     def collect_instance_retention_map(self):
@@ -485,15 +765,15 @@ class Backup(object):
         self.refresh_openstacksdk()
 
         try:
-            servers = self.openstacksdk.get_servers(all_projects=True)
+            server_snapshot = self.get_server_snapshot()
         except OpenstackHttpException as ex:
-            servers = []
+            server_snapshot = {}
             LOG.warn(
                 f"Failed to list servers for all projects. "
                 f"{str(ex)} (status code: {ex.status_code})."
             )
 
-        for server in servers:
+        for server in itertools.chain.from_iterable(server_snapshot.values()):
             if CONF.conductor.retention_metadata_key in server.metadata:
                 server_retention_time = server.metadata[
                     CONF.conductor.retention_metadata_key
@@ -514,33 +794,30 @@ class Backup(object):
                     )
         return retention_map
 
-    def _volume_queue(self, task):
-        """Commits one backup task to queue table
+    def _volume_queues(self, tasks):
+        """Commits backup tasks to queue table in bulk
 
-        :param task: One backup task
-        :type: QueueMapping
+        :param tasks: Backup tasks
+        :type: List<QueueMapping>
         """
-        volume_queue = objects.Queue(self.ctx)
-        volume_queue.backup_id = task.backup_id
-        volume_queue.volume_id = task.volume_id
-        volume_queue.instance_id = task.instance_id
-        volume_queue.project_id = task.project_id
-        volume_queue.backup_status = task.backup_status
-        volume_queue.instance_name = task.instance_name
-        volume_queue.volume_name = task.volume_name
-        # NOTE(Oleks): Backup mode is inherited from backup service.
-        # Need to keep and navigate backup mode history, to decide a different
-        # mode per volume
-        volume_queue.incremental = task.incremental
-
-        backup_method = "Incremental" if task.incremental else "Full"
-        LOG.info(
-            _(
-                ("Schedule %s backup task for volume %s.")
-                % (backup_method, task.volume_id)
+        if not tasks:
+            return
+        for task in tasks:
+            # NOTE(Oleks): Backup mode is inherited from backup service.
+            # Need to keep and navigate backup mode history, to decide a
+            # different mode per volume
+            backup_method = "Incremental" if task.incremental else "Full"
+            LOG.info(
+                _(
+                    ("Schedule %s backup task for volume %s.")
+                    % (backup_method, task.volume_id)
+                )
             )
+        return objects.Queue.bulk_create(  # pylint: disable=E1120
+            context=self.ctx,
+            values_list=[task._asdict() for task in tasks],
+            skip_statuses=constants.BACKUP_ACTIVE_STATUSES,
         )
-        return volume_queue.create()
 
     def create_volume_backup(self, task):
         """Initiate the backup of the volume
@@ -665,8 +942,27 @@ class Backup(object):
     def process_non_existing_backup(self, task):
         task.delete_queue()
 
-    def process_available_backup(self, task):
+    def process_available_backup(self, task, backup_gen=None):
         LOG.info("Backup of the volume %s is successful." % task.volume_id)
+        # The task was last updated when the backup started.
+        started_at = task.updated_at or task.created_at
+        # Cinder last updated the backup when it completed, the backup may
+        # have been available for a while when it's polled.
+        completed_at = timeutils.utcnow()
+        if backup_gen is not None and backup_gen.updated_at:
+            completed_at = timeutils.parse_isotime(backup_gen.updated_at)
+        backup_duration = None
+        if started_at is not None:
+            # Records carry naive UTC times, objects timezone aware ones.
+            backup_duration = max(
+                int(
+                    (
+                        timeutils.normalize_time(completed_at)
+                        - timeutils.normalize_time(started_at)
+                    ).total_seconds()
+                ),
+                0,
+            )
         # 1. save success backup in the backup table
         self._volume_backup(
             BackupMapping(
@@ -677,6 +973,7 @@ class Backup(object):
                 backup_completed=1,
                 incremental=task.incremental,
                 created_at=timeutils.utcnow(),
+                backup_duration=backup_duration,
             )
         )
         task.backup_status = constants.BACKUP_COMPLETED
@@ -686,11 +983,73 @@ class Backup(object):
         # treat same as the available backup for now
         self.process_available_backup(task)
 
-    def check_volume_backup_status(self, queue):
+    def get_expected_backup_remaining(self, queues):
+        """Estimate the remaining time of backups in progress
+
+        The estimate is the average duration of the previous backups of
+        the same kind for the volume. Volumes without such history fall
+        back to their size multiplied by
+        CONF.conductor.backup_poll_seconds_per_gb.
+
+        :param queues: WIP tasks
+        :type: List<Class objects.Queue or its records>
+
+        :return: task id to the expected remaining seconds
+        :return type: Dict<int, float>
+        """
+        try:
+            durations = objects.Volume.get_backup_durations(  # pylint: disable=E1120
+                context=self.ctx, volume_ids=[queue.volume_id for queue in queues]
+            )
+        except Exception as e:
+            LOG.debug(f"Failed to get backup durations. Reason: {e}")
+            durations = {}
+        now = timeutils.utcnow()
+        remaining = {}
+        for queue in queues:
+            duration = durations.get((queue.volume_id, bool(queue.incremental)))
+            if duration is None:
+                size = self.volume_size_map.get(queue.volume_id) or 0
+                duration = size * CONF.conductor.backup_poll_seconds_per_gb
+            # Records carry naive UTC times, objects timezone aware ones.
+            started_at = timeutils.normalize_time(queue.updated_at or queue.created_at)
+            remaining[queue.id] = duration - (now - started_at).total_seconds()
+        return remaining
+
+    def get_backup_map(self, since):
+        """Collect the recent backups with paginated list calls
+
+        :param since: creation time of the oldest backup to collect
+        :type: datetime
+
+        :return: backup id to backup, or None if the backups can't be listed
+        :return type: Dict<str, openstack.block_storage.v3.backup.Backup>
+        """
+        try:
+            # check_volume_backup_status moves the connection to the
+            # project of the task, list every project from the base one.
+            self.openstacksdk.reset_project()
+            backups = self.openstacksdk.get_backups(
+                all_projects=True,
+                # Leave room for clock differences between Staffeln and
+                # Cinder.
+                since=since - timedelta(seconds=constants.BACKUP_RESULT_CHECK_INTERVAL),
+            )
+        except OpenstackHttpException as ex:
+            LOG.warn(
+                f"Failed to list backups for all projects. "
+                f"{str(ex)} (status code: {ex.status_code})."
+            )
+            return None
+        return {backup.id: backup for backup in backups}
+
+    def check_volume_backup_status(self, queue, backup_map=None):
         """Checks the backup status of the volume
 
         :params: queue: Provide the map of the volume that needs backup
                  status checked.
+        :params: backup_map: Result of get_backup_map, the backup is
+                 fetched when it's not in the map.
         Call the backups api to see if the backup is successful.
         """
         project_id = queue.project_id
@@ -703,20 +1062,27 @@ class Backup(object):
             self.process_non_existing_backup(queue)
             return
         self.openstacksdk.set_project(self.project_list[project_id])
-        backup_gen = self.openstacksdk.get_backup(queue.backup_id)
+        if backup_map and queue.backup_id in backup_map:
+            backup_gen = backup_map[queue.backup_id]
+        else:
+            backup_gen = self.openstacksdk.get_backup(queue.backup_id)
 
-        if backup_gen is None:
-            # TODO(Alex): need to check when it is none
-            LOG.info(
-                _("[Beta] Backup status of %s is returning none." % (queue.backup_id))
-            )
-            self.process_non_existing_backup(queue)
-            return
-        if backup_gen.status == "error":
+            if backup_gen is None:
+                # TODO(Alex): need to check when it is none
+                LOG.info(
+                    _(
+                        "[Beta] Backup status of %s is returning none."
+                        % (queue.backup_id)
+                    )
+                )
+                self.process_non_existing_backup(queue)
+                return
+        backup_status = backup_gen.status
+        if backup_status == "error":
             self.process_failed_backup(queue)
-        elif backup_gen.status == "available":
-            self.process_available_backup(queue)
-        elif backup_gen.status == "creating":
+        elif backup_status == "available":
+            self.process_available_backup(queue, backup_gen)
+        elif backup_status == "creating":
             LOG.info("Waiting for backup of %s to be completed" % queue.volume_id)
         else:  # "deleting", "restoring", "error_restoring" status
             self.process_using_backup(queue)
@@ -734,4 +1100,20 @@ class Backup(object):
         volume_backup.project_id = task.project_id
         volume_backup.backup_completed = task.backup_completed
         volume_backup.incremental = task.incremental
+        volume_backup.backup_duration = task.backup_duration
+        if task.incremental:
+            # Cinder bases an incremental backup on the latest backup of
+            # the volume, which is the last completed one recorded here as
+            # the next backup of a volume is only queued once its previous
+            # one is done. Failed backups are recorded too, but never
+            # become a parent.
+            latest = self.get_backups(
+                filters={"volume_id": task.volume_id, "backup_completed": 1},
+                limit=1,
+                sort_key="id",
+                sort_dir="desc",
+                read_only=True,
+            )
+            if latest:
+                volume_backup.parent_backup_id = latest[0].backup_id
         volume_backup.create()
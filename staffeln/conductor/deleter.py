@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import collections
+import itertools
+import time
+
+from oslo_log import log
+
+import staffeln.conf
+from staffeln.common import constants
+
+LOG = log.getLogger(__name__)
+CONF = staffeln.conf.CONF
+
+
+class BackupDeleter(object):
+    """Delete backups with a bounded number of deletions in progress
+
+    Backups are given as chains, the backups of a chain are deleted one
+    after the other so an incremental backup is gone before its parent is
+    deleted. Backups of different chains are deleted concurrently, up to a
+    window of deletions in progress in Cinder. The window grows by one
+    per window of started deletions, up to
+    CONF.conductor.rotation_max_in_flight, and is halved when Cinder
+    answers with 429 or 5xx errors. Deletions are requested without
+    retries so these answers are seen, the throttled backup is requested
+    again later and its chain waits for it meanwhile. A chain is given up
+    in this rotation when the deletion of one of its backups fails or is
+    skipped.
+
+    The backups being deleted are watched with one listing of the
+    backups in deleting status every CONF.conductor.rotation_poll_interval
+    seconds.
+
+    :param controller: Backup controller
+    :type: staffeln.conductor.backup.Backup
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.max_in_flight = CONF.conductor.rotation_max_in_flight
+        self.window = min(2.0, self.max_in_flight)
+        # backup_id -> (chain, deletion start time)
+        self.in_flight = {}
+        # backup_id -> time of the first throttled deletion request
+        self.throttled = {}
+        self.stats = collections.Counter()
+
+    def _increase(self):
+        self.window = min(self.window + 1 / self.window, self.max_in_flight)
+
+    def _decrease(self):
+        self.window = max(self.window / 2, 1)
+        LOG.info(f"Cinder is throttling, deleting {int(self.window)} backups at once.")
+
+    def _start(self, ready, chains):
+        """Start deletions until the window is full
+
+        The chains whose previous deletion is done go first, the next
+        chains are only taken when there is room in the window.
+
+        :return: False if Cinder throttled a deletion
+        """
+        while len(self.in_flight) < int(self.window):
+            if ready:
+                chain = ready.popleft()
+            else:
+                chain = next(chains, None)
+                if chain is None:
+                    break
+                chain = iter(chain)
+            backup = next(chain, None)
+            if backup is None:
+                continue
+            outcome = self.controller.hard_remove_volume_backup(
+                backup, skip_inc_err=True, retry=False
+            )
+            self.stats[outcome] += 1
+            if outcome == constants.DELETION_STARTED:
+                self.in_flight[backup.backup_id] = (chain, time.monotonic())
+                self._increase()
+                continue
+            if outcome == constants.DELETION_THROTTLED:
+                self._requeue(ready, backup, chain)
+                self._decrease()
+                return False
+            if outcome == constants.DELETION_GONE:
+                # Nothing to wait for, go on with the next backup of the chain.
+                ready.append(chain)
+                continue
+            # Failed or skipped, the older backups of the chain can't be
+            # deleted while this one is kept.
+            LOG.debug(
+                f"Backup {backup.backup_id} is kept, skipping the older "
+                "backups of its chain in this rotation."
+            )
+        return True
+
+    def _requeue(self, ready, backup, chain):
+        """Request the deletion of a throttled backup again later
+
+        The older backups of its chain wait for it, the chain is given up
+        in this rotation if the backup is still throttled after
+        CONF.conductor.rotation_delete_timeout seconds.
+        """
+        now = time.monotonic()
+        throttled_at = self.throttled.setdefault(backup.backup_id, now)
+        if now - throttled_at >= CONF.conductor.rotation_delete_timeout:
+            LOG.warn(
+                f"Deletion of backup {backup.backup_id} is still throttled "
+                f"after {CONF.conductor.rotation_delete_timeout} seconds, "
+                "skipping the older backups of its chain in this rotation."
+            )
+            self.stats["timeout"] += 1
+            return
+        ready.append(itertools.chain([backup], chain))
+
+    def _poll(self, ready):
+        """Release the chains whose backup is not being deleted anymore"""
+        try:
+            self.controller.openstacksdk.reset_project()
+            deleting = {
+                backup.id
+                for backup in self.controller.openstacksdk.get_backups(
+                    status="deleting"
+                )
+            }
+        except Exception as ex:
+            LOG.warn(f"Failed to list the backups being deleted: {ex}")
+            self._decrease()
+            return
+        now = time.monotonic()
+        for backup_id, (chain, started_at) in list(self.in_flight.items()):
+            if backup_id in deleting:
+                if now - started_at < CONF.conductor.rotation_delete_timeout:
+                    continue
+                LOG.warn(
+                    f"Backup {backup_id} is still being deleted after "
+                    f"{CONF.conductor.rotation_delete_timeout} seconds, "
+                    "skipping the older backups of its chain in this rotation."
+                )
+                self.stats["timeout"] += 1
+                del self.in_flight[backup_id]
+                continue
+            # Gone or failed, the backup object is cleaned up by the next
+            # rotation once Cinder does not know the backup anymore.
+            del self.in_flight[backup_id]
+            ready.append(chain)
+
+    def run(self, chains):
+        """Delete the backups of all chains
+
+        :param chains: backups to delete, the backups of a chain are
+                       deleted in order. Chains are taken from it as the
+                       deletions go, so it can be a generator.
+        :type: Iterable<List<staffeln.objects.volume.Volume>>
+        :return: number of deletion outcomes by outcome
+        """
+        chains = iter(chains)
+        ready = collections.deque()
+        while True:
+            throttled = not self._start(ready, chains)
+            if not ready and not self.in_flight:
+                # Nothing is left to wait for, so all chains were taken.
+                break
+            if throttled or self.in_flight:
+                time.sleep(CONF.conductor.rotation_poll_interval)
+            if self.in_flight:
+                self._poll(ready)
+        LOG.info(f"Rotation deletions: {dict(self.stats)}")
+        return self.stats
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import collections
+import threading
+
+import futurist
+from oslo_log import log
+
+LOG = log.getLogger(__name__)
+
+
+class LimitedDispatcher(object):
+    """Run tasks in a thread pool under per-key concurrency caps
+
+    Every task is tagged with keys by ``key_func``, e.g. its project and
+    its storage backend. A task only starts when fewer than the cap of
+    tasks with each of its keys are running, other tasks keep their
+    place in line and are started as soon as a running task finishes.
+
+    :param max_workers: Max number of tasks running at once
+    :param limits: Cap per kind of key, a kind missing or set to 0 is not
+                   capped
+    :type: Dict<str, int>
+    """
+
+    def __init__(self, max_workers, limits=None):
+        self.max_workers = max_workers
+        self.limits = limits or {}
+
+    def _allowed(self, running, keys):
+        for kind, value in keys:
+            limit = self.limits.get(kind)
+            if limit and running[(kind, value)] >= limit:
+                return False
+        return True
+
+    def run(self, tasks, func, key_func):
+        """Run func on every task and wait for all of them
+
+        :param key_func: Return the (kind, value) keys of a task, keys with
+                         a None value are not capped
+        """
+        pending = collections.deque(tasks)
+        running = collections.Counter()
+        # Callbacks of futures which already finished run in the
+        # dispatching thread, which holds the lock.
+        cond = threading.Condition(threading.RLock())
+
+        def finished(future, keys):
+            with cond:
+                for key in keys:
+                    running[key] -= 1
+                running["workers"] -= 1
+                cond.notify()
+            if future.exception() is not None:
+                LOG.warn(f"Task failed: {future.exception()}")
+
+        with futurist.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with cond:
+                while pending:
+                    for _ in range(len(pending)):
+                        task = pending.popleft()
+                        keys = [
+                            (kind, value)
+                            for kind, value in key_func(task)
+                            if value is not None
+                        ]
+                        if running["workers"] >= self.max_workers or not (
+                            self._allowed(running, keys)
+                        ):
+                            pending.append(task)
+                            continue
+                        running["workers"] += 1
+                        for key in keys:
+                            running[key] += 1
+                        future = executor.submit(func, task)
+                        future.add_done_callback(
+                            lambda future, keys=keys: finished(future, keys)
+                        )
+                    if pending:
+                        cond.wait()
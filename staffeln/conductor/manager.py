@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import collections
+import itertools
+import operator
 import threading
 import time
 from datetime import timedelta, timezone
@@ -11,15 +14,31 @@ from oslo_utils import timeutils
 
 import staffeln.conf
 from staffeln import objects
-from staffeln.common import constants, context, lock
+from staffeln.common import constants, context, lock, openstack
 from staffeln.common import time as xtime
 from staffeln.conductor import backup as backup_controller
+from staffeln.conductor import deleter, dispatcher, scheduler
 from staffeln.i18n import _
 
 LOG = log.getLogger(__name__)
 CONF = staffeln.conf.CONF
 
 
+def start_token_refresher(connection_pool):
+    """Renew the expiring tokens of a connection pool in the background"""
+
+    @periodics.periodic(spacing=CONF.openstack.token_refresh_interval)
+    def token_refresh_tasks():
+        renewed = connection_pool.renew_expiring()
+        if renewed:
+            LOG.debug(f"Renewed {renewed} OpenStack tokens.")
+
+    periodic_worker = periodics.PeriodicWorker([(token_refresh_tasks, (), {})])
+    periodic_thread = threading.Thread(target=periodic_worker.start)
+    periodic_thread.daemon = True
+    periodic_thread.start()
+
+
 class BackupManager(cotyledon.Service):
     name = "Staffeln conductor backup controller"
 
@@ -38,6 +57,7 @@ class BackupManager(cotyledon.Service):
 
     def terminate(self):
         LOG.info("%s terminate" % self.name)
+        self.lock_mgt.leave_groups()
         super(BackupManager, self).terminate()
 
     def reload(self):
@@ -48,36 +68,91 @@ class BackupManager(cotyledon.Service):
         LOG.info(_("Processing WIP backup generators..."))
         # TODO(Alex): Replace this infinite loop with finite time
         self.cycle_start_time = xtime.get_current_time()
+        self.cycle_deadline = time.monotonic() + self._backup_cycle_timeout_seconds()
+        # No check is scheduled past the timeout, so it isn't overrun.
+        poll_scheduler = scheduler.BackupPollScheduler(deadline=self.cycle_deadline)
 
         # loop - take care of backup result while timeout
         while 1:
+            wake_time = time.monotonic()
             queues_started = self.controller.get_queues(
-                filters={"backup_status": constants.BACKUP_WIP}
+                filters={"backup_status": constants.BACKUP_WIP}, read_only=True
             )
             if len(queues_started) == 0:
                 LOG.info(_("task queue empty"))
                 break
             if not self._backup_cycle_timeout():  # time in
                 LOG.info(_("cycle timein"))
-                for queue in queues_started:
+                now = time.monotonic()
+                poll_scheduler.retain([queue.id for queue in queues_started])
+                new_queues = [
+                    queue for queue in queues_started if queue.id not in poll_scheduler
+                ]
+                if new_queues:
+                    remaining = self.controller.get_expected_backup_remaining(
+                        new_queues
+                    )
+                    for queue in new_queues:
+                        poll_scheduler.add(queue.id, remaining[queue.id], now)
+                due_ids = set(poll_scheduler.pop_due(now))
+                queues_due = [queue for queue in queues_started if queue.id in due_ids]
+                if queues_due:
+                    # List the backups created since the oldest task once
+                    # instead of fetching every backup.
+                    backup_map = self.controller.get_backup_map(
+                        since=min(queue.created_at for queue in queues_due)
+                    )
+                for queue in queues_due:
+                    backup_gen = (backup_map or {}).get(queue.backup_id)
+                    if backup_gen is not None and backup_gen.status == "creating":
+                        # Nothing to update yet, so the task isn't pulled
+                        # again and its volume isn't locked.
+                        poll_scheduler.backoff(queue.id, now)
+                        continue
                     LOG.debug(
                         "try to get lock and run task for volume: "
                         f"{queue.volume_id}."
                     )
+                    backup_status = queue.backup_status
                     with lock.Lock(
                         self.lock_mgt, queue.volume_id, remove_lock=True
                     ) as q_lock:
                         if q_lock.acquired:
-                            self.controller.check_volume_backup_status(queue)
+                            # Re-pulling status and make it's up-to-date
+                            task = self.controller.get_queue_task_by_id(
+                                task_id=queue.id
+                            )
+                            if task.backup_status == constants.BACKUP_WIP:
+                                self.controller.check_volume_backup_status(
+                                    task, backup_map=backup_map
+                                )
+                            backup_status = task.backup_status
+                    if backup_status == constants.BACKUP_WIP:
+                        poll_scheduler.backoff(queue.id, now)
             else:  # time out
                 LOG.info(_("cycle timeout"))
                 for queue in queues_started:
-                    self.controller.hard_cancel_backup_task(queue)
+                    task = self.controller.get_queue_task_by_id(task_id=queue.id)
+                    if task.backup_status == constants.BACKUP_WIP:
+                        self.controller.hard_cancel_backup_task(task)
                 break
-            time.sleep(constants.BACKUP_RESULT_CHECK_INTERVAL)
+            # Every wake lists the tasks and the backups, so wake at most
+            # once per minimum interval and check the tasks due by then
+            # together.
+            next_wake_time = wake_time + CONF.conductor.backup_poll_min_interval
+            next_check_time = poll_scheduler.next_check_time()
+            if next_check_time is not None:
+                next_wake_time = min(
+                    max(next_check_time, next_wake_time), self.cycle_deadline
+                )
+            time.sleep(max(next_wake_time - time.monotonic(), 0))
 
     # if the backup cycle timeout, then return True
     def _backup_cycle_timeout(self):
+        return time.monotonic() >= self.cycle_deadline
+
+    def _backup_cycle_timeout_seconds(self):
+        """Seconds from the start of the cycle until it times out"""
         time_delta_dict = xtime.parse_timedelta_string(
             CONF.conductor.backup_cycle_timout
         )
@@ -93,51 +168,64 @@ class BackupManager(cotyledon.Service):
             time_delta_dict = xtime.parse_timedelta_string(
                 constants.DEFAULT_BACKUP_CYCLE_TIMEOUT
             )
-        rto = xtime.timeago(
-            years=time_delta_dict["years"],
-            months=time_delta_dict["months"],
-            weeks=time_delta_dict["weeks"],
-            days=time_delta_dict["days"],
-            hours=time_delta_dict["hours"],
-            minutes=time_delta_dict["minutes"],
-            seconds=time_delta_dict["seconds"],
-        )
-        # print(rto.strftime(xtime.DEFAULT_TIME_FORMAT))
-        # print(self.cycle_start_time)
-        # print(self.cycle_start_time - rto)
-        if rto >= self.cycle_start_time:
-            return True
-        return False
+        rto = xtime.timeago(from_date=self.cycle_start_time, **time_delta_dict)
+        return (self.cycle_start_time - rto).total_seconds()
 
     # Create backup generators
     def _process_todo_tasks(self):
         LOG.info(_("Creating new backup generators..."))
+        # _process_todo_task pulls the task again before changing it.
         tasks_to_start = self.controller.get_queues(
-            filters={"backup_status": constants.BACKUP_PLANNED}
+            filters={"backup_status": constants.BACKUP_PLANNED}, read_only=True
         )
         if len(tasks_to_start) != 0:
-            for task in tasks_to_start:
-                with lock.Lock(
-                    self.lock_mgt, task.volume_id, remove_lock=True
-                ) as t_lock:
-                    if t_lock.acquired:
-                        # Re-pulling status and make it's up-to-date
-                        task = self.controller.get_queue_task_by_id(task_id=task.id)
-                        if task.backup_status == constants.BACKUP_PLANNED:
-                            task.backup_status = constants.BACKUP_INIT
-                            task.save()
-                            self.controller.create_volume_backup(task)
+            if any(
+                task.volume_id not in self.controller.volume_backend_map
+                for task in tasks_to_start
+            ):
+                # The volumes are listed by the puller only, list them here
+                # too so tasks are limited per backend in every worker.
+                self.controller.prefetch_volume_status()
+            backup_dispatcher = dispatcher.LimitedDispatcher(
+                CONF.conductor.backup_create_workers,
+                limits={
+                    "project": CONF.conductor.backup_create_per_project,
+                    "backend": CONF.conductor.backup_create_per_backend,
+                },
+            )
+            backup_dispatcher.run(
+                tasks_to_start,
+                self._process_todo_task,
+                key_func=lambda task: [
+                    ("project", task.project_id),
+                    (
+                        "backend",
+                        self.controller.volume_backend_map.get(task.volume_id),
+                    ),
+                ],
+            )
+
+    def _process_todo_task(self, task):
+        with lock.Lock(self.lock_mgt, task.volume_id, remove_lock=True) as t_lock:
+            if t_lock.acquired:
+                # Claim the task only if it is still planned.
+                claimed = self.controller.update_queues_status(
+                    [task.id], constants.BACKUP_PLANNED, constants.BACKUP_INIT
+                )
+                if claimed:
+                    self.controller.create_volume_backup(claimed[0])
 
     # Refresh the task queue
     def _update_task_queue(self):
         LOG.info(_("Updating backup task queue..."))
         self.controller.refresh_openstacksdk()
         self.controller.refresh_backup_result()
-        filters = {"backup_status": constants.BACKUP_WIP}
-        current_wip_tasks = self.controller.get_queues(filters=filters)
-        filters["backup_status"] = constants.BACKUP_PLANNED
-        current_plan_tasks = self.controller.get_queues(filters=filters)
-        self.controller.create_queue(current_plan_tasks + current_wip_tasks)
+        # Volumes with planned or WIP tasks are skipped by the database.
+        # Only the puller queues tasks, so the inserts don't race.
+        self.controller.create_queue()
+        LOG.debug(
+            f"OpenStack connection pool: {self.controller.connection_pool.stats()}"
+        )
 
     def _report_backup_result(self):
         report_period = CONF.conductor.report_period
@@ -170,7 +258,10 @@ class BackupManager(cotyledon.Service):
 
         @periodics.periodic(spacing=backup_service_period, run_immediately=True)
         def backup_tasks():
-            with self.lock_mgt:
+            with self.lock_mgt, openstack.retry_cycle("Backup"):
+                openstack.RATE_LIMITER.set_share(
+                    self.lock_mgt.get_member_count(constants.API_CLIENTS)
+                )
                 with lock.Lock(self.lock_mgt, constants.PULLER) as puller:
                     if puller.acquired:
                         LOG.info("Running as puller role")
@@ -192,6 +283,7 @@ class BackupManager(cotyledon.Service):
         periodic_thread = threading.Thread(target=periodic_worker.start)
         periodic_thread.daemon = True
         periodic_thread.start()
+        start_token_refresher(self.controller.connection_pool)
 
 
 class RotationManager(cotyledon.Service):
@@ -211,58 +303,137 @@ class RotationManager(cotyledon.Service):
 
     def terminate(self):
         LOG.info(f"{self.name} terminate")
+        self.lock_mgt.leave_groups()
         super(RotationManager, self).terminate()
 
     def reload(self):
         LOG.info(f"{self.name} reload")
 
-    def get_backup_list(self, filters=None):
-        return self.controller.get_backups(filters=filters)
-
-    def remove_backups(self, retention_backups):
-        LOG.info(f"Backups to be removed: {retention_backups}")
-        for retention_backup in retention_backups:
-            self.controller.hard_remove_volume_backup(retention_backup)
-
-    def is_retention(self, backup):
-        now = timeutils.utcnow().astimezone(timezone.utc)
-        backup_age = now - backup.created_at.astimezone(timezone.utc)
-        # see if need to be delete.
-        if backup.instance_id in self.instance_retention_map:
-            retention_time = now - self.get_time_from_str(
-                self.instance_retention_map[backup.instance_id]
-            ).astimezone(timezone.utc)
-            if backup_age > retention_time:
-                # Backup remain longer than retention, need to purge it.
+    @staticmethod
+    def _sort_chain(backups, children):
+        """Order the backups to remove of a volume, leaves first
+
+        The backups form a graph through the backup each incremental
+        backup is based on. Incremental backups recorded without a
+        parent_backup_id are assumed to be based on the previous backup of
+        the volume.
+
+        :param backups: backups to remove of a volume
+        :param children: backup id to the backup ids of the incremental
+                         backups based on it
+        :return: the backups which can be removed, each one after the
+                 incremental backups based on it, and the number of
+                 backups left out because an incremental backup based on
+                 them is kept
+        """
+        backups = sorted(
+            backups, key=lambda backup: backup.created_at.timestamp(), reverse=True
+        )
+        by_id = {backup.backup_id: backup for backup in backups}
+        parents = {}
+        for backup, older in itertools.zip_longest(backups, backups[1:]):
+            parent_id = backup.parent_backup_id
+            if parent_id is None and backup.incremental and older is not None:
+                parent_id = older.backup_id
+            if parent_id in by_id:
+                parents[backup.backup_id] = parent_id
+
+        # A backup with a kept incremental backup can't be removed, nor
+        # can the backups it is based on.
+        blocked = set()
+        pending = [
+            backup.backup_id
+            for backup in backups
+            if any(child not in by_id for child in children.get(backup.backup_id, ()))
+        ]
+        while pending:
+            backup_id = pending.pop()
+            if backup_id in blocked:
+                continue
+            blocked.add(backup_id)
+            if backup_id in parents:
+                pending.append(parents[backup_id])
+
+        remaining = collections.Counter(
+            parent_id
+            for backup_id, parent_id in parents.items()
+            if backup_id not in blocked
+        )
+        ready = collections.deque(
+            backup
+            for backup in backups
+            if backup.backup_id not in blocked and not remaining[backup.backup_id]
+        )
+        chain = []
+        while ready:
+            backup = ready.popleft()
+            chain.append(backup)
+            parent_id = parents.get(backup.backup_id)
+            if parent_id is None:
+                continue
+            remaining[parent_id] -= 1
+            if not remaining[parent_id]:
+                ready.append(by_id[parent_id])
+        return chain, len(blocked)
+
+    def get_retention_chains(self):
+        """Stream the backups to remove, grouped by volume
+
+        The backups older than their instance retention time, or the
+        default one, are selected by the database and streamed one
+        instance at a time, so only the backups of a single instance are
+        held in memory. The backups of a volume are ordered so its
+        incremental backups are gone before the backup they are based on,
+        the backups which still have a kept incremental backup are left
+        out.
+
+        :return: backups to remove of each volume, leaves first
+        :return type: Iterator<List<staffeln.objects.volume.Volume>>
+        """
+        candidates = self.controller.get_retention_candidates(
+            self.threshold_strtime, self.get_retention_cutoffs()
+        )
+        blocked = 0
+        for _instance_id, backups in itertools.groupby(
+            candidates, key=operator.attrgetter("instance_id")
+        ):
+            volumes = collections.defaultdict(list)
+            for backup in backups:
                 LOG.debug(
                     "Found potential volume backup for retention: Backup "
-                    f"ID: {backup.backup_id} "
-                    f"with backup age: {backup_age} (Target retention "
-                    f"time: {retention_time})."
+                    f"ID: {backup.backup_id} created at {backup.created_at}."
                 )
-                return True
-        elif now - self.threshold_strtime < backup_age:
-            LOG.debug(
-                "Found potential volume backup for retention: "
-                f"Backup ID: {backup.backup_id} "
-                f"with backup age: {backup_age} (Default retention "
-                f"time: {self.threshold_strtime})."
+                volumes[backup.volume_id].append(backup)
+            children = self.controller.get_backup_children(
+                [backup.backup_id for backups in volumes.values() for backup in backups]
+            )
+            for backups in volumes.values():
+                chain, volume_blocked = self._sort_chain(backups, children)
+                blocked += volume_blocked
+                if chain:
+                    yield chain
+        if blocked:
+            LOG.info(
+                f"Kept {blocked} expired backups, incremental backups "
+                "based on them are not expired yet."
             )
-            return True
-        return False
 
     def rotation_engine(self, retention_service_period):
         LOG.info(f"{self.name} rotation_engine")
 
         @periodics.periodic(spacing=retention_service_period, run_immediately=True)
         def rotation_tasks():
-            with self.lock_mgt:
+            with self.lock_mgt, openstack.retry_cycle("Rotation"):
+                openstack.RATE_LIMITER.set_share(
+                    self.lock_mgt.get_member_count(constants.API_CLIENTS)
+                )
                 with lock.Lock(self.lock_mgt, constants.RETENTION) as retention:
                     if not retention.acquired:
                         return
 
                     LOG.info("Starting task to check rotation...")
                     self.controller.refresh_openstacksdk()
+                    self.controller.refresh_server_snapshot()
                     # get the threshold time
                     self.threshold_strtime = self.get_time_from_str(
                         CONF.conductor.retention_time
@@ -276,43 +447,12 @@ class RotationManager(cotyledon.Service):
                         not self.instance_retention_map
                     ):
                         return
-                    backup_instance_map = {}
-
                     # get project list
                     self.controller.update_project_list()
 
-                    for backup in self.get_backup_list():
-                        # Create backup instance map for later sorted by
-                        # created_at. This can be use as base of judgement
-                        # on delete a backup. The reason we need such list
-                        # is because backup have dependency with each other
-                        # after we enable incremental backup.
-                        # So we need to have information to judge on.
-                        if backup.instance_id in backup_instance_map:
-                            backup_instance_map[backup.instance_id].append(backup)
-                        else:
-                            backup_instance_map[backup.instance_id] = [backup]
-
-                    # Sort backup instance map and use it to check backup
-                    # create time and order.
-                    for instance_id in backup_instance_map:
-                        sorted_backup_list = sorted(
-                            backup_instance_map[instance_id],
-                            key=lambda backup: backup.created_at.timestamp(),
-                            reverse=True,
-                        )
-                        for backup in sorted_backup_list:
-                            if self.is_retention(backup):
-                                LOG.debug(
-                                    "Retention: Try to remove volume backup "
-                                    f"{backup.backup_id}"
-                                )
-                                # Try to delete and skip any incremental
-                                # exist error.
-                                self.controller.hard_remove_volume_backup(
-                                    backup, skip_inc_err=True
-                                )
-                                time.sleep(2)
+                    deleter.BackupDeleter(self.controller).run(
+                        self.get_retention_chains()
+                    )
 
         periodic_callables = [
             (rotation_tasks, (), {}),
@@ -323,11 +463,12 @@ class RotationManager(cotyledon.Service):
         periodic_thread = threading.Thread(target=periodic_worker.start)
         periodic_thread.daemon = True
         periodic_thread.start()
+        start_token_refresher(self.controller.connection_pool)
 
     # get time
-    def get_time_from_str(self, time_str, to_str=False):
-        time_delta_dict = xtime.parse_timedelta_string(time_str)
-        if time_delta_dict is None:
+    def get_time_from_str(self, time_str, to_str=False, from_date=None):
+        time_delta = xtime.parse_relativedelta(time_str)
+        if time_delta is None:
             LOG.info(
                 _(
                     "Retention time format is invalid. "
@@ -337,13 +478,28 @@ class RotationManager(cotyledon.Service):
             )
             return None
 
-        res = xtime.timeago(
-            years=time_delta_dict["years"],
-            months=time_delta_dict["months"],
-            weeks=time_delta_dict["weeks"],
-            days=time_delta_dict["days"],
-            hours=time_delta_dict["hours"],
-            minutes=time_delta_dict["minutes"],
-            seconds=time_delta_dict["seconds"],
-        )
+        res = (from_date or timeutils.utcnow()) - time_delta
         return res.strftime(xtime.DEFAULT_TIME_FORMAT) if to_str else res
+
+    def get_retention_cutoffs(self, now=None):
+        """Compile instance_retention_map into absolute cutoffs
+
+        Each distinct retention time is parsed and subtracted from now
+        once, however many instances use it.
+
+        :return: instance id to the creation time before which its
+                 backups are removed, instances with an invalid retention
+                 time are left out
+        :return type: Dict<str, datetime.datetime>
+        """
+        now = now or timeutils.utcnow(with_timezone=True)
+        cutoffs = {}
+        for retention_time in set(self.instance_retention_map.values()):
+            cutoff = self.get_time_from_str(retention_time, from_date=now)
+            if cutoff is not None:
+                cutoffs[retention_time] = cutoff.astimezone(timezone.utc)
+        return {
+            instance_id: cutoffs[retention_time]
+            for instance_id, retention_time in self.instance_retention_map.items()
+            if retention_time in cutoffs
+        }
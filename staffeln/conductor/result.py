@@ -2,6 +2,9 @@
 # This should be upgraded by integrating with mail server to send batch
 from __future__ import annotations
 
+import io
+import threading
+
 from oslo_log import log
 from oslo_utils import timeutils
 
@@ -17,13 +20,16 @@ LOG = log.getLogger(__name__)
 class BackupResult(object):
     def __init__(self, backup_mgt):
         self.backup_mgt = backup_mgt
+        self._lock = threading.Lock()
 
     def initialize(self):
         self.content = ""
         self.project_list = set()
 
     def add_project(self, project_id, project_name):
-        self.project_list.add((project_id, project_name))
+        # Projects are added from the discovery worker threads.
+        with self._lock:
+            self.project_list.add((project_id, project_name))
 
     def send_result_email(self, project_id, subject=None, project_name=None):
         if not CONF.notification.sender_email:
@@ -92,22 +98,58 @@ class BackupResult(object):
         report_ts.created_at = timeutils.utcnow()
         return report_ts.create()
 
+    @staticmethod
+    def _format_tasks(tasks, format_task):
+        """Write one line per task as they are paged in
+
+        The lines are written to a buffer, no list of all the lines is
+        built before joining them.
+        """
+        buf = io.StringIO()
+        for i, task in enumerate(tasks):
+            if i:
+                buf.write("<br>")
+            buf.write(format_task(task))
+        return buf.getvalue()
+
     def publish(self, project_id=None, project_name=None):
         # 1. get quota
         self.content = f"<h3>{xtime.get_current_strtime()}</h3><br>"
-        success_tasks = self.backup_mgt.get_queues(
+        success_tasks = self.backup_mgt.iter_queues(
             filters={
                 "backup_status": constants.BACKUP_COMPLETED,
                 "project_id": project_id,
-            }
+            },
+            read_only=True,
         )
-        failed_tasks = self.backup_mgt.get_queues(
+        success_volumes = self._format_tasks(
+            success_tasks,
+            lambda e: (
+                f"Volume ID: {str(e.volume_id)}, "
+                f"Backup ID: {str(e.backup_id)}, "
+                "Backup mode: "
+                f"{'Incremental' if e.incremental else 'Full'}, "
+                f"Created at: {str(e.created_at)}, Last updated at: "
+                f"{str(e.updated_at)}"
+            ),
+        )
+        failed_tasks = self.backup_mgt.iter_queues(
             filters={
                 "backup_status": constants.BACKUP_FAILED,
                 "project_id": project_id,
-            }
+            },
+            read_only=True,
+        )
+        failed_volumes = self._format_tasks(
+            failed_tasks,
+            lambda e: (
+                f"Volume ID: {str(e.volume_id)}, "
+                f"Reason: {str(e.reason)}, "
+                f"Created at: {str(e.created_at)}, Last updated at: "
+                f"{str(e.updated_at)}"
+            ),
         )
-        if not success_tasks and not failed_tasks:
+        if not success_volumes and not failed_volumes:
             return False
 
         # Geneerate HTML Content
@@ -120,36 +162,8 @@ class BackupResult(object):
             quota_color = "YALLOW"
         else:
             quota_color = "GREEN"
-        if success_tasks:
-            success_volumes = "<br>".join(
-                [
-                    (
-                        f"Volume ID: {str(e.volume_id)}, "
-                        f"Backup ID: {str(e.backup_id)}, "
-                        "Backup mode: "
-                        f"{'Incremental' if e.incremental else 'Full'}, "
-                        f"Created at: {str(e.created_at)}, Last updated at: "
-                        f"{str(e.updated_at)}"
-                    )
-                    for e in success_tasks
-                ]
-            )
-        else:
-            success_volumes = "<br>"
-        if failed_tasks:
-            failed_volumes = "<br>".join(
-                [
-                    (
-                        f"Volume ID: {str(e.volume_id)}, "
-                        f"Reason: {str(e.reason)}, "
-                        f"Created at: {str(e.created_at)}, Last updated at: "
-                        f"{str(e.updated_at)}"
-                    )
-                    for e in failed_tasks
-                ]
-            )
-        else:
-            failed_volumes = "<br>"
+        success_volumes = success_volumes or "<br>"
+        failed_volumes = failed_volumes or "<br>"
         html += (
             f"<h3>Project: {project_name} (ID: {project_id})</h3>"
             "<h3>Quota Usage (Backup Gigabytes)</h3>"
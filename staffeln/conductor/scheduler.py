@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import heapq
+
+import staffeln.conf
+
+CONF = staffeln.conf.CONF
+
+
+class BackupPollScheduler(object):
+    """Decide when each backup in progress should be checked next
+
+    Tasks are kept in a heap keyed by their next check time. A task is
+    first checked around its expected completion time, then with an
+    exponential backoff while the backup is still in progress. Every
+    interval is kept between CONF.conductor.backup_poll_min_interval and
+    CONF.conductor.backup_poll_max_interval, and no check is scheduled
+    after the deadline, so a timeout is noticed when it happens.
+
+    :param deadline: monotonic time of the backup cycle timeout
+    """
+
+    def __init__(self, deadline=None):
+        self._deadline = deadline
+        self._heap = []
+        # task id -> (next check time, interval), heap entries which don't
+        # match it are stale and skipped.
+        self._tasks = {}
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def _clamp(self, interval):
+        return min(
+            max(interval, CONF.conductor.backup_poll_min_interval),
+            CONF.conductor.backup_poll_max_interval,
+        )
+
+    def _push(self, task_id, check_at, interval):
+        if self._deadline is not None:
+            check_at = min(check_at, self._deadline)
+        self._tasks[task_id] = (check_at, interval)
+        heapq.heappush(self._heap, (check_at, task_id))
+
+    def add(self, task_id, expected_remaining, now):
+        """Schedule the first check of a task
+
+        :param expected_remaining: expected seconds until the backup
+                                   completes
+        :param now: current monotonic time
+        """
+        interval = self._clamp(expected_remaining)
+        self._push(task_id, now + interval, interval)
+
+    def backoff(self, task_id, now):
+        """Schedule the next check of a task which is still in progress"""
+        if task_id not in self._tasks:
+            return
+        interval = self._clamp(self._tasks[task_id][1] * 2)
+        self._push(task_id, now + interval, interval)
+
+    def retain(self, task_ids):
+        """Forget the tasks which are not in task_ids anymore"""
+        for task_id in set(self._tasks) - set(task_ids):
+            del self._tasks[task_id]
+
+    def pop_due(self, now):
+        """Return the ids of the tasks due for a check
+
+        Due tasks stay known by the scheduler, call backoff to schedule
+        their next check.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            check_at, task_id = heapq.heappop(self._heap)
+            if self._tasks.get(task_id, (None,))[0] == check_at:
+                due.append(task_id)
+        return due
+
+    def next_check_time(self):
+        """Time of the earliest scheduled check, None if nothing scheduled"""
+        while self._heap:
+            check_at, task_id = self._heap[0]
+            if self._tasks.get(task_id, (None,))[0] == check_at:
+                return check_at
+            heapq.heappop(self._heap)
+        return None
@@ -80,6 +80,86 @@ backup_opts = [
         min=0,
         help=_("Number of incremental backups between full backups."),
     ),
+    cfg.IntOpt(
+        "discovery_workers",
+        default=8,
+        min=1,
+        help=_(
+            "The number of projects scanned in parallel while building the "
+            "backup task queue. Set to 1 to scan projects one by one."
+        ),
+    ),
+    cfg.BoolOpt(
+        "discovery_all_projects",
+        default=True,
+        help=_(
+            "List the servers of all projects with a single paginated call "
+            "and group them by project while building the backup task queue. "
+            "Set to False to list the servers project by project."
+        ),
+    ),
+    cfg.BoolOpt(
+        "discovery_async",
+        default=False,
+        help=_(
+            "When servers are listed project by project, list them for all "
+            "projects concurrently with the asyncio OpenStack client instead "
+            "of one call per discovery worker. Needs the optional aiohttp "
+            "dependency, pip install staffeln[async]."
+        ),
+    ),
+    cfg.IntOpt(
+        "backup_create_workers",
+        default=8,
+        min=1,
+        help=_("The maximum number of backups requested in parallel."),
+    ),
+    cfg.IntOpt(
+        "backup_create_per_project",
+        default=4,
+        min=0,
+        help=_(
+            "The maximum number of backups requested in parallel for a "
+            "single project. Set to 0 for no limit."
+        ),
+    ),
+    cfg.IntOpt(
+        "backup_create_per_backend",
+        default=0,
+        min=0,
+        help=_(
+            "The maximum number of backups requested in parallel for volumes "
+            "of a single Cinder backend. Set to 0 for no limit."
+        ),
+    ),
+    cfg.IntOpt(
+        "backup_poll_min_interval",
+        default=10,
+        min=1,
+        help=_(
+            "The minimum time between two status checks of a backup in "
+            "progress, the unit is one second."
+        ),
+    ),
+    cfg.IntOpt(
+        "backup_poll_max_interval",
+        default=120,
+        min=1,
+        help=_(
+            "The maximum time between two status checks of a backup in "
+            "progress, the unit is one second."
+        ),
+    ),
+    cfg.IntOpt(
+        "backup_poll_seconds_per_gb",
+        default=5,
+        min=0,
+        help=_(
+            "The estimated backup time per GB of volume size, used to "
+            "schedule the first status check of a volume without backup "
+            "duration history, the unit is one second."
+        ),
+    ),
 ]
 
 openstack_opts = [
@@ -110,6 +190,176 @@ openstack_opts = [
             "exception."
         ),
     ),
+    cfg.IntOpt(
+        "retry_budget",
+        default=200,
+        min=0,
+        help=_(
+            "The maximum number of OpenStackSDK HTTP retries in one backup or "
+            "rotation cycle, shared by all calls. Once spent, failed calls "
+            "are not retried until the next cycle. Set to 0 for no limit."
+        ),
+    ),
+    cfg.IntOpt(
+        "circuit_breaker_threshold",
+        default=5,
+        min=0,
+        help=_(
+            "The number of consecutive server errors from an OpenStack "
+            "service after which calls to it fail fast without being sent. "
+            "Set to 0 to disable the circuit breaker."
+        ),
+    ),
+    cfg.IntOpt(
+        "circuit_breaker_reset_timeout",
+        default=60,
+        min=1,
+        help=_(
+            "The time calls to a tripped OpenStack service fail fast before "
+            "they are tried again, the unit is one second."
+        ),
+    ),
+    cfg.FloatOpt(
+        "rate_limit",
+        default=0,
+        min=0,
+        help=_(
+            "The maximum number of requests per second sent to each OpenStack "
+            "service, shared by all the conductor workers when a coordination "
+            "backend is configured. Set to 0 for no limit."
+        ),
+    ),
+    cfg.DictOpt(
+        "service_rate_limits",
+        default={},
+        help=_(
+            "Per service overrides of rate_limit, as service_type:rate pairs "
+            "like compute:20,block_storage:50,identity:10."
+        ),
+    ),
+    cfg.IntOpt(
+        "rate_limit_burst",
+        default=10,
+        min=1,
+        help=_(
+            "The number of requests which can be sent to an OpenStack service "
+            "at once before rate_limit applies."
+        ),
+    ),
+    cfg.IntOpt(
+        "list_page_size",
+        default=1000,
+        min=1,
+        help=_(
+            "The number of resources requested per page when Staffeln lists "
+            "resources across all projects."
+        ),
+    ),
+    cfg.IntOpt(
+        "connection_pool_size",
+        default=0,
+        min=0,
+        help=_(
+            "The maximum number of project scoped connections kept open "
+            "between cycles, 0 keeps one for every project. The least "
+            "recently used one is dropped first. Each kept connection holds "
+            "a keystone session and its token in memory, while a dropped "
+            "one must authenticate again next time. Set it no lower than "
+            "the number of backed up projects, or every cycle churns "
+            "through the pool and reauthenticates each project."
+        ),
+    ),
+    cfg.IntOpt(
+        "token_refresh_margin",
+        default=300,
+        min=0,
+        help=_(
+            "Renew the token of a pooled connection when it expires within "
+            "this time, the unit is one second."
+        ),
+    ),
+    cfg.IntOpt(
+        "token_refresh_interval",
+        default=60,
+        min=1,
+        help=_(
+            "The time between two background checks for pooled connection "
+            "tokens to renew, the unit is one second."
+        ),
+    ),
+    cfg.IntOpt(
+        "http_pool_connections",
+        default=10,
+        min=1,
+        help=_(
+            "The number of OpenStack endpoints the shared HTTP adapter "
+            "keeps a connection pool for."
+        ),
+    ),
+    cfg.IntOpt(
+        "http_pool_maxsize",
+        default=32,
+        min=1,
+        help=_(
+            "The maximum number of idle connections kept open to a single "
+            "OpenStack endpoint, shared by all project connections. Should "
+            "be at least the number of conductor threads calling the APIs."
+        ),
+    ),
+    cfg.IntOpt(
+        "tcp_keepalive_idle",
+        default=60,
+        min=1,
+        help=_(
+            "The idle time before TCP keep-alive probes are sent on OpenStack "
+            "API connections, the unit is one second."
+        ),
+    ),
+    cfg.IntOpt(
+        "tcp_keepalive_interval",
+        default=15,
+        min=1,
+        help=_(
+            "The time between two TCP keep-alive probes on OpenStack API "
+            "connections, the unit is one second."
+        ),
+    ),
+    cfg.IntOpt(
+        "tcp_keepalive_count",
+        default=4,
+        min=1,
+        help=_(
+            "The number of unanswered TCP keep-alive probes before an "
+            "OpenStack API connection is dropped."
+        ),
+    ),
+    cfg.IntOpt(
+        "async_connection_limit",
+        default=100,
+        min=1,
+        help=_(
+            "The maximum number of connections the async OpenStack client "
+            "opens at once."
+        ),
+    ),
+    cfg.IntOpt(
+        "async_connection_limit_per_host",
+        default=50,
+        min=0,
+        help=_(
+            "The maximum number of connections the async OpenStack client "
+            "opens to a single endpoint. Set to 0 for no limit."
+        ),
+    ),
+    cfg.IntOpt(
+        "async_request_timeout",
+        default=60,
+        min=1,
+        help=_(
+            "The timeout of a request sent by the async OpenStack client, "
+            "the unit is one second."
+        ),
+    ),
 ]
 
 rotation_opts = [
@@ -135,6 +385,34 @@ rotation_opts = [
             "fork and run. Default to number of CPUs on the host."
         ),
     ),
+    cfg.IntOpt(
+        "rotation_max_in_flight",
+        default=20,
+        min=1,
+        help=_(
+            "The maximum number of backup deletions in progress in Cinder at "
+            "once during rotation. The rotation starts lower and grows up to "
+            "it while Cinder keeps up, and halves it on 429 and 5xx errors."
+        ),
+    ),
+    cfg.IntOpt(
+        "rotation_poll_interval",
+        default=5,
+        min=1,
+        help=_(
+            "The time between two checks of the backups being deleted, "
+            "the unit is one second."
+        ),
+    ),
+    cfg.IntOpt(
+        "rotation_delete_timeout",
+        default=900,
+        min=1,
+        help=_(
+            "The time after which a backup still being deleted is not "
+            "waited for anymore in this rotation, the unit is one second."
+        ),
+    ),
     cfg.StrOpt(
         "retention_time",
         regex=(
@@ -18,6 +18,33 @@ database = cfg.OptGroup(
 
 SQL_OPTS = [
     cfg.StrOpt("mysql_engine", default="InnoDB", help=_("MySQL engine to use.")),
+    cfg.IntOpt(
+        "bulk_insert_chunk_size",
+        default=500,
+        min=1,
+        help=_(
+            "The number of rows sent in a single executemany batch when "
+            "rows are inserted in bulk."
+        ),
+    ),
+    cfg.IntOpt(
+        "bulk_delete_chunk_size",
+        default=0,
+        min=0,
+        help=_(
+            "The number of rows deleted per transaction when rows are deleted "
+            "in bulk. Set to 0 to delete them all with a single statement."
+        ),
+    ),
+    cfg.IntOpt(
+        "stream_batch_size",
+        default=1000,
+        min=1,
+        help=_(
+            "The number of rows fetched at a time when large results are "
+            "streamed from the database."
+        ),
+    ),
 ]
 
 
@@ -0,0 +1,22 @@
+"""Add backup_duration column to backup_data table
+
+Revision ID: 3f5d2c1a9b7e
+Revises: 8c3a6b4d2f10
+Create Date: 2026-10-18 11:40:07.529413
+
+"""
+
+# revision identifiers, used by Alembic.
+from __future__ import annotations
+
+revision = "3f5d2c1a9b7e"
+down_revision = "8c3a6b4d2f10"
+
+import sqlalchemy as sa  # noqa: E402
+from alembic import op  # noqa: E402
+
+
+def upgrade():
+    op.add_column(
+        "backup_data", sa.Column("backup_duration", sa.Integer(), nullable=True)
+    )
@@ -0,0 +1,26 @@
+"""Add parent_backup_id column to backup_data table
+
+Revision ID: 6d1e4f7a2c93
+Revises: 3f5d2c1a9b7e
+Create Date: 2026-10-18 14:21:53.806142
+
+"""
+
+# revision identifiers, used by Alembic.
+from __future__ import annotations
+
+revision = "6d1e4f7a2c93"
+down_revision = "3f5d2c1a9b7e"
+
+import sqlalchemy as sa  # noqa: E402
+from alembic import op  # noqa: E402
+
+
+def upgrade():
+    op.add_column(
+        "backup_data",
+        sa.Column("parent_backup_id", sa.String(length=100), nullable=True),
+    )
+    op.create_index(
+        "ix_backup_data_parent_backup_id", "backup_data", ["parent_backup_id"]
+    )
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from alembic import op
+from oslo_log import log
+
+"""add indexes to queue_data and backup_data
+
+Revision ID: 8c3a6b4d2f10
+Revises: 5b2e78435231
+Create Date: 2026-10-18 09:12:31.417262
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = "8c3a6b4d2f10"
+down_revision = "5b2e78435231"
+
+LOG = log.getLogger(__name__)
+
+INDEXES = {
+    "backup_data": {
+        "ix_backup_data_volume_id_created_at": ["volume_id", "created_at"],
+        "ix_backup_data_volume_id_id": ["volume_id", "id"],
+        "ix_backup_data_instance_id_created_at": ["instance_id", "created_at"],
+    },
+    "queue_data": {
+        "ix_queue_data_backup_status": ["backup_status"],
+        "ix_queue_data_project_id_backup_status": ["project_id", "backup_status"],
+        "ix_queue_data_volume_id_backup_status": ["volume_id", "backup_status"],
+    },
+}
+
+
+def upgrade():
+    for table_name, indexes in INDEXES.items():
+        for index_name, columns in indexes.items():
+            op.create_index(index_name, table_name, columns)
+
+
+def downgrade():
+    for table_name, indexes in INDEXES.items():
+        for index_name in indexes:
+            try:
+                op.drop_index(index_name, table_name=table_name)
+            except Exception:
+                LOG.exception(f"Error Dropping '{index_name}' index.")
@@ -2,9 +2,12 @@
 
 from __future__ import annotations
 
+import collections
 import datetime
+import itertools
 import operator
 
+import sqlalchemy as sa
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import session as db_session
@@ -26,6 +29,9 @@ _FACADE = None
 is_uuid_like = uuidutils.is_uuid_like
 is_int_like = strutils.is_int_like
 
+# Max number of values bound into a single IN clause.
+IN_CLAUSE_CHUNK_SIZE = 500
+
 
 def _create_facade_lazily():
     global _FACADE
@@ -70,6 +76,14 @@ def add_identity_filter(query, value):
         LOG.error("Invalid Identity")
 
 
+def _chunks(values, size=IN_CLAUSE_CHUNK_SIZE):
+    iterator = iter(values)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
 def _paginate_query(
     model, limit=None, marker=None, sort_key=None, sort_dir=None, query=None
 ):
@@ -84,6 +98,55 @@ def _paginate_query(
     return query.all()
 
 
+def _keyset_iter(query, sort_columns, batch_size, sort_dir="asc"):
+    """Page through a query by keyset
+
+    Each page is a separate query starting after the last row of the
+    previous page, so no cursor stays open while the caller works on the
+    rows. The sort columns must end with a unique column and be covered by
+    an index, in that order, for each page to be a range scan.
+
+    NULLs can't be compared with the row values, so the rows where the
+    first sort column is NULL are paged by the other columns in a separate
+    pass. They come first in ascending order and last in descending order,
+    as MySQL and SQLite sort them. The other sort columns must not hold
+    NULLs.
+    """
+    first = sort_columns[0]
+    if len(sort_columns) == 1 or not getattr(first, "nullable", True):
+        return _keyset_pages(query, sort_columns, batch_size, sort_dir)
+    passes = [
+        _keyset_pages(
+            query.filter(first.is_(None)), sort_columns[1:], batch_size, sort_dir
+        ),
+        _keyset_pages(
+            query.filter(first.isnot(None)), sort_columns, batch_size, sort_dir
+        ),
+    ]
+    if sort_dir == "desc":
+        passes.reverse()
+    return itertools.chain(*passes)
+
+
+def _keyset_pages(query, sort_columns, batch_size, sort_dir):
+    if sort_dir == "desc":
+        after = operator.lt
+        order_by = [column.desc() for column in sort_columns]
+    else:
+        after = operator.gt
+        order_by = sort_columns
+    key = None
+    while True:
+        page = query
+        if key is not None:
+            page = page.filter(after(sa.tuple_(*sort_columns), sa.tuple_(*key)))
+        rows = page.order_by(*order_by).limit(batch_size).all()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        key = [getattr(rows[-1], column.key) for column in sort_columns]
+
+
 class Connection(object):
     """SQLAlchemy connection."""
 
@@ -266,12 +329,51 @@ class Connection(object):
         marker=None,
         sort_key=None,
         sort_dir=None,
+        columns=None,
     ):
-        query = model_query(model)
-
-        query = add_filter_func(query, filters)
+        query = self._list_query(model, add_filter_func, filters, columns)
         return _paginate_query(model, limit, marker, sort_key, sort_dir, query)
 
+    def _iter_model_list(
+        self,
+        model,
+        add_filter_func,
+        context,
+        filters=None,
+        sort_key=None,
+        sort_dir=None,
+        batch_size=None,
+        columns=None,
+    ):
+        """Page through the rows of a table by (sort_key, id) keyset
+
+        :param sort_key: a column to sort by before id, id alone if None.
+        :param sort_dir: "asc" or "desc", for all the sort columns.
+        :param batch_size: number of rows fetched at a time.
+        :param columns: names of the columns to select, to get row tuples
+                        instead of model instances.
+        :returns: iterator of rows.
+        """
+        query = self._list_query(model, add_filter_func, filters, columns)
+        sort_columns = [model.id]
+        if sort_key and sort_key != "id":
+            sort_columns.insert(0, getattr(model, sort_key))
+        return _keyset_iter(
+            query,
+            sort_columns,
+            batch_size or CONF.database.stream_batch_size,
+            sort_dir=sort_dir or "asc",
+        )
+
+    @staticmethod
+    def _list_query(model, add_filter_func, filters, columns=None):
+        if columns is None:
+            query = model_query(model)
+        else:
+            # Plain column tuples, without building a model instance per row
+            query = get_session().query(*(getattr(model, c) for c in columns))
+        return add_filter_func(query, filters)
+
     def create_backup(self, values):
         if not values.get("backup_id"):
             values["backup_id"] = short_id.generate_id()
@@ -287,6 +389,175 @@ class Connection(object):
             models.Backup_data, self._add_backup_filters, *args, **kwargs
         )
 
+    def get_backup_iter(self, *args, **kwargs):
+        return self._iter_model_list(
+            models.Backup_data, self._add_backup_filters, *args, **kwargs
+        )
+
+    def get_backup_history(self, context, volume_ids, depth=0):
+        """Summarize the backup history of a batch of volumes
+
+        :param volume_ids: Target volume ids
+        :param depth: Number of most recent backups of each volume to look
+                      for a full backup in
+        :returns: dict mapping the volume_id of every volume which has
+                  backups to a tuple of (created_at of the latest backup,
+                  whether a full backup exists in the last ``depth``
+                  backups)
+        """
+        model = models.Backup_data
+        session = get_session()
+        latest = {}
+        with_full = set()
+        for chunk in _chunks(volume_ids):
+            query = (
+                session.query(model.volume_id, sa.func.max(model.created_at))
+                .filter(model.volume_id.in_(chunk))
+                .group_by(model.volume_id)
+            )
+            latest.update(query.all())
+            if depth:
+                with_full.update(self._get_volumes_with_full_backup(chunk, depth))
+        return {
+            volume_id: (created_at, volume_id in with_full)
+            for volume_id, created_at in latest.items()
+        }
+
+    def get_backup_durations(self, context, volume_ids):
+        """Average duration of the completed backups of a batch of volumes
+
+        :param volume_ids: Target volume ids
+        :returns: dict mapping (volume_id, incremental) to the average
+                  backup_duration in seconds of the volume's backups of
+                  that kind
+        """
+        model = models.Backup_data
+        session = get_session()
+        durations = {}
+        for chunk in _chunks(volume_ids):
+            query = (
+                session.query(
+                    model.volume_id,
+                    model.incremental,
+                    sa.func.avg(model.backup_duration),
+                )
+                .filter(
+                    model.volume_id.in_(chunk),
+                    model.backup_duration.isnot(None),
+                )
+                .group_by(model.volume_id, model.incremental)
+            )
+            for volume_id, incremental, duration in query:
+                durations[(volume_id, bool(incremental))] = float(duration)
+        return durations
+
+    def get_backup_children(self, context, backup_ids):
+        """Find the incremental backups based on a batch of backups
+
+        :param backup_ids: Target backup ids
+        :returns: dict mapping the backup_id of every backup which has
+                  incremental backups based on it to the list of their
+                  backup_id
+        """
+        model = models.Backup_data
+        session = get_session()
+        children = collections.defaultdict(list)
+        for chunk in _chunks(backup_ids):
+            query = session.query(model.parent_backup_id, model.backup_id).filter(
+                model.parent_backup_id.in_(chunk)
+            )
+            for parent_backup_id, backup_id in query:
+                children[parent_backup_id].append(backup_id)
+        return dict(children)
+
+    def get_retention_candidates(
+        self, context, cutoff=None, instance_cutoffs=None, batch_size=None
+    ):
+        """Stream the backups older than their retention cutoff
+
+        The rows are ordered by instance_id and created_at, and are fetched
+        batch_size at a time by keyset pagination instead of loading the
+        whole backup history. The backups of an instance are returned one
+        after the other, the ones without instance_id come first.
+
+        :param cutoff: the default retention cutoff, backups created before
+                       it are returned. None to return none of them.
+        :param instance_cutoffs: dict mapping instance_id to the cutoff
+                                 used instead of the default one for the
+                                 backups of that instance.
+        :param batch_size: number of rows fetched at a time.
+        :returns: iterator of Backup_data rows.
+        """
+        model = models.Backup_data
+        instance_cutoffs = instance_cutoffs or {}
+        batch_size = batch_size or CONF.database.stream_batch_size
+        # Walks ix_backup_data_instance_id_created_at, which ends with
+        # the primary key.
+        sort_columns = [model.instance_id, model.created_at, model.id]
+        if cutoff is not None:
+            query = model_query(model).filter(
+                model.created_at < timeutils.normalize_time(cutoff)
+            )
+            for row in _keyset_iter(query, sort_columns, batch_size):
+                # Instances with custom retention are selected below. They
+                # are few, skipping them here keeps this query simple.
+                if row.instance_id not in instance_cutoffs:
+                    yield row
+
+        # Instances sharing a retention time share a cutoff, select them
+        # with batched IN clauses. An instance is in a single batch, so its
+        # backups are still returned one after the other.
+        instances_by_cutoff = collections.defaultdict(list)
+        for instance_id, instance_cutoff in instance_cutoffs.items():
+            instances_by_cutoff[instance_cutoff].append(instance_id)
+        for instance_cutoff, instance_ids in instances_by_cutoff.items():
+            for chunk in _chunks(sorted(instance_ids)):
+                query = model_query(model).filter(
+                    model.instance_id.in_(chunk),
+                    model.created_at < timeutils.normalize_time(instance_cutoff),
+                )
+                yield from _keyset_iter(query, sort_columns, batch_size)
+
+    @staticmethod
+    def _get_volumes_with_full_backup(volume_ids, depth):
+        """Volumes which have a full backup in their last ``depth`` backups"""
+        model = models.Backup_data
+        session = get_session()
+        is_full = sa.or_(model.incremental == sa.false(), model.incremental.is_(None))
+        try:
+            rank = (
+                sa.func.row_number()
+                .over(partition_by=model.volume_id, order_by=model.id.desc())
+                .label("rank")
+            )
+            subquery = (
+                session.query(model.volume_id, is_full.label("is_full"), rank)
+                .filter(model.volume_id.in_(volume_ids))
+                .subquery()
+            )
+            query = (
+                session.query(subquery.c.volume_id)
+                .filter(subquery.c.rank <= depth, subquery.c.is_full)
+                .distinct()
+            )
+            return {row.volume_id for row in query.all()}
+        except db_exc.DBError:
+            # Window functions are not supported by this backend, walk the
+            # history of the volumes instead.
+            LOG.debug("Window functions unsupported, scan backup history.")
+        query = (
+            session.query(model.volume_id, model.incremental)
+            .filter(model.volume_id.in_(volume_ids))
+            .order_by(model.volume_id, model.id.desc())
+        )
+        seen = collections.Counter()
+        volumes = set()
+        for volume_id, incremental in query:
+            seen[volume_id] += 1
+            if seen[volume_id] <= depth and not incremental:
+                volumes.add(volume_id)
+        return volumes
+
     def update_backup(self, backup_id, values):
         if "backup_id" in values:
             LOG.error("Cannot override ID for existing backup")
@@ -306,11 +577,195 @@ class Connection(object):
             LOG.error("Backup ID already exists.")
         return queue_data
 
+    def create_queues(self, values_list, chunk_size=None, skip_statuses=None):
+        """Insert a batch of queue_data rows in a single transaction
+
+        Rows are sent with executemany in chunks of ``chunk_size`` rows,
+        CONF.database.bulk_insert_chunk_size by default.
+
+        With ``skip_statuses``, the volumes of each chunk which already have
+        a queue row in one of those statuses are looked up in the same
+        transaction and their rows are silently skipped. This check and
+        the insert are not atomic, two transactions queuing the same
+        volume at once may both insert it, so callers must not queue
+        concurrently. BackupManager only queues tasks while holding the
+        puller lock.
+
+        :param values_list: list of column values of the rows to create,
+                            all rows must set the same columns
+        :param skip_statuses: backup statuses of existing queue rows which
+                              prevent queuing their volume again
+        :returns: list of the ids of the created rows if the backend can
+                  return them from a bulk insert, None otherwise
+        """
+        if not values_list:
+            return []
+        model = models.Queue_data
+        table = model.__table__
+        chunk_size = chunk_size or CONF.database.bulk_insert_chunk_size
+        now = timeutils.utcnow()
+        for values in values_list:
+            if not values.get("backup_id"):
+                values["backup_id"] = short_id.generate_id()
+            values.setdefault("created_at", now)
+
+        returning = getattr(get_engine().dialect, "insert_executemany_returning", False)
+        statement = table.insert()
+        if returning:
+            statement = statement.returning(table.c.id)
+        ids = []
+        session = get_session()
+        try:
+            with session.begin():
+                connection = session.connection()
+                for chunk in _chunks(values_list, chunk_size):
+                    if skip_statuses:
+                        chunk = self._skip_active_volumes(
+                            connection, chunk, skip_statuses
+                        )
+                        if not chunk:
+                            continue
+                    result = connection.execute(statement, chunk)
+                    if returning:
+                        ids.extend(result.scalars())
+        except db_exc.DBDuplicateEntry:
+            LOG.error("Backup ID already exists.")
+            raise
+        return ids if returning else None
+
+    @staticmethod
+    def _skip_active_volumes(connection, values_list, statuses):
+        """Drop the rows of the volumes which have a queue row in statuses
+
+        Only the first row of a volume is kept if it appears several times.
+        """
+        table = models.Queue_data.__table__
+        skipped = set(
+            connection.execute(
+                sa.select(table.c.volume_id)
+                .where(
+                    table.c.volume_id.in_(
+                        {values["volume_id"] for values in values_list}
+                    ),
+                    table.c.backup_status.in_(statuses),
+                )
+                .distinct()
+            ).scalars()
+        )
+        rows = []
+        for values in values_list:
+            if values["volume_id"] not in skipped:
+                skipped.add(values["volume_id"])
+                rows.append(values)
+        return rows
+
+    def delete_queues(self, context, project_id, statuses, chunk_size=None):
+        """Delete the queue_data rows of a project in some statuses
+
+        The rows are deleted with a single
+        DELETE ... WHERE project_id = ? AND backup_status IN (...). With
+        ``chunk_size``, they are deleted that many at a time instead, each
+        chunk in its own transaction, to keep locks short for huge
+        projects.
+
+        :param project_id: project of the rows to delete
+        :param statuses: backup statuses of the rows to delete
+        :param chunk_size: number of rows deleted per transaction, all of
+                           them at once if None or 0
+        :returns: number of deleted rows
+        """
+        table = models.Queue_data.__table__
+        where = sa.and_(
+            table.c.project_id == project_id,
+            table.c.backup_status.in_(list(statuses)),
+        )
+        session = get_session()
+        if not chunk_size:
+            with session.begin():
+                return (
+                    session.connection().execute(table.delete().where(where)).rowcount
+                )
+
+        deleted = 0
+        while True:
+            with session.begin():
+                connection = session.connection()
+                # DELETE ... LIMIT is not portable, pick the ids first.
+                ids = (
+                    connection.execute(
+                        sa.select(table.c.id).where(where).limit(chunk_size)
+                    )
+                    .scalars()
+                    .all()
+                )
+                if ids:
+                    deleted += connection.execute(
+                        table.delete().where(table.c.id.in_(ids))
+                    ).rowcount
+            if len(ids) < chunk_size:
+                return deleted
+
+    def update_queues_status(self, context, ids, from_status, to_status, values=None):
+        """Move queue_data rows from one backup status to another
+
+        Compare and set: only the rows of ``ids`` still in ``from_status``
+        are changed, with
+        UPDATE ... WHERE id IN (...) AND backup_status = ? RETURNING ...,
+        in one transaction. Backends which can't return the updated rows
+        lock the matching rows with SELECT ... FOR UPDATE first and select
+        them again once updated.
+
+        :param ids: ids of the rows to change
+        :param from_status: backup status the rows must be in
+        :param to_status: backup status set on the rows
+        :param values: other columns to set on the changed rows
+        :returns: the changed rows, as mappings of column name to value
+        """
+        table = models.Queue_data.__table__
+        values = dict(values or {}, backup_status=to_status)
+        returning = getattr(get_engine().dialect, "update_returning", False)
+        changed = []
+        session = get_session()
+        with session.begin():
+            connection = session.connection()
+            for chunk in _chunks(ids):
+                where = sa.and_(
+                    table.c.id.in_(chunk), table.c.backup_status == from_status
+                )
+                if returning:
+                    result = connection.execute(
+                        table.update().where(where).values(**values).returning(table)
+                    )
+                    changed.extend(result.mappings())
+                    continue
+                locked = (
+                    connection.execute(
+                        sa.select(table.c.id).where(where).with_for_update()
+                    )
+                    .scalars()
+                    .all()
+                )
+                if locked:
+                    connection.execute(
+                        table.update().where(table.c.id.in_(locked)).values(**values)
+                    )
+                    changed.extend(
+                        connection.execute(
+                            sa.select(table).where(table.c.id.in_(locked))
+                        ).mappings()
+                    )
+        return changed
+
     def get_queue_list(self, *args, **kwargs):
         return self._get_model_list(
             models.Queue_data, self._add_queues_filters, *args, **kwargs
         )
 
+    def get_queue_iter(self, *args, **kwargs):
+        return self._iter_model_list(
+            models.Queue_data, self._add_queues_filters, *args, **kwargs
+        )
+
     def update_queue(self, id, values):
 
         try:
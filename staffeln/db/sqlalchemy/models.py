@@ -7,7 +7,7 @@ from __future__ import annotations
 import urllib.parse as urlparse
 
 from oslo_db.sqlalchemy import models
-from sqlalchemy import Boolean, Column, Integer, String, UniqueConstraint
+from sqlalchemy import Boolean, Column, Index, Integer, String, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 
 from staffeln import conf
@@ -52,6 +52,16 @@ class Backup_data(Base):
     __tablename__ = "backup_data"
     __table_args__ = (
         UniqueConstraint("backup_id", name="unique_backup0uuid"),
+        # Backup history of a volume, see Backup._is_backup_required and
+        # Connection.get_backup_history.
+        Index("ix_backup_data_volume_id_created_at", "volume_id", "created_at"),
+        # Latest backups of a volume by id, see Backup._is_incremental and
+        # Connection._get_volumes_with_full_backup.
+        Index("ix_backup_data_volume_id_id", "volume_id", "id"),
+        # Backups of an instance, see RotationManager.
+        Index("ix_backup_data_instance_id_created_at", "instance_id", "created_at"),
+        # Incremental backups based on a backup, see RotationManager.
+        Index("ix_backup_data_parent_backup_id", "parent_backup_id"),
         table_args(),
     )
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -61,13 +71,24 @@ class Backup_data(Base):
     instance_id = Column(String(100))
     backup_completed = Column(Integer())
     incremental = Column(Boolean, default=False)
+    backup_duration = Column(Integer(), nullable=True)
+    parent_backup_id = Column(String(100), nullable=True)
 
 
 class Queue_data(Base):
     """Represent the queue of the database"""
 
     __tablename__ = "queue_data"
-    __table_args__ = table_args()
+    __table_args__ = (
+        # Tasks in a status, see BackupManager.
+        Index("ix_queue_data_backup_status", "backup_status"),
+        # Tasks of a project in a status, see BackupResult.publish and
+        # Backup.purge_backups.
+        Index("ix_queue_data_project_id_backup_status", "project_id", "backup_status"),
+        # Active tasks of a volume, see Connection.create_queues.
+        Index("ix_queue_data_volume_id_backup_status", "volume_id", "backup_status"),
+        table_args(),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     backup_id = Column(String(100))
     project_id = Column(String(100))
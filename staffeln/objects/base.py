@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import collections
+
 from oslo_utils import versionutils
 from oslo_versionedobjects import base as ovoo_base
 from oslo_versionedobjects import fields as ovoo_fields
@@ -68,6 +70,23 @@ class StaffelnPersistentObject(ovoo_base.VersionedObject):
         obj.obj_reset_changes()
         return obj
 
+    @classmethod
+    def record_class(cls):
+        """Named tuple type of the read-only records of this object
+
+        Records carry the fields stored in the database and are built
+        straight from the selected columns, without the field coercion and
+        change tracking of versioned objects. Built once per class.
+        """
+        record_class = cls.__dict__.get("_record_class")
+        if record_class is None:
+            record_class = collections.namedtuple(
+                f"{cls.obj_name()}Record",
+                [field for field in cls.fields if field not in cls.object_fields],
+            )
+            cls._record_class = record_class
+        return record_class
+
 
 class StaffelnObjectRegistry(ovoo_base.VersionedObjectRegistry):
     def registration_hook(self, cls, index):
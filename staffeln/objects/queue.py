@@ -35,10 +35,55 @@ class Queue(
     }
 
     @base.remotable_classmethod
-    def list(cls, context, filters=None):  # pylint: disable=E0213
+    def list(cls, context, filters=None, read_only=False):  # pylint: disable=E0213
+        """Return a list of :class:`Queue` objects.
+
+        :param filters: dict mapping the filter to a value.
+        :param read_only: return records of :meth:`record_class` instead,
+                          for callers which don't change and save them.
+        """
+        if read_only:
+            record_class = cls.record_class()
+            rows = cls.dbapi.get_queue_list(
+                context, filters=filters, columns=record_class._fields
+            )
+            return [record_class._make(row) for row in rows]
+
         db_queue = cls.dbapi.get_queue_list(context, filters=filters)
         return [cls._from_db_object(cls(context), obj) for obj in db_queue]
 
+    @base.remotable_classmethod
+    def list_iter(  # pylint: disable=E0213
+        cls, context, filters=None, sort_key=None, sort_dir=None, read_only=False
+    ):
+        """Page through the :class:`Queue` objects by keyset
+
+        Rows are fetched CONF.database.stream_batch_size at a time, so
+        large tables are read with constant memory.
+
+        :param filters: dict mapping the filter to a value.
+        :param sort_key: a non nullable field to sort by before id.
+        :param sort_dir: "asc" or "desc".
+        :param read_only: yield records of :meth:`record_class` instead.
+        :returns: iterator of :class:`Queue` objects.
+        """
+        if read_only:
+            record_class = cls.record_class()
+            for row in cls.dbapi.get_queue_iter(
+                context,
+                filters=filters,
+                sort_key=sort_key,
+                sort_dir=sort_dir,
+                columns=record_class._fields,
+            ):
+                yield record_class._make(row)
+            return
+
+        for obj in cls.dbapi.get_queue_iter(
+            context, filters=filters, sort_key=sort_key, sort_dir=sort_dir
+        ):
+            yield cls._from_db_object(cls(context), obj)
+
     @base.remotable_classmethod
     def get_by_id(cls, context, id):  # pylint: disable=E0213
         """Find a queue task based on id
@@ -65,6 +110,64 @@ class Queue(
         db_queue = self.dbapi.create_queue(values)
         return self._from_db_object(self, db_queue)
 
+    @base.remotable_classmethod
+    def bulk_create(  # pylint: disable=E0213
+        cls, context, values_list, chunk_size=None, skip_statuses=None
+    ):
+        """Create a batch of :class:`Queue_data` records in the DB
+
+        The rows are inserted in one transaction without building a
+        :class:`Queue` object per row.
+
+        :param values_list: list of dicts of the queue fields to create.
+        :param chunk_size: number of rows sent per executemany batch.
+        :param skip_statuses: skip the rows whose volume already has a
+                              queue task in one of these statuses.
+        :returns: list of the created ids, or None if the database backend
+                  can't return them from a bulk insert.
+        """
+        return cls.dbapi.create_queues(
+            values_list, chunk_size=chunk_size, skip_statuses=skip_statuses
+        )
+
+    @base.remotable_classmethod
+    def bulk_delete(  # pylint: disable=E0213
+        cls, context, project_id, statuses, chunk_size=None
+    ):
+        """Delete the :class:`Queue_data` records of a project in some statuses
+
+        The rows are deleted in the DB without loading them.
+
+        :param project_id: project of the records to delete.
+        :param statuses: backup statuses of the records to delete.
+        :param chunk_size: number of rows deleted per transaction, all of
+                           them at once if None or 0.
+        :returns: number of deleted records.
+        """
+        return cls.dbapi.delete_queues(
+            context, project_id, statuses, chunk_size=chunk_size
+        )
+
+    @base.remotable_classmethod
+    def bulk_update_status(  # pylint: disable=E0213
+        cls, context, ids, from_status, to_status, values=None
+    ):
+        """Move a batch of :class:`Queue_data` records to another status
+
+        Only the records still in from_status are changed, in one round
+        trip, so concurrent workers can claim tasks without locks.
+
+        :param ids: ids of the records to change.
+        :param from_status: backup status the records must be in.
+        :param to_status: backup status to set.
+        :param values: dict of other fields to set on the changed records.
+        :returns: list of the changed :class:`Queue` objects.
+        """
+        db_queues = cls.dbapi.update_queues_status(
+            context, ids, from_status, to_status, values=values
+        )
+        return [cls._from_db_object(cls(context), obj) for obj in db_queues]
+
     @base.remotable
     def save(self):
         updates = self.obj_get_changes()
@@ -13,9 +13,11 @@ class Volume(
     base.StaffelnObject,
     base.StaffelnObjectDictCompat,
 ):
-    VERSION = "1.1"
+    VERSION = "1.3"
     # Version 1.0: Initial version
     # Version 1.1: Add 'incremental' and 'created_at' field
+    # Version 1.2: Add 'backup_duration' field
+    # Version 1.3: Add 'parent_backup_id' field
 
     dbapi = db_api.get_instance()
 
@@ -27,19 +29,115 @@ class Volume(
         "volume_id": sfeild.UUIDField(),
         "backup_completed": sfeild.IntegerField(),
         "incremental": sfeild.BooleanField(nullable=True),
+        "backup_duration": sfeild.IntegerField(nullable=True),
+        "parent_backup_id": sfeild.StringField(nullable=True),
         "created_at": ovoo_fields.DateTimeField(),
     }
 
     @base.remotable_classmethod
-    def list(cls, context, filters=None, **kwargs):  # pylint: disable=E0213
+    def list(  # pylint: disable=E0213
+        cls, context, filters=None, read_only=False, **kwargs
+    ):
         """Return a list of :class:`Backup` objects.
 
         :param filters: dict mapping the filter to a value.
+        :param read_only: return records of :meth:`record_class` instead,
+                          for callers which don't change and save them.
         """
+        if read_only:
+            record_class = cls.record_class()
+            rows = cls.dbapi.get_backup_list(
+                context, filters=filters, columns=record_class._fields, **kwargs
+            )
+            return [record_class._make(row) for row in rows]
+
         db_backups = cls.dbapi.get_backup_list(context, filters=filters, **kwargs)
 
         return [cls._from_db_object(cls(context), obj) for obj in db_backups]
 
+    @base.remotable_classmethod
+    def list_iter(  # pylint: disable=E0213
+        cls, context, filters=None, sort_key=None, sort_dir=None, read_only=False
+    ):
+        """Page through the :class:`Backup` objects by keyset
+
+        Rows are fetched CONF.database.stream_batch_size at a time, so
+        large tables are read with constant memory.
+
+        :param filters: dict mapping the filter to a value.
+        :param sort_key: a non nullable field to sort by before id.
+        :param sort_dir: "asc" or "desc".
+        :param read_only: yield records of :meth:`record_class` instead.
+        :returns: iterator of :class:`Backup` objects.
+        """
+        if read_only:
+            record_class = cls.record_class()
+            for row in cls.dbapi.get_backup_iter(
+                context,
+                filters=filters,
+                sort_key=sort_key,
+                sort_dir=sort_dir,
+                columns=record_class._fields,
+            ):
+                yield record_class._make(row)
+            return
+
+        for obj in cls.dbapi.get_backup_iter(
+            context, filters=filters, sort_key=sort_key, sort_dir=sort_dir
+        ):
+            yield cls._from_db_object(cls(context), obj)
+
+    @base.remotable_classmethod
+    def get_backup_history(cls, context, volume_ids, depth=0):  # pylint: disable=E0213
+        """Summarize the backup history of a batch of volumes
+
+        :param volume_ids: list of volume ids to look up.
+        :param depth: number of most recent backups to look for a full
+                      backup in.
+        :returns: dict mapping volume id to a tuple of (latest backup
+                  created_at, full backup found within depth). Volumes
+                  without backups are not included.
+        """
+        return cls.dbapi.get_backup_history(context, volume_ids, depth=depth)
+
+    @base.remotable_classmethod
+    def get_backup_durations(cls, context, volume_ids):  # pylint: disable=E0213
+        """Average duration of the completed backups of a batch of volumes
+
+        :param volume_ids: list of volume ids to look up.
+        :returns: dict mapping (volume id, incremental) to the average
+                  backup duration in seconds.
+        """
+        return cls.dbapi.get_backup_durations(context, volume_ids)
+
+    @base.remotable_classmethod
+    def get_backup_children(cls, context, backup_ids):  # pylint: disable=E0213
+        """Incremental backups based on a batch of backups
+
+        :param backup_ids: list of backup ids to look up.
+        :returns: dict mapping backup id to the list of the backup ids of
+                  the incremental backups based on it. Backups without
+                  incremental backups are not included.
+        """
+        return cls.dbapi.get_backup_children(context, backup_ids)
+
+    @base.remotable_classmethod
+    def list_retention_candidates(  # pylint: disable=E0213
+        cls, context, cutoff=None, instance_cutoffs=None
+    ):
+        """Stream the backups older than their retention cutoff
+
+        :param cutoff: the default retention cutoff.
+        :param instance_cutoffs: dict mapping instance_id to its custom
+                                 retention cutoff.
+        :returns: iterator of :class:`Backup` objects.
+        """
+        db_backups = cls.dbapi.get_retention_candidates(
+            context, cutoff=cutoff, instance_cutoffs=instance_cutoffs
+        )
+        for obj in db_backups:
+            yield cls._from_db_object(cls(context), obj)
+
     @base.remotable
     def create(self):
         """Create a :class:`Backup_data` record in the DB"""
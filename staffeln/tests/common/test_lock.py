@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import copy
+import shutil
+import tempfile
+from unittest import mock
+
+from staffeln import conf
+from staffeln.common import lock
+from staffeln.tests import base
+
+
+class CoordinatorTest(base.TestCase):
+
+    def setUp(self):
+        super(CoordinatorTest, self).setUp()
+        backend_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, backend_dir, True)
+        conf.CONF.set_override("backend_url", f"file://{backend_dir}", "coordination")
+        self.addCleanup(conf.CONF.clear_override, "backend_url", "coordination")
+
+    def _start(self):
+        coordinator = lock.Coordinator(prefix="staffeln-")
+        coordinator.start()
+        self.addCleanup(coordinator.stop)
+        return coordinator
+
+    def test_group_member_count(self):
+        first = self._start()
+        second = self._start()
+        first.join_group("api_clients")
+        self.assertEqual(1, first.get_member_count("api_clients"))
+        second.join_group("api_clients")
+        second.join_group("api_clients")
+        self.assertEqual(2, first.get_member_count("api_clients"))
+        second.stop()
+        self.assertEqual(1, first.get_member_count("api_clients"))
+
+    def test_lock_manager_member_count(self):
+        lock_mgt = lock.LockManager()
+        lock_mgt.coordinator = self._start()
+        self.assertEqual(1, lock_mgt.get_member_count("api_clients"))
+
+    def test_lock_manager_member_count_failure(self):
+        lock_mgt = lock.LockManager()
+        lock_mgt.coordinator = lock.Coordinator(prefix="staffeln-")
+        self.assertEqual(1, lock_mgt.get_member_count("api_clients"))
+
+    def test_forked_workers_are_distinct_members(self):
+        # Created at import time, before cotyledon forks the workers.
+        coordinator = lock.Coordinator(prefix="staffeln-")
+        forked = copy.copy(coordinator)
+        with mock.patch("os.getpid", return_value=100):
+            coordinator.start()
+            self.addCleanup(coordinator.stop)
+        with mock.patch("os.getpid", return_value=200):
+            forked.start()
+            self.addCleanup(forked.stop)
+
+        coordinator.join_group("api_clients")
+        forked.join_group("api_clients")
+        self.assertEqual(2, coordinator.get_member_count("api_clients"))
+
+    def test_lock_manager_stays_member_between_cycles(self):
+        first = lock.LockManager()
+        first.coordinator = lock.Coordinator(prefix="staffeln-")
+        second = lock.LockManager()
+        second.coordinator = lock.Coordinator(prefix="staffeln-")
+        self.addCleanup(first.leave_groups)
+        self.addCleanup(second.leave_groups)
+
+        with first:
+            self.assertEqual(1, first.get_member_count("api_clients"))
+        with second:
+            self.assertEqual(2, second.get_member_count("api_clients"))
+        # The first one still counts after its cycle is over.
+        self.assertTrue(first.coordinator.started)
+        self.assertEqual(2, second.get_member_count("api_clients"))
+
+        first.leave_groups()
+        self.assertFalse(first.coordinator.started)
+        self.assertEqual(1, second.get_member_count("api_clients"))
@@ -0,0 +1,229 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import asyncio
+import unittest
+from unittest import mock
+
+import tenacity
+from keystoneauth1 import exceptions as ks_exceptions
+from openstack import exceptions as openstack_exc
+
+from staffeln.common import openstack, openstack_async
+from staffeln.tests import base
+
+try:
+    from aiohttp import test_utils, web
+except ImportError:
+    web = None
+
+
+@unittest.skipIf(web is None, "aiohttp is not installed")
+class AsyncOpenstackSDKTest(base.TestCase):
+
+    def setUp(self):
+        super(AsyncOpenstackSDKTest, self).setUp()
+        openstack.reset_circuit_breakers()
+        self.addCleanup(openstack.reset_circuit_breakers)
+        self.requests = []
+        self.responses = {}
+        self.pool = mock.MagicMock()
+        self.pool.get.side_effect = self._get_conn
+        self.pool.get_base.side_effect = lambda: self._get_conn({"id": "admin"})
+        self.m_sleep = mock.AsyncMock()
+        for name in ("get_servers", "get_volume", "get_backup", "delete_backup"):
+            func = getattr(openstack_async.AsyncOpenstackSDK, name)
+            self._patch_retry(func)
+
+    def _patch_retry(self, func):
+        for attr, value in (
+            ("sleep", self.m_sleep),
+            ("stop", tenacity.stop_after_attempt(2)),
+        ):
+            p = mock.patch.object(func.retry, attr, value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _get_conn(self, project):
+        conn = mock.MagicMock()
+        conn.session.get_token.return_value = f"token-{project['id']}"
+        for service_type in ("compute", "block_storage"):
+            getattr(conn, service_type).get_endpoint.return_value = (
+                f"{self.url}/{service_type}/{project['id']}/"
+            )
+        return conn
+
+    async def _handle(self, request):
+        self.requests.append(
+            (
+                request.method,
+                request.path,
+                dict(request.query),
+                request.headers["X-Auth-Token"],
+                await request.json() if request.can_read_body else None,
+            )
+        )
+        key = (request.method, request.path)
+        responses = self.responses[key]
+        status, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        if body is None:
+            return web.Response(status=status)
+        return web.json_response(body, status=status)
+
+    def _run(self, func):
+        async def run():
+            app = web.Application()
+            app.router.add_route("*", "/{tail:.*}", self._handle)
+            async with test_utils.TestServer(app) as server:
+                self.url = str(server.make_url("")).rstrip("/")
+                async with openstack_async.AsyncOpenstackSDK(self.pool) as sdk:
+                    return await func(sdk)
+
+        return asyncio.run(run())
+
+    def test_get_servers_paginates(self):
+        conf = openstack_async.CONF
+        conf.set_override("list_page_size", 2, "openstack")
+        self.addCleanup(conf.clear_override, "list_page_size", "openstack")
+        self.responses[("GET", "/compute/admin/servers/detail")] = [
+            (
+                200,
+                {
+                    "servers": [{"id": "s1"}, {"id": "s2"}],
+                    "servers_links": [
+                        {"rel": "next", "href": "http://nova/servers?marker=s2"}
+                    ],
+                },
+            ),
+            # A short page is not the last one while it has a next link.
+            (
+                200,
+                {
+                    "servers": [{"id": "s3"}],
+                    "servers_links": [
+                        {"rel": "next", "href": "http://nova/servers?marker=s3"}
+                    ],
+                },
+            ),
+            (200, {"servers": []}),
+        ]
+
+        servers = self._run(lambda sdk: sdk.get_servers())
+
+        self.assertEqual(["s1", "s2", "s3"], [s.id for s in servers])
+        self.assertEqual(
+            [
+                {"limit": "2", "all_tenants": "1"},
+                {"limit": "2", "all_tenants": "1", "marker": "s2"},
+                {"limit": "2", "all_tenants": "1", "marker": "s3"},
+            ],
+            [r[2] for r in self.requests],
+        )
+
+    def test_get_volume_concurrently(self):
+        for i in range(20):
+            self.responses[("GET", f"/block_storage/p{i % 2}/volumes/v{i}")] = [
+                (200, {"volume": {"id": f"v{i}", "status": "in-use"}})
+            ]
+
+        volumes = self._run(
+            lambda sdk: asyncio.gather(
+                *[sdk.get_volume(f"v{i}", f"p{i % 2}") for i in range(20)]
+            )
+        )
+
+        self.assertEqual([f"v{i}" for i in range(20)], [v.id for v in volumes])
+        self.assertEqual({"in-use"}, {v.status for v in volumes})
+        self.assertEqual({"token-p0", "token-p1"}, {r[3] for r in self.requests})
+
+    def test_get_backup_retry_and_not_found(self):
+        self.responses[("GET", "/block_storage/admin/backups/b1")] = [
+            (503, {"error": "unavailable"}),
+            (200, {"backup": {"id": "b1", "status": "available"}}),
+        ]
+        self.responses[("GET", "/block_storage/admin/backups/b2")] = [(404, {})]
+
+        backup, missing = self._run(
+            lambda sdk: asyncio.gather(sdk.get_backup("b1"), sdk.get_backup("b2"))
+        )
+
+        self.assertEqual("available", backup.status)
+        self.assertIsNone(missing)
+        self.m_sleep.assert_awaited_once_with(1.0)
+
+    def test_get_backup_http_error(self):
+        self.responses[("GET", "/block_storage/admin/backups/b1")] = [(400, {})]
+        exc = self.assertRaises(
+            openstack_exc.HttpException,
+            self._run,
+            lambda sdk: sdk.get_backup("b1"),
+        )
+        self.assertEqual(400, exc.status_code)
+
+    def test_connection_failure_trips_circuit_breaker(self):
+        conf = openstack_async.CONF
+        conf.set_override("circuit_breaker_threshold", 1, "openstack")
+        self.addCleanup(conf.clear_override, "circuit_breaker_threshold", "openstack")
+        conn = mock.MagicMock()
+        conn.session.get_token.return_value = "token-admin"
+        # Nothing listens on port 1, the connection is refused.
+        conn.block_storage.get_endpoint.return_value = "http://127.0.0.1:1/"
+        self.pool.get_base.side_effect = None
+        self.pool.get_base.return_value = conn
+
+        self.assertRaises(
+            ks_exceptions.ConnectFailure,
+            self._run,
+            lambda sdk: sdk.get_backup("b1"),
+        )
+        self.assertTrue(openstack.get_circuit_breaker("block_storage").is_open)
+
+    def test_create_backup(self):
+        self.responses[("POST", "/block_storage/p1/backups")] = [
+            (202, {"backup": {"id": "b1"}})
+        ]
+
+        backup = self._run(
+            lambda sdk: sdk.create_backup("v1", "p1", name="bk", incremental=True)
+        )
+
+        self.assertEqual("b1", backup.id)
+        self.assertEqual(
+            {
+                "backup": {
+                    "volume_id": "v1",
+                    "force": True,
+                    "name": "bk",
+                    "incremental": True,
+                }
+            },
+            self.requests[0][4],
+        )
+
+    def test_delete_backup(self):
+        self.responses[("DELETE", "/block_storage/p1/backups/b1")] = [(202, None)]
+        self.responses[("POST", "/block_storage/p1/backups/b2/action")] = [(202, None)]
+        self.responses[("DELETE", "/block_storage/p1/backups/b3")] = [(404, {})]
+
+        self._run(
+            lambda sdk: asyncio.gather(
+                sdk.delete_backup("b1", "p1"),
+                sdk.delete_backup("b2", "p1", force=True),
+                sdk.delete_backup("b3", "p1"),
+            )
+        )
+
+        self.assertEqual(
+            {"os-force_delete": {}},
+            [r for r in self.requests if r[0] == "POST"][0][4],
+        )
+
+    def test_get_backup_quota(self):
+        self.responses[("GET", "/block_storage/admin/os-quota-sets/p1")] = [
+            (200, {"quota_set": {"backups": {"limit": 10, "in_use": 2}}})
+        ]
+
+        quota = self._run(lambda sdk: sdk.get_backup_quota("p1"))
+
+        self.assertEqual(10, quota["limit"])
+        self.assertEqual({"usage": "True"}, self.requests[0][2])
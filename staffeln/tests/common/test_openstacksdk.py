@@ -1,9 +1,12 @@
 # SPDX-License-Identifier: Apache-2.0
 from __future__ import annotations
 
+import datetime
+import warnings
 from unittest import mock
 
 import tenacity
+from keystoneauth1 import exceptions as ks_exceptions
 from openstack import exceptions as openstack_exc
 
 from staffeln import conf
@@ -15,6 +18,9 @@ class OpenstackSDKTest(base.TestCase):
 
     def setUp(self):
         super(OpenstackSDKTest, self).setUp()
+        s_openstack.reset_circuit_breakers()
+        self.addCleanup(s_openstack.reset_circuit_breakers)
+        s_openstack.RETRY_BUDGET.reset()
         self.m_c = mock.MagicMock()
         with mock.patch("openstack.connect", return_value=self.m_c):
             self.openstack = s_openstack.OpenstackSDK()
@@ -27,7 +33,9 @@ class OpenstackSDKTest(base.TestCase):
             "get_user",
             "get_project_member_emails",
             "get_volume",
+            "get_volumes",
             "get_backup",
+            "get_backups",
             "delete_backup",
             "get_backup_quota",
             "get_backup_gigabytes_quota",
@@ -264,6 +272,23 @@ class OpenstackSDKTest(base.TestCase):
             project_id="bar",
         )
 
+    def test_get_volumes(self):
+        self.m_c.block_storage.volumes = mock.MagicMock(
+            return_value=iter([self.fake_volume])
+        )
+        self.assertEqual(self.openstack.get_volumes(), [self.fake_volume])
+        self.m_c.block_storage.volumes.assert_called_once_with(
+            details=True, all_projects=True, limit=1000
+        )
+
+    def test_get_volumes_non_http_error(self):
+        self._test_non_http_error(self.m_c.block_storage.volumes, "get_volumes")
+
+    def test_get_volumes_500_http_error(self):
+        self._test_http_error(
+            self.m_c.block_storage.volumes, "get_volumes", status_code=500
+        )
+
     def test_get_backup(self):
         self.m_c.get_volume_backup = mock.MagicMock(return_value=self.fake_backup)
         self.assertEqual(
@@ -308,6 +333,36 @@ class OpenstackSDKTest(base.TestCase):
             project_id="bar",
         )
 
+    def test_get_backups(self):
+        backups = [
+            mock.MagicMock(id="b1", created_at="2024-01-01T02:00:00.000000"),
+            mock.MagicMock(id="b2", created_at="2024-01-01T01:00:00.000000"),
+            mock.MagicMock(id="b3", created_at="2024-01-01T00:00:00.000000"),
+        ]
+        self.m_c.block_storage.backups = mock.MagicMock(return_value=iter(backups))
+        self.assertEqual(
+            backups[:2],
+            self.openstack.get_backups(
+                since=datetime.datetime(
+                    2024, 1, 1, 0, 30, tzinfo=datetime.timezone.utc
+                ),
+                status="creating",
+            ),
+        )
+        self.m_c.block_storage.backups.assert_called_once_with(
+            details=True,
+            all_projects=True,
+            limit=1000,
+            sort_key="created_at",
+            sort_dir="desc",
+            status="creating",
+        )
+
+    def test_get_backups_500_http_error(self):
+        self._test_http_error(
+            self.m_c.block_storage.backups, "get_backups", status_code=500
+        )
+
     def test_delete_backup(self):
         self.m_c.delete_volume_backup = mock.MagicMock(return_value=self.fake_backup)
         self.assertEqual(
@@ -356,6 +411,21 @@ class OpenstackSDKTest(base.TestCase):
             project_id="bar",
         )
 
+    def test_delete_backup_once_http_error(self):
+        for status_code in (429, 503):
+            self.m_c.delete_volume_backup = mock.MagicMock(
+                side_effect=openstack_exc.HttpException(http_status=status_code)
+            )
+            exc = self.assertRaises(
+                openstack_exc.HttpException,
+                self.openstack.delete_backup_once,
+                uuid="foo",
+                project_id="bar",
+            )
+            self.assertEqual(status_code, exc.status_code)
+            self.m_c.delete_volume_backup.assert_called_once_with("foo", force=False)
+        self.m_sleep.assert_not_called()
+
     @mock.patch("openstack.proxy._json_response")
     def test_get_backup_quota(self, m_j_r):
         self.m_c.block_storage.get = mock.MagicMock(status_code=200)
@@ -455,3 +525,265 @@ class OpenstackSDKTest(base.TestCase):
         )
         self.m_c.block_storage.get.assert_called_once_with("/os-quota-sets/bar")
         self.m_gam.assert_called_once_with("quota_set", m_j_r())
+
+
+class ConnectionPoolTest(base.TestCase):
+
+    def setUp(self):
+        super(ConnectionPoolTest, self).setUp()
+        self.m_c = mock.MagicMock()
+        self.m_c.session.auth.auth_ref.will_expire_soon.return_value = False
+        self.m_c.connect_as_project.side_effect = lambda project: mock.MagicMock(
+            name=project["id"]
+        )
+        p = mock.patch("openstack.connect", return_value=self.m_c)
+        self.m_connect = p.start()
+        self.addCleanup(p.stop)
+        self.pool = s_openstack.ConnectionPool(size=2)
+
+    def test_get_reuses_connection(self):
+        conn = self.pool.get({"id": "p1", "name": "p1"})
+        self.assertIs(conn, self.pool.get({"id": "p1", "name": "p1"}))
+        self.m_c.connect_as_project.assert_called_once()
+        self.m_connect.assert_called_once()
+        self.assertEqual(1, self.pool.hits)
+        self.assertEqual(1, self.pool.misses)
+
+    def test_get_evicts_least_recently_used(self):
+        self.pool.get({"id": "p1"})
+        self.pool.get({"id": "p2"})
+        self.pool.get({"id": "p1"})
+        self.pool.get({"id": "p3"})
+        self.assertEqual(
+            {"size": 2, "hits": 1, "misses": 3, "evictions": 1}, self.pool.stats()
+        )
+        self.pool.get({"id": "p1"})
+        self.pool.get({"id": "p2"})
+        self.assertEqual(4, self.pool.misses)
+
+    def test_get_unbounded(self):
+        self.pool = s_openstack.ConnectionPool(size=0)
+        for project_id in ("p1", "p2", "p3"):
+            self.pool.get({"id": project_id})
+        self.pool.get({"id": "p1"})
+        self.assertEqual(
+            {"size": 3, "hits": 1, "misses": 3, "evictions": 0}, self.pool.stats()
+        )
+
+    def test_get_renews_expiring_token(self):
+        conn = self.pool.get({"id": "p1"})
+        conn.session.auth.auth_ref.will_expire_soon.return_value = True
+        self.pool.get({"id": "p1"})
+        conn.session.auth.invalidate.assert_called_once()
+        self.m_c.session.auth.invalidate.assert_not_called()
+
+    def test_clear(self):
+        self.pool.get({"id": "p1"})
+        self.pool.clear()
+        self.pool.get({"id": "p1"})
+        self.assertEqual(2, self.m_connect.call_count)
+        self.assertEqual(2, self.m_c.connect_as_project.call_count)
+
+    def test_sdk_shares_pool(self):
+        sdk = s_openstack.OpenstackSDK(pool=self.pool)
+        sdk.set_project({"id": "p1"})
+        other = s_openstack.OpenstackSDK(pool=self.pool)
+        other.set_project({"id": "p1"})
+        self.assertIs(sdk.conn, other.conn)
+        self.m_connect.assert_called_once()
+
+    def test_renew_expiring(self):
+        conn1 = self.pool.get({"id": "p1"})
+        conn2 = self.pool.get({"id": "p2"})
+        conn1.session.auth.auth_ref.will_expire_soon.return_value = True
+        conn2.session.auth.auth_ref.will_expire_soon.return_value = False
+        self.assertEqual(1, self.pool.renew_expiring())
+        conn1.session.auth.invalidate.assert_called_once()
+        conn1.session.get_token.assert_called_once()
+        conn2.session.auth.invalidate.assert_not_called()
+        self.m_c.session.get_token.assert_not_called()
+
+    def test_renew_expiring_failure(self):
+        conn1 = self.pool.get({"id": "p1"})
+        conn1.session.auth.auth_ref.will_expire_soon.return_value = True
+        conn1.session.get_token.side_effect = Exception("keystone down")
+        self.m_c.session.auth.auth_ref.will_expire_soon.return_value = True
+        self.assertEqual(1, self.pool.renew_expiring())
+        self.m_c.session.get_token.assert_called_once()
+
+    def test_sdk_renew_token(self):
+        sdk = s_openstack.OpenstackSDK(pool=self.pool)
+        sdk.set_project({"id": "p1"})
+        sdk.renew_token()
+        sdk.conn.session.get_token.assert_called_once()
+        self.m_c.session.get_token.assert_not_called()
+
+    def test_get_shares_http_adapter(self):
+        conn = self.pool.get({"id": "p1"})
+        for m_session in (conn.session.session, self.m_c.session.session):
+            m_session.mount.assert_has_calls(
+                [
+                    mock.call("https://", self.pool.http_adapter),
+                    mock.call("http://", self.pool.http_adapter),
+                ]
+            )
+
+
+class RetryPolicyTest(base.TestCase):
+
+    def setUp(self):
+        super(RetryPolicyTest, self).setUp()
+        s_openstack.reset_circuit_breakers()
+        self.addCleanup(s_openstack.reset_circuit_breakers)
+        s_openstack.RETRY_BUDGET.reset()
+        self.m_c = mock.MagicMock()
+        with mock.patch("openstack.connect", return_value=self.m_c):
+            self.openstack = s_openstack.OpenstackSDK()
+        self.m_sleep = mock.Mock()
+        # OpenstackSDKTest replaces the stop of the shared retry objects.
+        for attr, value in (
+            ("sleep", self.m_sleep),
+            ("stop", s_openstack.StopFromConf("block_storage")),
+        ):
+            p = mock.patch.object(self.openstack.get_volume.retry, attr, value)
+            p.start()
+            self.addCleanup(p.stop)
+        self.m_get = self.m_c.get_volume_by_id
+        self.m_get.side_effect = openstack_exc.HttpException(http_status=500)
+
+    def _set_override(self, name, override):
+        conf.CONF.set_override(name, override, "openstack")
+        self.addCleanup(conf.CONF.clear_override, name, "openstack")
+
+    def test_wait_reads_live_config(self):
+        self._set_override("max_retry_interval", 7)
+        wait = s_openstack.WaitExponentialFromConf()
+        self.assertEqual(7, wait(mock.Mock(attempt_number=10)))
+        self.assertEqual(2, wait(mock.Mock(attempt_number=2)))
+
+    def test_stop_reads_live_config(self):
+        self._set_override("retry_timeout", 10)
+        stop = s_openstack.StopFromConf()
+        self.assertFalse(stop(mock.Mock(seconds_since_start=9)))
+        self.assertTrue(stop(mock.Mock(seconds_since_start=10)))
+
+    def test_retry_budget(self):
+        self._set_override("circuit_breaker_threshold", 0)
+        self._set_override("retry_budget", 3)
+        self.assertRaises(
+            openstack_exc.HttpException, self.openstack.get_volume, "v1", "p1"
+        )
+        self.assertEqual(4, self.m_get.call_count)
+        # The budget is spent, the next call is not retried.
+        self.assertRaises(
+            openstack_exc.HttpException, self.openstack.get_volume, "v1", "p1"
+        )
+        self.assertEqual(5, self.m_get.call_count)
+        with s_openstack.retry_cycle("Test"):
+            self.assertRaises(
+                openstack_exc.HttpException, self.openstack.get_volume, "v1", "p1"
+            )
+        self.assertEqual(9, self.m_get.call_count)
+
+    def test_circuit_breaker(self):
+        self._set_override("circuit_breaker_threshold", 3)
+        self._set_override("retry_budget", 0)
+        exc = self.assertRaises(
+            openstack_exc.HttpException, self.openstack.get_volume, "v1", "p1"
+        )
+        self.assertEqual(500, exc.status_code)
+        self.assertEqual(3, self.m_get.call_count)
+
+        # Open, fail fast without calling Cinder.
+        self.assertRaises(
+            s_openstack.CircuitOpenError, self.openstack.get_volume, "v1", "p1"
+        )
+        self.assertEqual(3, self.m_get.call_count)
+        # Other services are not affected.
+        self.openstack.get_servers()
+        self.assertEqual(
+            {"open": True, "trips": 1, "failures": 3},
+            s_openstack.get_retry_stats()["circuit_breakers"]["block_storage"],
+        )
+
+        # Half open after the reset timeout, a success closes it.
+        s_openstack.get_circuit_breaker("block_storage").opened_at -= 3600
+        self.m_get.side_effect = None
+        self.openstack.get_volume("v1", "p1")
+        self.assertFalse(s_openstack.get_circuit_breaker("block_storage").is_open)
+        self.assertEqual(0, s_openstack.get_circuit_breaker("block_storage").failures)
+
+    def test_client_errors_do_not_trip(self):
+        self._set_override("circuit_breaker_threshold", 1)
+        self.m_get.side_effect = openstack_exc.HttpException(http_status=404)
+        for _ in range(3):
+            self.assertRaises(
+                openstack_exc.HttpException, self.openstack.get_volume, "v1", "p1"
+            )
+        self.assertFalse(s_openstack.get_circuit_breaker("block_storage").is_open)
+
+    def test_connection_failures_trip(self):
+        self._set_override("circuit_breaker_threshold", 1)
+        self.m_get.side_effect = ks_exceptions.ConnectTimeout("timed out")
+        self.assertRaises(
+            ks_exceptions.ConnectTimeout, self.openstack.get_volume, "v1", "p1"
+        )
+        self.assertTrue(s_openstack.get_circuit_breaker("block_storage").is_open)
+
+    def test_circuit_open_error(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            exc = s_openstack.CircuitOpenError("block_storage")
+        self.assertEqual(503, exc.status_code)
+
+
+class RateLimiterTest(base.TestCase):
+
+    def setUp(self):
+        super(RateLimiterTest, self).setUp()
+        self.limiter = s_openstack.RateLimiter()
+        self.now = 1000.0
+        p = mock.patch("time.monotonic", side_effect=lambda: self.now)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _set_override(self, name, override):
+        conf.CONF.set_override(name, override, "openstack")
+        self.addCleanup(conf.CONF.clear_override, name, "openstack")
+
+    def test_no_limit(self):
+        for _ in range(100):
+            self.assertEqual(0, self.limiter.reserve("compute"))
+
+    def test_burst_then_rate(self):
+        self._set_override("rate_limit", 10)
+        self._set_override("rate_limit_burst", 3)
+        delays = [self.limiter.reserve("compute") for _ in range(5)]
+        self.assertEqual([0, 0, 0], delays[:3])
+        self.assertAlmostEqual(0.1, delays[3])
+        self.assertAlmostEqual(0.2, delays[4])
+        # Other services have their own bucket.
+        self.assertEqual(0, self.limiter.reserve("identity"))
+        # Refilled after waiting.
+        self.now += 10
+        self.assertEqual(0, self.limiter.reserve("compute"))
+
+    def test_service_rate_limits_and_share(self):
+        self._set_override("rate_limit", 10)
+        self._set_override("service_rate_limits", {"block_storage": "40"})
+        self.assertEqual(10, self.limiter.get_rate("compute"))
+        self.assertEqual(40, self.limiter.get_rate("block_storage"))
+        self.limiter.set_share(4)
+        self.assertEqual(2.5, self.limiter.get_rate("compute"))
+        self.assertEqual(10, self.limiter.get_rate("block_storage"))
+        self.limiter.set_share(0)
+        self.assertEqual(10, self.limiter.get_rate("compute"))
+
+    @mock.patch("time.sleep")
+    def test_acquire(self, m_sleep):
+        self._set_override("rate_limit", 2)
+        self._set_override("rate_limit_burst", 1)
+        self.limiter.acquire("compute")
+        m_sleep.assert_not_called()
+        self.limiter.acquire("compute")
+        m_sleep.assert_called_once_with(0.5)
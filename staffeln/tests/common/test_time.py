@@ -0,0 +1,31 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+from unittest import mock
+
+from dateutil.relativedelta import relativedelta
+
+from staffeln.common import time as xtime
+from staffeln.tests import base
+
+
+class TimeTest(base.TestCase):
+
+    def setUp(self):
+        super(TimeTest, self).setUp()
+        xtime.parse_relativedelta.cache_clear()
+
+    def test_parse_relativedelta(self):
+        self.assertEqual(
+            relativedelta(months=1, weeks=2, hours=3),
+            xtime.parse_relativedelta("1mon2w3h"),
+        )
+        self.assertIsNone(xtime.parse_relativedelta("invalid"))
+
+    def test_parse_relativedelta_cached(self):
+        with mock.patch.object(
+            xtime, "parse_timedelta_string", wraps=xtime.parse_timedelta_string
+        ) as parse:
+            for _ in range(3):
+                xtime.parse_relativedelta("2w3d")
+        parse.assert_called_once_with("2w3d")
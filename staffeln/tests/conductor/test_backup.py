@@ -0,0 +1,440 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import datetime
+from unittest import mock
+
+from openstack import exceptions as openstack_exc
+from oslo_utils import timeutils
+
+from staffeln import conf, objects
+from staffeln.common import constants, openstack
+from staffeln.conductor import backup
+from staffeln.tests import base
+from staffeln.tests.db import base as db_base
+
+
+class BackupTest(base.TestCase):
+
+    def setUp(self):
+        super(BackupTest, self).setUp()
+        self.m_c = mock.MagicMock()
+        with mock.patch("openstack.connect", return_value=self.m_c):
+            self.backup = backup.Backup()
+        self.backup.refresh_openstacksdk = mock.Mock()
+        self.backup.openstacksdk = mock.MagicMock()
+        self.backup.refresh_backup_result()
+        self.backup.get_backup_history = mock.Mock(return_value={})
+        self.backup._is_backup_required = mock.Mock(return_value=True)
+        self.backup._is_incremental = mock.Mock(return_value=False)
+
+    def _set_override(self, name, override, group):
+        conf.CONF.set_override(name, override, group)
+        self.addCleanup(conf.CONF.clear_override, name, group)
+
+    def _fake_project(self, project_id):
+        project = mock.MagicMock(id=project_id)
+        project.name = f"name-{project_id}"
+        return project
+
+    def _fake_server(self, server_id, volume_ids):
+        server = mock.MagicMock(
+            id=server_id,
+            metadata={},
+            attached_volumes=[{"id": v} for v in volume_ids],
+        )
+        server.name = f"name-{server_id}"
+        return server
+
+    def test_check_instance_volumes(self):
+        self._set_override("discovery_all_projects", False, "conductor")
+        projects = [self._fake_project(p) for p in ("p1", "p2", "p3")]
+        servers = {
+            "p1": [self._fake_server("s1", ["v1", "v2"])],
+            "p2": [],
+            "p3": [self._fake_server("s3", ["v3"])],
+        }
+        self.backup.openstacksdk.get_projects.return_value = projects
+        self.backup.openstacksdk.get_servers.side_effect = lambda project_id: servers[
+            project_id
+        ]
+        self.backup.openstacksdk.get_volume.return_value = {"status": "in-use"}
+
+        queues_map = self.backup.check_instance_volumes()
+
+        self.assertEqual(["v1", "v2", "v3"], [q.volume_id for q in queues_map])
+        for queue in queues_map:
+            self.assertEqual(constants.BACKUP_PLANNED, queue.backup_status)
+        self.assertEqual(
+            {("p1", "name-p1"), ("p3", "name-p3")},
+            self.backup.result.project_list,
+        )
+        self.assertEqual({"p1", "p2", "p3"}, set(self.backup.project_list))
+
+    def test_check_instance_volumes_all_projects(self):
+        projects = [self._fake_project(p) for p in ("p1", "p2")]
+        servers = [
+            self._fake_server("s1", ["v1"]),
+            self._fake_server("s2", ["v2"]),
+            self._fake_server("s3", ["v3"]),
+        ]
+        servers[0].project_id = "p1"
+        servers[1].project_id = "p2"
+        # Server of a project not visible to Staffeln.
+        servers[2].project_id = "p3"
+        self.backup.openstacksdk.get_projects.return_value = projects
+        self.backup.openstacksdk.get_servers.return_value = iter(servers)
+        self.backup.openstacksdk.get_volume.return_value = {"status": "in-use"}
+
+        queues_map = self.backup.check_instance_volumes()
+
+        self.assertEqual(["v1", "v2"], [q.volume_id for q in queues_map])
+        self.backup.openstacksdk.get_servers.assert_called_once_with(all_projects=True)
+        # The snapshot is reused by later users within the cycle.
+        self.assertEqual([servers[2]], self.backup.get_server_snapshot()["p3"])
+        self.backup.openstacksdk.get_servers.assert_called_once()
+
+    def test_check_instance_volumes_project_error_isolated(self):
+        self._set_override("discovery_all_projects", False, "conductor")
+        projects = [self._fake_project(p) for p in ("p1", "p2", "p3")]
+
+        def get_servers(project_id):
+            if project_id == "p1":
+                raise openstack_exc.HttpException(http_status=500)
+            if project_id == "p2":
+                raise KeyError(project_id)
+            return [self._fake_server("s3", ["v3"])]
+
+        self.backup.openstacksdk.get_projects.return_value = projects
+        self.backup.openstacksdk.get_servers.side_effect = get_servers
+        self.backup.openstacksdk.get_volume.return_value = {"status": "available"}
+
+        queues_map = self.backup.check_instance_volumes()
+
+        self.assertEqual(["v3"], [q.volume_id for q in queues_map])
+        self.assertEqual({("p3", "name-p3")}, self.backup.result.project_list)
+
+    @mock.patch("staffeln.common.openstack_async.AsyncOpenstackSDK")
+    def test_check_instance_volumes_async(self, m_sdk_class):
+        self._set_override("discovery_all_projects", False, "conductor")
+        self._set_override("discovery_async", True, "conductor")
+        projects = [self._fake_project(p) for p in ("p1", "p2")]
+
+        async def get_servers(project_id):
+            if project_id == "p2":
+                raise openstack_exc.HttpException(http_status=500)
+            return [self._fake_server("s1", ["v1"])]
+
+        m_sdk = m_sdk_class.return_value.__aenter__.return_value
+        m_sdk.get_servers.side_effect = get_servers
+        self.backup.openstacksdk.get_projects.return_value = projects
+        self.backup.openstacksdk.get_servers.return_value = [
+            self._fake_server("s2", ["v2"])
+        ]
+        self.backup.openstacksdk.get_volume.return_value = {"status": "in-use"}
+
+        queues_map = self.backup.check_instance_volumes()
+
+        self.assertEqual(["v1", "v2"], [q.volume_id for q in queues_map])
+        m_sdk_class.assert_called_once_with(self.backup.connection_pool)
+        # Only the project which failed asynchronously is listed again.
+        self.backup.openstacksdk.get_servers.assert_called_once_with(project_id="p2")
+
+    def test_filter_by_volume_status_prefetched(self):
+        self.backup.openstacksdk.get_volumes.return_value = [
+            mock.MagicMock(id="v1", status="in-use"),
+            mock.MagicMock(id="v2", status="error"),
+        ]
+        self.backup.prefetch_volume_status()
+
+        self.assertTrue(self.backup.filter_by_volume_status("v1", "p1"))
+        self.assertIn("error", self.backup.filter_by_volume_status("v2", "p1"))
+        self.backup.openstacksdk.get_volume.assert_not_called()
+
+    def test_filter_by_volume_status_prefetch_miss(self):
+        self.backup.openstacksdk.get_volumes.return_value = []
+        self.backup.openstacksdk.get_volume.return_value = {"status": "available"}
+        self.backup.prefetch_volume_status()
+
+        self.assertTrue(self.backup.filter_by_volume_status("v1", "p1"))
+        self.backup.openstacksdk.get_volume.assert_called_once_with("v1", "p1")
+
+    def test_is_backup_required_with_history(self):
+        self._set_override("backup_min_interval", 3600, "conductor")
+        now = timeutils.utcnow()
+        history = {
+            "v1": (now - datetime.timedelta(seconds=60), True),
+            "v2": (now - datetime.timedelta(seconds=7200), True),
+        }
+        is_backup_required = backup.Backup._is_backup_required
+        self.assertFalse(is_backup_required(self.backup, "v1", history))
+        self.assertTrue(is_backup_required(self.backup, "v2", history))
+        self.assertTrue(is_backup_required(self.backup, "v3", history))
+
+    def test_is_incremental_with_history(self):
+        now = timeutils.utcnow()
+        history = {"v1": (now, True), "v2": (now, False)}
+        is_incremental = backup.Backup._is_incremental
+        self.assertTrue(is_incremental(self.backup, "v1", history))
+        self.assertFalse(is_incremental(self.backup, "v2", history))
+        self.assertFalse(is_incremental(self.backup, "v3", history))
+
+    def test_check_instance_volumes_batched_history(self):
+        self._set_override("discovery_all_projects", False, "conductor")
+        self.backup.openstacksdk.get_projects.return_value = [self._fake_project("p1")]
+        self.backup.openstacksdk.get_servers.return_value = [
+            self._fake_server("s1", ["v1", "v2"]),
+            self._fake_server("s2", ["v3"]),
+        ]
+        self.backup.openstacksdk.get_volume.return_value = {"status": "in-use"}
+
+        self.backup.check_instance_volumes()
+
+        self.backup.get_backup_history.assert_called_once_with(["v1", "v2", "v3"])
+        self.backup._is_backup_required.assert_has_calls(
+            [mock.call(v, backup_history={}) for v in ("v1", "v2", "v3")]
+        )
+
+    @mock.patch("staffeln.objects.Queue.bulk_create")
+    def test_create_queue(self, m_bulk_create):
+        tasks = [
+            backup.QueueMapping(
+                volume_id=volume_id,
+                backup_id="NULL",
+                project_id="p1",
+                instance_id="s1",
+                backup_status=constants.BACKUP_PLANNED,
+                instance_name="s1",
+                volume_name=volume_id,
+                incremental=False,
+                reason=None,
+            )
+            for volume_id in ("v1", "v2", "v3")
+        ]
+        self.backup.check_instance_volumes = mock.Mock(return_value=tasks)
+
+        self.backup.create_queue([mock.MagicMock(volume_id="v2")])
+
+        m_bulk_create.assert_called_once_with(
+            context=self.backup.ctx,
+            values_list=[tasks[0]._asdict(), tasks[2]._asdict()],
+            skip_statuses=constants.BACKUP_ACTIVE_STATUSES,
+        )
+
+    @mock.patch("staffeln.objects.Queue.bulk_delete")
+    def test_purge_backups(self, m_bulk_delete):
+        self._set_override("bulk_delete_chunk_size", 100, "database")
+        m_bulk_delete.return_value = 42
+
+        self.assertEqual(42, self.backup.purge_backups("p1"))
+
+        m_bulk_delete.assert_called_once_with(
+            context=self.backup.ctx,
+            project_id="p1",
+            statuses=[constants.BACKUP_COMPLETED, constants.BACKUP_FAILED],
+            chunk_size=100,
+        )
+
+    def test_check_volume_backup_status_from_map(self):
+        self.backup.project_list = {"p1": mock.MagicMock()}
+        self.backup.process_available_backup = mock.Mock()
+        self.backup.process_failed_backup = mock.Mock()
+        queues = [
+            mock.MagicMock(project_id="p1", backup_id=backup_id)
+            for backup_id in ("b1", "b2", "b3")
+        ]
+        backup_map = {
+            "b1": mock.Mock(status="available"),
+            "b2": mock.Mock(status="error"),
+        }
+        self.backup.openstacksdk.get_backup.return_value = mock.MagicMock(
+            status="creating"
+        )
+
+        for queue in queues:
+            self.backup.check_volume_backup_status(queue, backup_map=backup_map)
+
+        self.backup.process_available_backup.assert_called_once_with(
+            queues[0], backup_map["b1"]
+        )
+        self.backup.process_failed_backup.assert_called_once_with(queues[1])
+        # Only the backup missing from the map is fetched.
+        self.backup.openstacksdk.get_backup.assert_called_once_with("b3")
+
+    def test_process_available_backup_duration(self):
+        self.backup._volume_backup = mock.Mock()
+        task = mock.Mock(
+            incremental=False,
+            updated_at=datetime.datetime(2024, 1, 31, tzinfo=datetime.timezone.utc),
+        )
+        backup_gen = mock.Mock(status="available", updated_at="2024-01-31T00:10:00")
+
+        self.backup.process_available_backup(task, backup_gen)
+
+        # The backup completed when Cinder last updated it, not when polled.
+        self.assertEqual(
+            600, self.backup._volume_backup.call_args[0][0].backup_duration
+        )
+        self.assertEqual(constants.BACKUP_COMPLETED, task.backup_status)
+        task.save.assert_called_once_with()
+
+    def test_get_backup_map_from_base_connection(self):
+        pool = mock.Mock()
+        self.backup.openstacksdk = openstack.OpenstackSDK(pool=pool)
+        base_conn = pool.get_base.return_value
+        backup_gen = mock.Mock(id="b1", created_at="2024-01-31T00:00:00")
+        base_conn.block_storage.backups.return_value = [backup_gen]
+        self.backup.openstacksdk.set_project({"id": "p1", "name": "p1"})
+
+        backup_map = self.backup.get_backup_map(datetime.datetime(2024, 1, 30))
+
+        self.assertEqual({"b1": backup_gen}, backup_map)
+        pool.get.return_value.block_storage.backups.assert_not_called()
+
+    @mock.patch("staffeln.objects.Volume.get_backup_durations")
+    def test_get_expected_backup_remaining(self, m_durations):
+        self._set_override("backup_poll_seconds_per_gb", 5, "conductor")
+        m_durations.return_value = {("v1", True): 600.0}
+        self.backup.volume_size_map = {"v2": 100}
+        started_at = timeutils.utcnow(with_timezone=True) - datetime.timedelta(
+            seconds=100
+        )
+        queues = [
+            mock.MagicMock(id=i, volume_id=v, incremental=True, updated_at=started_at)
+            for i, v in enumerate(("v1", "v2", "v3"))
+        ]
+
+        remaining = self.backup.get_expected_backup_remaining(queues)
+
+        self.assertAlmostEqual(500, remaining[0], delta=5)
+        self.assertAlmostEqual(400, remaining[1], delta=5)
+        self.assertAlmostEqual(-100, remaining[2], delta=5)
+
+    @mock.patch("staffeln.objects.Volume.get_backup_durations")
+    def test_get_expected_backup_remaining_records(self, m_durations):
+        m_durations.return_value = {("v1", False): 600.0}
+        record_class = objects.Queue.record_class()
+        queue = record_class(
+            **dict(
+                dict.fromkeys(record_class._fields),
+                id=1,
+                volume_id="v1",
+                incremental=False,
+                # Records carry naive UTC times.
+                created_at=timeutils.utcnow() - datetime.timedelta(seconds=100),
+            )
+        )
+
+        remaining = self.backup.get_expected_backup_remaining([queue])
+
+        self.assertAlmostEqual(500, remaining[1], delta=5)
+
+    @mock.patch("staffeln.objects.Volume.create", autospec=True)
+    @mock.patch("staffeln.objects.Volume.list")
+    def test_volume_backup_records_parent(self, m_list, m_create):
+        created = []
+        m_create.side_effect = created.append
+        m_list.return_value = [mock.MagicMock(backup_id="b1")]
+        volume_id = "6c0c4fd9-7dc2-4cd8-9e23-ab8a4e0b3d8d"
+        task = mock.MagicMock(
+            backup_id="b2",
+            volume_id=volume_id,
+            instance_id="s1",
+            project_id="0a5e7f2c-16d4-4a31-9a56-5f3e2b9c1d44",
+            backup_completed=1,
+            backup_duration=None,
+        )
+
+        task.incremental = True
+        self.backup._volume_backup(task)
+        task.incremental = False
+        self.backup._volume_backup(task)
+
+        m_list.assert_called_once_with(
+            context=self.backup.ctx,
+            filters={"volume_id": volume_id, "backup_completed": 1},
+            limit=1,
+            sort_key="id",
+            sort_dir="desc",
+            read_only=True,
+        )
+        self.assertEqual("b1", created[0].parent_backup_id)
+        self.assertFalse(created[1].obj_attr_is_set("parent_backup_id"))
+
+    def test_retry_auth_renews_token(self):
+        calls = []
+
+        @backup.retry_auth
+        def func(controller):
+            calls.append(controller)
+            if len(calls) == 1:
+                raise openstack_exc.HttpException(http_status=403)
+            return "done"
+
+        self.assertEqual("done", func(self.backup))
+        self.assertEqual(2, len(calls))
+        self.backup.openstacksdk.renew_token.assert_called_once_with()
+        self.backup.refresh_openstacksdk.assert_not_called()
+
+    def test_hard_remove_volume_backup_outcome(self):
+        self.backup.project_list = {"p1": {"id": "p1"}}
+        backup_object = mock.MagicMock(project_id="p1", backup_id="b1")
+        self.assertEqual(
+            constants.DELETION_STARTED,
+            self.backup.hard_remove_volume_backup(backup_object),
+        )
+        self.backup.openstacksdk.delete_backup.side_effect = (
+            openstack_exc.HttpException(http_status=503)
+        )
+        self.assertEqual(
+            constants.DELETION_THROTTLED,
+            self.backup.hard_remove_volume_backup(backup_object),
+        )
+        self.backup.openstacksdk.delete_backup_once.side_effect = (
+            openstack_exc.HttpException(http_status=429)
+        )
+        self.assertEqual(
+            constants.DELETION_THROTTLED,
+            self.backup.hard_remove_volume_backup(backup_object, retry=False),
+        )
+        self.backup.openstacksdk.delete_backup_once.assert_called_once_with(uuid="b1")
+        self.backup.openstacksdk.get_backup.return_value = None
+        self.assertEqual(
+            constants.DELETION_GONE,
+            self.backup.hard_remove_volume_backup(backup_object),
+        )
+        backup_object.delete_backup.assert_called_once_with()
+        self.backup.project_list = {}
+        self.assertEqual(
+            constants.DELETION_SKIPPED,
+            self.backup.hard_remove_volume_backup(backup_object),
+        )
+
+
+class VolumeBackupDbTest(db_base.DbTestCase):
+
+    def setUp(self):
+        super(VolumeBackupDbTest, self).setUp()
+        objects.register_all()
+        with mock.patch("openstack.connect"):
+            self.backup = backup.Backup()
+
+    def _task(self, backup_id, backup_completed=1, incremental=True):
+        return backup.BackupMapping(
+            volume_id="6c0c4fd9-7dc2-4cd8-9e23-ab8a4e0b3d8d",
+            project_id="0a5e7f2c-16d4-4a31-9a56-5f3e2b9c1d44",
+            backup_id=backup_id,
+            instance_id="s1",
+            backup_completed=backup_completed,
+            incremental=incremental,
+            created_at=timeutils.utcnow(),
+        )
+
+    def test_volume_backup_parent_skips_failed(self):
+        self.backup._volume_backup(self._task("b1", incremental=False))
+        self.backup.create_failed_backup_obj(self._task("b2"))
+
+        self.backup._volume_backup(self._task("b3"))
+
+        backups = {b.backup_id: b.parent_backup_id for b in self.backup.get_backups()}
+        self.assertEqual({"b1": None, "b2": "b1", "b3": "b1"}, backups)
@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+from unittest import mock
+
+from staffeln import conf
+from staffeln.common import constants
+from staffeln.conductor import deleter
+from staffeln.tests import base
+
+
+class FakeCinder(object):
+    """Backups stay in deleting status for a number of polls"""
+
+    def __init__(self, polls=1, outcomes=None):
+        self.polls = polls
+        self.outcomes = outcomes or {}
+        self.deleting = {}
+        self.started = []
+        self.max_in_flight = 0
+
+    def hard_remove_volume_backup(self, backup, skip_inc_err=False, retry=True):
+        # A list gives the outcomes of the successive requests.
+        outcome = self.outcomes.get(backup.backup_id, constants.DELETION_STARTED)
+        if isinstance(outcome, list):
+            outcome = outcome.pop(0) if outcome else constants.DELETION_STARTED
+        if outcome == constants.DELETION_STARTED:
+            self.started.append(backup.backup_id)
+            self.deleting[backup.backup_id] = self.polls
+            self.max_in_flight = max(self.max_in_flight, len(self.deleting))
+        return outcome
+
+    def get_backups(self, status=None):
+        backups = [mock.Mock(id=backup_id) for backup_id in self.deleting]
+        for backup_id in list(self.deleting):
+            self.deleting[backup_id] -= 1
+            if self.deleting[backup_id] <= 0:
+                del self.deleting[backup_id]
+        return backups
+
+
+class BackupDeleterTest(base.TestCase):
+
+    def setUp(self):
+        super(BackupDeleterTest, self).setUp()
+        for name, override in (
+            ("rotation_max_in_flight", 4),
+            ("rotation_poll_interval", 1),
+        ):
+            conf.CONF.set_override(name, override, "conductor")
+            self.addCleanup(conf.CONF.clear_override, name, "conductor")
+        p = mock.patch("time.sleep")
+        self.m_sleep = p.start()
+        self.addCleanup(p.stop)
+
+    def _run(self, cinder, chains):
+        controller = mock.MagicMock()
+        controller.hard_remove_volume_backup.side_effect = (
+            cinder.hard_remove_volume_backup
+        )
+        controller.openstacksdk.get_backups.side_effect = cinder.get_backups
+        backup_deleter = deleter.BackupDeleter(controller)
+        stats = backup_deleter.run(
+            [[mock.Mock(backup_id=backup_id) for backup_id in c] for c in chains]
+        )
+        return backup_deleter, stats
+
+    def test_chain_order(self):
+        cinder = FakeCinder(polls=2)
+        chains = [["v1-b3", "v1-b2", "v1-b1"], ["v2-b2", "v2-b1"]]
+        _, stats = self._run(cinder, chains)
+        self.assertEqual(5, stats[constants.DELETION_STARTED])
+        for chain in chains:
+            positions = [cinder.started.index(b) for b in chain]
+            self.assertEqual(sorted(positions), positions)
+        # Only one backup of a chain is deleted at a time.
+        self.assertLessEqual(cinder.max_in_flight, 2)
+
+    def test_window_grows_up_to_max(self):
+        cinder = FakeCinder(polls=1)
+        backup_deleter, stats = self._run(
+            cinder, [[f"v{i}-b1", f"v{i}-b0"] for i in range(30)]
+        )
+        self.assertEqual(60, stats[constants.DELETION_STARTED])
+        self.assertEqual(4, cinder.max_in_flight)
+        self.assertEqual(4, backup_deleter.window)
+
+    def test_throttled_halves_window(self):
+        cinder = FakeCinder(
+            polls=1,
+            outcomes={
+                "v5-b0": [constants.DELETION_THROTTLED],
+                "v6-b0": constants.DELETION_GONE,
+            },
+        )
+        backup_deleter, stats = self._run(cinder, [[f"v{i}-b0"] for i in range(8)])
+        self.assertEqual(1, stats[constants.DELETION_THROTTLED])
+        self.assertEqual(1, stats[constants.DELETION_GONE])
+        self.assertEqual(7, stats[constants.DELETION_STARTED])
+        self.assertIn("v5-b0", cinder.started)
+        self.assertLess(backup_deleter.window, 4)
+
+    def test_throttled_backup_requeued(self):
+        cinder = FakeCinder(
+            polls=1,
+            outcomes={
+                "v1-b1": [constants.DELETION_THROTTLED, constants.DELETION_THROTTLED]
+            },
+        )
+        controller = mock.MagicMock()
+        controller.hard_remove_volume_backup.side_effect = (
+            cinder.hard_remove_volume_backup
+        )
+        controller.openstacksdk.get_backups.side_effect = cinder.get_backups
+        stats = deleter.BackupDeleter(controller).run(
+            [[mock.Mock(backup_id="v1-b1"), mock.Mock(backup_id="v1-b0")]]
+        )
+
+        self.assertEqual(2, stats[constants.DELETION_THROTTLED])
+        # The parent waits until its throttled child is deleted.
+        self.assertEqual(["v1-b1", "v1-b0"], cinder.started)
+        for call in controller.hard_remove_volume_backup.call_args_list:
+            self.assertFalse(call.kwargs["retry"])
+
+    def test_failed_backup_drops_chain(self):
+        cinder = FakeCinder(
+            polls=1,
+            outcomes={
+                "v1-b1": constants.DELETION_FAILED,
+                "v2-b1": constants.DELETION_SKIPPED,
+                "v3-b1": constants.DELETION_GONE,
+            },
+        )
+        _, stats = self._run(
+            cinder,
+            [["v1-b1", "v1-b0"], ["v2-b1", "v2-b0"], ["v3-b1", "v3-b0"]],
+        )
+        self.assertEqual(1, stats[constants.DELETION_FAILED])
+        self.assertEqual(1, stats[constants.DELETION_SKIPPED])
+        # The parents of the kept backups are not requested.
+        self.assertEqual(["v3-b0"], cinder.started)
+
+    def test_throttled_timeout(self):
+        conf.CONF.set_override("rotation_delete_timeout", 10, "conductor")
+        self.addCleanup(
+            conf.CONF.clear_override, "rotation_delete_timeout", "conductor"
+        )
+        cinder = FakeCinder(outcomes={"v1-b1": constants.DELETION_THROTTLED})
+        with mock.patch("time.monotonic", side_effect=range(0, 100000, 5)):
+            _, stats = self._run(cinder, [["v1-b1", "v1-b0"]])
+        self.assertEqual(1, stats["timeout"])
+        self.assertEqual(3, stats[constants.DELETION_THROTTLED])
+        self.assertEqual([], cinder.started)
+
+    def test_delete_timeout(self):
+        conf.CONF.set_override("rotation_delete_timeout", 10, "conductor")
+        self.addCleanup(
+            conf.CONF.clear_override, "rotation_delete_timeout", "conductor"
+        )
+        cinder = FakeCinder(polls=1000)
+        with mock.patch("time.monotonic", side_effect=range(0, 100000, 5)):
+            _, stats = self._run(cinder, [["v1-b1", "v1-b0"]])
+        self.assertEqual(1, stats["timeout"])
+        self.assertEqual(["v1-b1"], cinder.started)
+
+    def test_chains_taken_lazily(self):
+        cinder = FakeCinder(polls=1)
+        taken = []
+        taken_at_poll = []
+
+        def chains():
+            for i in range(30):
+                taken.append(i)
+                yield [mock.Mock(backup_id=f"v{i}-b0")]
+
+        def get_backups(status=None):
+            taken_at_poll.append(len(taken))
+            return cinder.get_backups(status=status)
+
+        controller = mock.MagicMock()
+        controller.hard_remove_volume_backup.side_effect = (
+            cinder.hard_remove_volume_backup
+        )
+        controller.openstacksdk.get_backups.side_effect = get_backups
+        stats = deleter.BackupDeleter(controller).run(chains())
+
+        self.assertEqual(30, stats[constants.DELETION_STARTED])
+        # Chains are only taken when there is room in the window.
+        self.assertLessEqual(taken_at_poll[0], 4)
@@ -0,0 +1,73 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import collections
+import threading
+import time
+
+from staffeln.conductor import dispatcher
+from staffeln.tests import base
+
+
+class LimitedDispatcherTest(base.TestCase):
+    def _run(self, tasks, max_workers, limits):
+        running = collections.Counter()
+        peak = collections.Counter()
+        done = []
+        lock = threading.Lock()
+
+        def func(task):
+            keys = [("workers", None), ("project", task[0]), ("backend", task[1])]
+            with lock:
+                for key in keys:
+                    running[key] += 1
+                    peak[key] = max(peak[key], running[key])
+            time.sleep(0.01)
+            with lock:
+                for key in keys:
+                    running[key] -= 1
+                done.append(task)
+
+        dispatcher.LimitedDispatcher(max_workers, limits=limits).run(
+            tasks,
+            func,
+            key_func=lambda task: [("project", task[0]), ("backend", task[1])],
+        )
+        return done, peak
+
+    def test_run_all_tasks(self):
+        tasks = [("p1", "b1", i) for i in range(5)] + [
+            ("p2", None, i) for i in range(5)
+        ]
+        done, peak = self._run(tasks, 4, {"project": 0, "backend": 0})
+        self.assertCountEqual(tasks, done)
+        self.assertLessEqual(peak[("workers", None)], 4)
+
+    def test_per_project_limit(self):
+        tasks = [("p1", None, i) for i in range(6)] + [
+            ("p2", None, i) for i in range(6)
+        ]
+        done, peak = self._run(tasks, 8, {"project": 2})
+        self.assertCountEqual(tasks, done)
+        self.assertLessEqual(peak[("project", "p1")], 2)
+        self.assertLessEqual(peak[("project", "p2")], 2)
+
+    def test_per_backend_limit(self):
+        tasks = [("p%s" % i, "ceph", i) for i in range(6)]
+        tasks += [("p%s" % i, None, i) for i in range(6)]
+        done, peak = self._run(tasks, 8, {"backend": 1})
+        self.assertCountEqual(tasks, done)
+        self.assertEqual(1, peak[("backend", "ceph")])
+
+    def test_failed_task_does_not_stop_others(self):
+        done = []
+
+        def func(task):
+            if task == 1:
+                raise Exception("failed")
+            done.append(task)
+
+        dispatcher.LimitedDispatcher(2).run(
+            [1, 2, 3], func, key_func=lambda task: [("project", "p1")]
+        )
+        self.assertCountEqual([2, 3], done)
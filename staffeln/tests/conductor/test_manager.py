@@ -0,0 +1,276 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import datetime
+import itertools
+from unittest import mock
+
+from staffeln import conf
+from staffeln.common import constants
+from staffeln.conductor import manager
+from staffeln.tests import base
+
+
+class BackupManagerTest(base.TestCase):
+
+    def setUp(self):
+        super(BackupManagerTest, self).setUp()
+        with mock.patch("openstack.connect"):
+            self.manager = manager.BackupManager(1, mock.Mock())
+        self.manager.controller = mock.MagicMock()
+        self.manager.lock_mgt = mock.MagicMock()
+        p = mock.patch("staffeln.common.lock.Lock")
+        m_lock = p.start()
+        self.addCleanup(p.stop)
+        m_lock.return_value.__enter__.return_value.acquired = True
+
+    @mock.patch.object(manager.dispatcher, "LimitedDispatcher")
+    def test_process_todo_tasks_looks_up_backends(self, m_dispatcher):
+        controller = self.manager.controller
+        # Not prefetched, this worker isn't the puller.
+        controller.volume_backend_map = {}
+        controller.prefetch_volume_status.side_effect = (
+            lambda: controller.volume_backend_map.update(v1="host@lvm")
+        )
+        task = mock.Mock(project_id="p1", volume_id="v1")
+        controller.get_queues.return_value = [task]
+
+        self.manager._process_todo_tasks()
+
+        controller.prefetch_volume_status.assert_called_once_with()
+        key_func = m_dispatcher.return_value.run.call_args[1]["key_func"]
+        self.assertEqual([("project", "p1"), ("backend", "host@lvm")], key_func(task))
+
+    def test_process_todo_task_claimed(self):
+        controller = self.manager.controller
+        claimed = mock.Mock(id=1, backup_status=constants.BACKUP_INIT)
+        controller.update_queues_status.return_value = [claimed]
+
+        self.manager._process_todo_task(mock.Mock(id=1, volume_id="v1"))
+
+        controller.update_queues_status.assert_called_once_with(
+            [1], constants.BACKUP_PLANNED, constants.BACKUP_INIT
+        )
+        # The claimed task is used as returned, without pulling it again.
+        controller.get_queue_task_by_id.assert_not_called()
+        controller.create_volume_backup.assert_called_once_with(claimed)
+
+    def test_process_todo_task_already_claimed(self):
+        controller = self.manager.controller
+        controller.update_queues_status.return_value = []
+
+        self.manager._process_todo_task(mock.Mock(id=1, volume_id="v1"))
+
+        controller.get_queue_task_by_id.assert_not_called()
+        controller.create_volume_backup.assert_not_called()
+
+    @mock.patch("time.sleep")
+    @mock.patch("time.monotonic", side_effect=itertools.count(0, 1000))
+    def test_process_wip_tasks_pulls_finished_tasks_only(self, m_monotonic, m_sleep):
+        self.addCleanup(conf.CONF.clear_override, "backup_cycle_timout", "conductor")
+        conf.CONF.set_override("backup_cycle_timout", "1000d", "conductor")
+        controller = self.manager.controller
+        queues = [
+            mock.Mock(
+                id=i,
+                backup_id=f"b{i}",
+                volume_id=f"v{i}",
+                backup_status=constants.BACKUP_WIP,
+                created_at=datetime.datetime(2024, 1, 1),
+            )
+            for i in (1, 2)
+        ]
+        controller.get_queues.side_effect = [queues, queues, []]
+        controller.get_expected_backup_remaining.return_value = {1: 0, 2: 0}
+        controller.get_backup_map.return_value = {
+            "b1": mock.Mock(status="creating"),
+            "b2": mock.Mock(status="available"),
+        }
+        task = mock.Mock(backup_status=constants.BACKUP_WIP)
+        controller.get_queue_task_by_id.return_value = task
+
+        self.manager._process_wip_tasks()
+
+        controller.get_queue_task_by_id.assert_called_once_with(task_id=2)
+        controller.check_volume_backup_status.assert_called_once_with(
+            task, backup_map=controller.get_backup_map.return_value
+        )
+
+    @mock.patch("time.sleep")
+    @mock.patch("time.monotonic")
+    def test_process_wip_tasks_wakes_once_per_min_interval(self, m_monotonic, m_sleep):
+        self.addCleanup(conf.CONF.clear_override, "backup_cycle_timout", "conductor")
+        conf.CONF.set_override("backup_cycle_timout", "1000d", "conductor")
+        now = [0]
+        m_monotonic.side_effect = lambda: now[0]
+        m_sleep.side_effect = lambda seconds: now.__setitem__(0, now[0] + seconds)
+        controller = self.manager.controller
+        queues = [
+            mock.Mock(
+                id=i,
+                backup_id=f"b{i}",
+                volume_id=f"v{i}",
+                backup_status=constants.BACKUP_WIP,
+                created_at=datetime.datetime(2024, 1, 1),
+            )
+            for i in (1, 2)
+        ]
+        controller.get_queues.side_effect = [queues, queues, queues, []]
+        controller.get_expected_backup_remaining.return_value = {1: 10, 2: 12}
+        controller.get_backup_map.return_value = {
+            "b1": mock.Mock(status="creating"),
+            "b2": mock.Mock(status="creating"),
+        }
+
+        self.manager._process_wip_tasks()
+
+        # The check of b2, due 2s after the one of b1, waits for the next
+        # wake instead of waking the loop on its own.
+        self.assertEqual(
+            [mock.call(10), mock.call(10), mock.call(10)], m_sleep.call_args_list
+        )
+        self.assertEqual(2, controller.get_backup_map.call_count)
+
+    def test_backup_cycle_timeout_seconds(self):
+        self.addCleanup(conf.CONF.clear_override, "backup_cycle_timout", "conductor")
+        self.manager.cycle_start_time = datetime.datetime(2024, 1, 31)
+
+        conf.CONF.set_override("backup_cycle_timout", "1h30min", "conductor")
+        self.assertEqual(5400, self.manager._backup_cycle_timeout_seconds())
+        # The default of 5min is used when the option is invalid.
+        conf.CONF.set_override("backup_cycle_timout", "1x", "conductor")
+        self.assertEqual(300, self.manager._backup_cycle_timeout_seconds())
+
+
+class RotationManagerTest(base.TestCase):
+
+    def setUp(self):
+        super(RotationManagerTest, self).setUp()
+        with mock.patch("openstack.connect"):
+            self.manager = manager.RotationManager(1, mock.Mock())
+        self.manager.controller = mock.MagicMock()
+        self.manager.threshold_strtime = datetime.datetime(
+            2024, 1, 1, tzinfo=datetime.timezone.utc
+        )
+
+    def test_get_retention_chains(self):
+        now = datetime.datetime(2024, 6, 1)
+        backups = [
+            mock.Mock(
+                backup_id=f"b{i}",
+                instance_id=f"s{i % 2}",
+                volume_id=f"v{i % 2}",
+                incremental=False,
+                parent_backup_id=None,
+                created_at=now - datetime.timedelta(days=i),
+            )
+            # The backups of an instance come one after the other.
+            for i in (3, 1, 5, 4, 2)
+        ]
+        self.manager.controller.get_retention_candidates.return_value = iter(backups)
+        self.manager.controller.get_backup_children.return_value = {}
+        self.manager.instance_retention_map = {"i1": "1w", "i2": "invalid"}
+
+        chains = list(self.manager.get_retention_chains())
+
+        self.assertEqual(
+            [["b1", "b3", "b5"], ["b2", "b4"]],
+            [[b.backup_id for b in chain] for chain in chains],
+        )
+        self.manager.controller.get_backup_children.assert_has_calls(
+            [mock.call(["b3", "b1", "b5"]), mock.call(["b4", "b2"])]
+        )
+        cutoff, instance_cutoffs = (
+            self.manager.controller.get_retention_candidates.call_args[0]
+        )
+        self.assertEqual(self.manager.threshold_strtime, cutoff)
+        self.assertEqual(["i1"], list(instance_cutoffs))
+        self.assertAlmostEqual(
+            datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(weeks=1),
+            instance_cutoffs["i1"],
+            delta=datetime.timedelta(minutes=1),
+        )
+
+    def test_get_retention_cutoffs(self):
+        now = datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc)
+        self.manager.instance_retention_map = {
+            "i1": "1w",
+            "i2": "1w",
+            "i3": "1d",
+            "i4": "invalid",
+        }
+
+        with mock.patch.object(
+            self.manager, "get_time_from_str", wraps=self.manager.get_time_from_str
+        ) as get_time:
+            cutoffs = self.manager.get_retention_cutoffs(now=now)
+
+        self.assertEqual(3, get_time.call_count)
+        self.assertEqual(
+            {
+                "i1": datetime.datetime(2024, 5, 25, tzinfo=datetime.timezone.utc),
+                "i2": datetime.datetime(2024, 5, 25, tzinfo=datetime.timezone.utc),
+                "i3": datetime.datetime(2024, 5, 31, tzinfo=datetime.timezone.utc),
+            },
+            cutoffs,
+        )
+
+    def _fake_backup(self, backup_id, days, incremental=False, parent=None):
+        return mock.Mock(
+            backup_id=backup_id,
+            volume_id="v1",
+            incremental=incremental,
+            parent_backup_id=parent,
+            created_at=datetime.datetime(2024, 6, 1) - datetime.timedelta(days=days),
+        )
+
+    def test_sort_chain(self):
+        # full1 <- inc1 <- inc2, full1 <- inc3, full2 (unrelated)
+        backups = [
+            self._fake_backup("full1", 10),
+            self._fake_backup("inc1", 9, True, "full1"),
+            self._fake_backup("full2", 8),
+            self._fake_backup("inc2", 7, True, "inc1"),
+            self._fake_backup("inc3", 6, True, "full1"),
+        ]
+
+        chain, blocked = self.manager._sort_chain(backups, {})
+
+        order = [backup.backup_id for backup in chain]
+        self.assertEqual(0, blocked)
+        self.assertEqual(
+            ["inc3", "inc2", "full2", "inc1", "full1"],
+            order,
+        )
+
+    def test_sort_chain_kept_child(self):
+        backups = [
+            self._fake_backup("full1", 10),
+            self._fake_backup("inc1", 9, True, "full1"),
+            self._fake_backup("inc2", 8, True, "inc1"),
+            self._fake_backup("full2", 7),
+            self._fake_backup("inc3", 6, True, "full2"),
+        ]
+        # inc4, based on inc2, is not expired.
+        children = {"full1": ["inc1"], "inc1": ["inc2"], "inc2": ["inc4"]}
+
+        chain, blocked = self.manager._sort_chain(backups, children)
+
+        self.assertEqual(3, blocked)
+        self.assertEqual(["inc3", "full2"], [backup.backup_id for backup in chain])
+
+    def test_sort_chain_legacy(self):
+        # Backups recorded without parent_backup_id.
+        backups = [
+            self._fake_backup("full1", 10),
+            self._fake_backup("inc1", 9, True),
+            self._fake_backup("full2", 8),
+            self._fake_backup("inc2", 7, True),
+        ]
+
+        chain, blocked = self.manager._sort_chain(backups, {})
+
+        self.assertEqual(
+            ["inc2", "inc1", "full2", "full1"],
+            [backup.backup_id for backup in chain],
+        )
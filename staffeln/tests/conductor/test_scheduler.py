@@ -0,0 +1,66 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+from staffeln import conf
+from staffeln.conductor import scheduler
+from staffeln.tests import base
+
+
+class BackupPollSchedulerTest(base.TestCase):
+
+    def setUp(self):
+        super(BackupPollSchedulerTest, self).setUp()
+        for name, override in (
+            ("backup_poll_min_interval", 10),
+            ("backup_poll_max_interval", 100),
+        ):
+            conf.CONF.set_override(name, override, "conductor")
+            self.addCleanup(conf.CONF.clear_override, name, "conductor")
+        self.scheduler = scheduler.BackupPollScheduler()
+
+    def test_first_check_at_expected_completion(self):
+        self.scheduler.add(1, 30, now=0)
+        self.scheduler.add(2, 5, now=0)
+        self.scheduler.add(3, 1000, now=0)
+
+        self.assertEqual(10, self.scheduler.next_check_time())
+        self.assertEqual([], self.scheduler.pop_due(9))
+        self.assertEqual([2], self.scheduler.pop_due(10))
+        self.assertEqual([1], self.scheduler.pop_due(30))
+        self.assertEqual([3], self.scheduler.pop_due(100))
+
+    def test_backoff(self):
+        self.scheduler.add(1, 20, now=0)
+        self.assertEqual([1], self.scheduler.pop_due(20))
+        self.scheduler.backoff(1, now=20)
+        self.assertEqual(60, self.scheduler.next_check_time())
+        self.assertEqual([1], self.scheduler.pop_due(60))
+        self.scheduler.backoff(1, now=60)
+        self.assertEqual(140, self.scheduler.next_check_time())
+        self.assertEqual([1], self.scheduler.pop_due(140))
+        self.scheduler.backoff(1, now=140)
+        # Capped by backup_poll_max_interval
+        self.assertEqual(240, self.scheduler.next_check_time())
+
+    def test_retain(self):
+        self.scheduler.add(1, 10, now=0)
+        self.scheduler.add(2, 20, now=0)
+        self.scheduler.retain([2])
+
+        self.assertNotIn(1, self.scheduler)
+        self.assertEqual(1, len(self.scheduler))
+        self.assertEqual(20, self.scheduler.next_check_time())
+        self.assertEqual([2], self.scheduler.pop_due(100))
+
+    def test_deadline(self):
+        self.scheduler = scheduler.BackupPollScheduler(deadline=150)
+        self.scheduler.add(1, 1000, now=0)
+        self.scheduler.add(2, 20, now=0)
+        self.assertEqual([2], self.scheduler.pop_due(20))
+        self.scheduler.backoff(2, now=140)
+
+        self.assertEqual(100, self.scheduler.next_check_time())
+        self.assertEqual([1], self.scheduler.pop_due(100))
+        self.scheduler.backoff(1, now=100)
+        # Capped by the deadline instead of 180 and 200
+        self.assertEqual([1, 2], sorted(self.scheduler.pop_due(150)))
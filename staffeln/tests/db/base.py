@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+from unittest import mock
+
+from oslo_db.sqlalchemy import session as db_session
+
+from staffeln import conf
+from staffeln.db.sqlalchemy import api as sqla_api
+from staffeln.db.sqlalchemy import models
+from staffeln.tests import base
+
+
+class DbTestCase(base.TestCase):
+    """Test case running the SQLAlchemy backend on an in-memory SQLite."""
+
+    def setUp(self):
+        super(DbTestCase, self).setUp()
+        facade = db_session.EngineFacade("sqlite://")
+        self.engine = facade.get_engine()
+        models.Base.metadata.create_all(self.engine)
+        p = mock.patch.object(sqla_api, "_FACADE", facade)
+        p.start()
+        self.addCleanup(p.stop)
+        self.addCleanup(self.engine.dispose)
+        self.dbapi = sqla_api.Connection()
+
+    def _set_override(self, name, override, group):
+        conf.CONF.set_override(name, override, group)
+        self.addCleanup(conf.CONF.clear_override, name, group)
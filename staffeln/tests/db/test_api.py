@@ -0,0 +1,271 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import datetime
+from unittest import mock
+
+import sqlalchemy as sa
+from oslo_db import exception as db_exc
+
+from staffeln.common import constants
+from staffeln.db.sqlalchemy import api as sqla_api
+from staffeln.db.sqlalchemy import models
+from staffeln.tests.db import base
+
+
+class QueueApiTest(base.DbTestCase):
+
+    def _task(self, volume_id, **values):
+        task = {
+            "backup_id": "NULL",
+            "project_id": "p1",
+            "volume_id": volume_id,
+            "instance_id": "s1",
+            "backup_status": constants.BACKUP_PLANNED,
+            "volume_name": volume_id,
+            "instance_name": "s1",
+            "incremental": False,
+            "reason": None,
+        }
+        task.update(values)
+        return task
+
+    def _queue(self):
+        table = models.Queue_data.__table__
+        with self.engine.connect() as connection:
+            return {
+                row.id: (row.volume_id, row.backup_status)
+                for row in connection.execute(table.select())
+            }
+
+    def test_create_queues(self):
+        ids = self.dbapi.create_queues(
+            [self._task("v1"), self._task("v2")], chunk_size=1
+        )
+
+        self.assertEqual(
+            {
+                ids[0]: ("v1", constants.BACKUP_PLANNED),
+                ids[1]: ("v2", constants.BACKUP_PLANNED),
+            },
+            self._queue(),
+        )
+
+    def test_create_queues_skip_active_volumes(self):
+        first = self.dbapi.create_queues(
+            [
+                self._task("v1"),
+                self._task("v2", backup_status=constants.BACKUP_WIP),
+                self._task("v3", backup_status=constants.BACKUP_COMPLETED),
+            ],
+            skip_statuses=constants.BACKUP_ACTIVE_STATUSES,
+        )
+
+        second = self.dbapi.create_queues(
+            [self._task("v1"), self._task("v2"), self._task("v3"), self._task("v3")],
+            chunk_size=2,
+            skip_statuses=constants.BACKUP_ACTIVE_STATUSES,
+        )
+
+        self.assertEqual(3, len(first))
+        self.assertEqual(1, len(second))
+        queue = self._queue()
+        self.assertEqual(("v3", constants.BACKUP_PLANNED), queue[second[0]])
+        self.assertEqual(4, len(queue))
+
+    def test_create_queues_all_skipped(self):
+        self.dbapi.create_queues([self._task("v1")])
+
+        ids = self.dbapi.create_queues(
+            [self._task("v1")], skip_statuses=constants.BACKUP_ACTIVE_STATUSES
+        )
+
+        self.assertEqual([], ids)
+        self.assertEqual(1, len(self._queue()))
+
+    def test_delete_queues(self):
+        done = (constants.BACKUP_COMPLETED, constants.BACKUP_FAILED)
+        for chunk_size in (None, 2):
+            self.dbapi.create_queues(
+                [
+                    self._task("v1", backup_status=constants.BACKUP_COMPLETED),
+                    self._task("v2", backup_status=constants.BACKUP_FAILED),
+                    self._task("v3", backup_status=constants.BACKUP_COMPLETED),
+                    self._task("v4", backup_status=constants.BACKUP_WIP),
+                    self._task(
+                        "v5", project_id="p2", backup_status=constants.BACKUP_FAILED
+                    ),
+                ]
+            )
+
+            deleted = self.dbapi.delete_queues(None, "p1", done, chunk_size=chunk_size)
+
+            self.assertEqual(3, deleted)
+            self.assertEqual(
+                {("v4", constants.BACKUP_WIP), ("v5", constants.BACKUP_FAILED)},
+                set(self._queue().values()),
+            )
+            self.dbapi.delete_queues(None, "p1", [constants.BACKUP_WIP])
+            self.dbapi.delete_queues(None, "p2", done)
+            self.assertEqual({}, self._queue())
+
+    def _test_update_queues_status(self):
+        ids = self.dbapi.create_queues(
+            [
+                self._task("v1"),
+                self._task("v2"),
+                self._task("v3", backup_status=constants.BACKUP_WIP),
+            ]
+        )
+
+        changed = self.dbapi.update_queues_status(
+            None,
+            ids,
+            constants.BACKUP_PLANNED,
+            constants.BACKUP_WIP,
+            values={"backup_id": "b1"},
+        )
+        # Compare and set, a second worker gets nothing.
+        repeated = self.dbapi.update_queues_status(
+            None, ids, constants.BACKUP_PLANNED, constants.BACKUP_WIP
+        )
+
+        self.assertEqual(
+            [
+                (ids[0], "v1", "b1", constants.BACKUP_WIP),
+                (ids[1], "v2", "b1", constants.BACKUP_WIP),
+            ],
+            sorted(
+                (row["id"], row["volume_id"], row["backup_id"], row["backup_status"])
+                for row in changed
+            ),
+        )
+        self.assertEqual([], repeated)
+        self.assertEqual(
+            {("v1", constants.BACKUP_WIP), ("v2", constants.BACKUP_WIP)},
+            {self._queue()[i] for i in ids[:2]},
+        )
+        table = models.Queue_data.__table__
+        with self.engine.connect() as connection:
+            backup_ids = connection.execute(
+                sa.select(table.c.volume_id, table.c.backup_id)
+            ).all()
+        self.assertEqual(
+            [("v1", "b1"), ("v2", "b1"), ("v3", "NULL")], sorted(backup_ids)
+        )
+
+    def test_update_queues_status(self):
+        self._test_update_queues_status()
+
+    def test_update_queues_status_select_for_update(self):
+        with mock.patch.object(self.engine.dialect, "update_returning", False):
+            self._test_update_queues_status()
+
+
+class BackupApiTest(base.DbTestCase):
+
+    def setUp(self):
+        super(BackupApiTest, self).setUp()
+        self.now = datetime.datetime(2024, 1, 31)
+
+    def _backup(self, backup_id, days=0, **values):
+        backup = {
+            "backup_id": backup_id,
+            "volume_id": "v1",
+            "instance_id": "s1",
+            "backup_completed": 1,
+            "incremental": False,
+            "created_at": self.now - datetime.timedelta(days=days),
+        }
+        backup.update(values)
+        return backup
+
+    def _insert(self, *backups):
+        with self.engine.begin() as connection:
+            connection.execute(models.Backup_data.__table__.insert(), list(backups))
+
+    def test_get_retention_candidates_null_instance(self):
+        self._insert(
+            self._backup("b1", 10, instance_id=None),
+            self._backup("b2", 10),
+            self._backup("b3", 10, instance_id=None),
+            self._backup("b4", 9),
+            self._backup("b5", 8, instance_id=None),
+            self._backup("b6", 10, instance_id="s2"),
+            self._backup("b7", 1, instance_id=None),
+        )
+
+        rows = self.dbapi.get_retention_candidates(
+            None, cutoff=self.now - datetime.timedelta(days=5), batch_size=2
+        )
+
+        # Every row is returned once across the page boundaries.
+        self.assertEqual(
+            [
+                (None, "b1"),
+                (None, "b3"),
+                (None, "b5"),
+                ("s1", "b2"),
+                ("s1", "b4"),
+                ("s2", "b6"),
+            ],
+            [(row.instance_id, row.backup_id) for row in rows],
+        )
+
+    def _test_get_backup_history(self):
+        self._insert(
+            # v1: the full backup is the third latest one.
+            self._backup("b1", 4),
+            self._backup("b2", 3, incremental=True),
+            self._backup("b3", 2, incremental=True),
+            # v2: only incremental backups in its last two.
+            self._backup("b4", 5, volume_id="v2"),
+            self._backup("b5", 4, volume_id="v2", incremental=True),
+            self._backup("b6", 3, volume_id="v2", incremental=True),
+            # v3: incremental is unknown for old backups, taken as full.
+            self._backup("b7", 1, volume_id="v3", incremental=None),
+        )
+
+        history = self.dbapi.get_backup_history(None, ["v1", "v2", "v3", "v4"], depth=3)
+        self.assertEqual(
+            {
+                "v1": (self.now - datetime.timedelta(days=2), True),
+                "v2": (self.now - datetime.timedelta(days=3), True),
+                "v3": (self.now - datetime.timedelta(days=1), True),
+            },
+            history,
+        )
+        history = self.dbapi.get_backup_history(None, ["v1", "v2", "v3"], depth=2)
+        self.assertEqual(
+            {"v1": False, "v2": False, "v3": True},
+            {volume_id: with_full for volume_id, (_, with_full) in history.items()},
+        )
+
+    def test_get_backup_history(self):
+        self._test_get_backup_history()
+
+    def test_get_backup_history_without_window_functions(self):
+        with mock.patch.object(
+            sqla_api.sa.func, "row_number", side_effect=db_exc.DBError
+        ) as m_row_number:
+            self._test_get_backup_history()
+        m_row_number.assert_called()
+
+    def test_get_backup_iter_equal_sort_keys(self):
+        # Ids 1-3 now, 4-6 a day ago, 7 two days ago, 8 has no created_at.
+        self._insert(
+            *[self._backup(f"b{i}", days=i // 3) for i in range(7)],
+            self._backup("b7", created_at=None),
+        )
+
+        # Pages of 2 end within the groups of equal created_at.
+        rows = self.dbapi.get_backup_iter(None, sort_key="created_at", batch_size=2)
+        self.assertEqual([8, 7, 4, 5, 6, 1, 2, 3], [row.id for row in rows])
+        rows = self.dbapi.get_backup_iter(
+            None,
+            sort_key="created_at",
+            sort_dir="desc",
+            batch_size=2,
+            columns=["id", "created_at"],
+        )
+        self.assertEqual([3, 2, 1, 6, 5, 4, 7, 8], [row.id for row in rows])
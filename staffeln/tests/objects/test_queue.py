@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: Apache-2.0
+from __future__ import annotations
+
+import datetime
+from unittest import mock
+
+from staffeln import objects
+from staffeln.tests import base
+
+
+class QueueTest(base.TestCase):
+
+    def setUp(self):
+        super(QueueTest, self).setUp()
+        objects.register_all()
+        p = mock.patch.object(objects.Queue, "dbapi")
+        self.m_dbapi = p.start()
+        self.addCleanup(p.stop)
+
+    def test_list_read_only(self):
+        record_class = objects.Queue.record_class()
+        created_at = datetime.datetime(2024, 1, 1)
+        row = tuple(
+            created_at if field == "created_at" else None
+            for field in record_class._fields
+        )
+        self.m_dbapi.get_queue_list.return_value = [row]
+
+        queues = objects.Queue.list(
+            mock.Mock(), filters={"backup_status": 1}, read_only=True
+        )
+
+        self.m_dbapi.get_queue_list.assert_called_once_with(
+            mock.ANY, filters={"backup_status": 1}, columns=record_class._fields
+        )
+        self.assertEqual([record_class._make(row)], queues)
+        self.assertEqual(created_at, queues[0].created_at)
+        self.assertIs(record_class, objects.Queue.record_class())
+
+    def test_record_fields(self):
+        self.assertEqual(
+            set(objects.Queue.fields), set(objects.Queue.record_class()._fields)
+        )
+        self.assertEqual(
+            set(objects.Volume.fields), set(objects.Volume.record_class()._fields)
+        )
+
+    def test_list_iter(self):
+        record_class = objects.Queue.record_class()
+        rows = [tuple(range(len(record_class._fields))) for _ in range(3)]
+        self.m_dbapi.get_queue_iter.return_value = iter(rows)
+
+        queues = objects.Queue.list_iter(
+            mock.Mock(),
+            filters={"backup_status": 1},
+            sort_key="created_at",
+            read_only=True,
+        )
+
+        # Nothing is read until the iterator is consumed.
+        self.m_dbapi.get_queue_iter.assert_not_called()
+        self.assertEqual([record_class._make(row) for row in rows], list(queues))
+        self.m_dbapi.get_queue_iter.assert_called_once_with(
+            mock.ANY,
+            filters={"backup_status": 1},
+            sort_key="created_at",
+            sort_dir=None,
+            columns=record_class._fields,
+        )
+
+    def test_bulk_update_status(self):
+        created_at = datetime.datetime(2024, 1, 1)
+        self.m_dbapi.update_queues_status.return_value = [
+            {
+                "id": queue_id,
+                "backup_id": "NULL",
+                "project_id": "0a5e7f2c-16d4-4a31-9a56-5f3e2b9c1d44",
+                "volume_id": "6c0c4fd9-7dc2-4cd8-9e23-ab8a4e0b3d8d",
+                "instance_id": "s1",
+                "backup_status": 1,
+                "volume_name": "v1",
+                "instance_name": "s1",
+                "incremental": False,
+                "reason": "r",
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+            for queue_id in (1, 3)
+        ]
+
+        queues = objects.Queue.bulk_update_status(
+            mock.Mock(), [1, 2, 3], 0, 1, values={"reason": "r"}
+        )
+
+        self.m_dbapi.update_queues_status.assert_called_once_with(
+            mock.ANY, [1, 2, 3], 0, 1, values={"reason": "r"}
+        )
+        self.assertEqual([1, 3], [queue.id for queue in queues])
+        self.assertIsInstance(queues[0], objects.Queue)
+        self.assertEqual({1}, {queue.backup_status for queue in queues})
+        # The objects can be saved, nothing is changed yet.
+        self.assertEqual({}, queues[0].obj_get_changes())